@@ -11,9 +11,17 @@ NOTICE.  This Software was developed under funding from the U.S. Department of E
 import pandas as pd
 import numpy as np
 import copy
+import logging
 
 import constants
 
+logger = logging.getLogger(__name__)
+
+
+def FIM_rule_matrix(v_FIM_rules, v_indicator_names):
+    # (indicators x measures) incidence matrix of the (measure, indicators, min_count) rules of LEAN_FIMs
+    return (np.array([np.isin(v_indicator_names, rule[1]) for rule in v_FIM_rules], dtype=int).T)
+
 
 # Modified by Han Li on 2018-7-31 for the open source tool
 class LEAN_FIMs:
@@ -21,18 +29,11 @@ class LEAN_FIMs:
         self.df_assessment = copy.deepcopy(df_assessment)
         self.utility_type = utility_type
         self.utility_type_str = 'Electricity' if (utility_type == 1) else 'Fossil Fuel'
-        self.base = self.df_assessment.site_coefficients.beta_base
-        self.cdd = self.df_assessment.site_coefficients.beta_cdd
-        self.betc = self.df_assessment.site_coefficients.beta_betc
-        self.hdd = self.df_assessment.site_coefficients.beta_hdd
-        self.beth = self.df_assessment.site_coefficients.beta_beth
-
+        site_coefficients = self.df_assessment.site_coefficients
         # Adapt the model coefficients to the LEAN_FIMs module
-        if self.betc == self.beth:
-            if self.cdd == 0:
-                self.betc, self.cdd  = np.nan, np.nan
-            if self.hdd == 0:
-                self.beth, self.hdd = np.nan, np.nan
+        self.base, self.cdd, self.betc, self.hdd, self.beth = LEAN_FIMs.adapt_coefficients(
+            [site_coefficients.beta_base, site_coefficients.beta_cdd, site_coefficients.beta_betc,
+             site_coefficients.beta_hdd, site_coefficients.beta_beth])[0]
 
         self.benchmark_medians = self.df_assessment.beta_median
         self.benchmark_stdevs = self.df_assessment.beta_standard_deviation
@@ -43,45 +44,7 @@ class LEAN_FIMs:
     def set_targets(self, target_level):
 
         self.n = len(self.site_coeffs)
-        self.targets = np.zeros(self.n)
-
-        # print(self.n)
-        print('---------------------------------------------------------------')
-        print(self.utility_type_str)
-        print('Site Coefficients:')
-        print(self.site_coeffs)
-
-        if target_level == 1:
-            for i in range(0, self.n):
-                beta_name = self.df_assessment.index[i]
-                if np.isnan(self.site_coeffs[i]):
-                    self.targets[i] = np.nan
-                elif beta_name == 'beta_betc':
-                    self.targets[i] = max(self.benchmark_medians[i] - self.benchmark_stdevs[i], self.site_coeffs[i])
-                else:
-                    self.targets[i] = min(self.benchmark_medians[i] + self.benchmark_stdevs[i], self.site_coeffs[i])
-
-        elif target_level == 2:
-            for i in range(0, self.n):
-                beta_name = self.df_assessment.index[i]
-                if np.isnan(self.site_coeffs[i]):
-                    self.targets[i] = np.nan
-                else:
-                    if beta_name == 'beta_betc':
-                        self.targets[i] = max(self.benchmark_medians[i], self.site_coeffs[i])
-                    else:
-                        self.targets[i] = min(self.benchmark_medians[i], self.site_coeffs[i])
-
-        elif target_level == 3:
-            for i in range(0, self.n):
-                beta_name = self.df_assessment.index[i]
-                if np.isnan(self.site_coeffs[i]):
-                    self.targets[i] = np.nan
-                else:
-                    if beta_name == 'beta_betc':
-                        self.targets[i] = max(self.benchmark_medians[i] + (0.5 * self.benchmark_stdevs[i]), self.site_coeffs[i])
-                    else:
-                        self.targets[i] = min(self.benchmark_medians[i] - (0.5 * self.benchmark_stdevs[i]), self.site_coeffs[i])
+        self.targets = LEAN_FIMs.targets(self.site_coeffs, self.benchmark_medians, self.benchmark_stdevs, target_level)[0]
 
         self.base_targ = self.targets[0]
         self.cdd_targ = self.targets[1]
@@ -89,218 +52,170 @@ class LEAN_FIMs:
         self.hdd_targ = self.targets[3]
         self.beth_targ = self.targets[4]
 
-        print('Target Coefficients:')
-        print(self.targets)
-        print('---------------------------------------------------------------')
-
-    def FIM_recommendations(self, save_file=True):
-        column = ['FIM Recommendations']
-        rows = ['Increase Cooling Setpoints', 'Decrease Heating Setpoints',
-                'Reduce Equipment Schedules', 'Decrease Ventilation',
-                'Eliminate Electric Heating', 'Decrease Infiltration',
-                'Reduce Lighting Load', 'Reduce Plug Loads', 'Add/Fix Economizers',
-                'Increase Cooling System Efficiency',
-                'Increase Heating System Efficiency', 'Add Wall/Ceiling Insulation',
-                'Upgrade Windows', 'Check Fossil Baseload']
-        self.FIM_table = pd.DataFrame(index=rows, columns=column)
-
-        ovrd_thres = 1
-        ovrd_val = 0.001
-
+        logger.debug('%s site coefficients: %s, target coefficients: %s', self.utility_type_str, self.site_coeffs,
+                     self.targets)
+
+    # Offset of the target from the benchmark median by target level, in benchmark standard deviations.
+    # The offset is subtracted for betc (a higher cooling change-point is better) and added for the other coefficients.
+    target_level_offsets = {1: 1.0, 2: 0.0, 3: -0.5}
+    target_level_names = {1: 'Conservative', 2: 'Nominal', 3: 'Aggressive'}
+    coefficient_names = ['beta_base', 'beta_cdd', 'beta_betc', 'beta_hdd', 'beta_beth']
+
+    @staticmethod
+    def targets(m_site_coeffs, v_medians, v_stdevs, target_level):
+        # (buildings x 5) targets of the coefficients (base, cdd, betc, hdd, beth): the benchmark target, or the site
+        # coefficient if it is already better (higher betc, lower other coefficients); NaN for NaN site coefficients
+        m_site = np.asarray(m_site_coeffs, dtype=float).reshape(-1, 5)
+        v_signs = np.array([1, 1, -1, 1, 1])
+        v_benchmark = (np.asarray(v_medians, dtype=float) +
+                       v_signs * LEAN_FIMs.target_level_offsets[target_level] * np.asarray(v_stdevs, dtype=float))
+        m_targets = np.minimum(v_benchmark, m_site)
+        m_targets[:, 2] = np.maximum(v_benchmark[2], m_site[:, 2])
+        m_targets[np.isnan(m_site)] = np.nan
+        return (m_targets)
+
+    def assess_target_levels(self, v_target_levels=(1, 2, 3)):
+        # Targets, recommended measures and savings coefficients of several target levels in one pass
+        # Returns a dict target level -> dict of the targets, the FIM vector and the savings coefficients table
+        m_targets = np.vstack([LEAN_FIMs.targets(self.site_coeffs, self.benchmark_medians, self.benchmark_stdevs, level)
+                               for level in v_target_levels])
+        m_FIMs = LEAN_FIMs.FIM_matrix(np.tile(self.site_coeffs, (len(v_target_levels), 1)), m_targets,
+                                      self.utility_type)
+        m_savings_coeffs = LEAN_FIMs.savings_coefficients_matrix(np.tile(self.site_coeffs, (len(v_target_levels), 1)),
+                                                                 m_targets)
+        d_levels = {}
+        for i, target_level in enumerate(v_target_levels):
+            d_levels[target_level] = {'targets': m_targets[i],
+                                      'FIMs': m_FIMs[i],
+                                      'savings_coefficients': LEAN_FIMs.savings_coefficients_table(
+                                          self.site_coeffs, m_savings_coeffs[i])}
+        return (d_levels)
+
+    # The measures and the indicators recommending them: a measure is recommended when at least min_count of its
+    # indicators are true. The indicators are computed by FIM_indicators.
+    FIM_rules = [
+        # (measure, indicators, min_count)
         # Increase Cooling Setpoint (indicated by low betc)
-        setpoint_recommendation = False  # used for scheduling measure
-        if ovrd_thres:
-            threshold = ovrd_val
-        else:
-            threshold = 0.2
-        if (self.betc_targ - self.betc) >= (threshold * self.betc_targ):
-            self.FIM_table.loc['Increase Cooling Setpoints'] = 'X'
-            setpoint_recommendation = True
-
+        ('Increase Cooling Setpoints', ['low_betc'], 1),
         # Decrease Heating Setpoint (indicated by high beth)
-        if ovrd_thres:
-            threshold = ovrd_val
-        else:
-            threshold = 0.2
-        if (self.beth - self.beth_targ) >= (threshold * self.beth_targ):
-            self.FIM_table.loc['Decrease Heating Setpoints'] = 'X'
-            setpoint_recommendation = True
-
+        ('Decrease Heating Setpoints', ['high_beth'], 1),
         # Tighten Schedules (indicated by high electric baseload)
-        """
-        9/20/13 - Added logic to also recommend schedules if recommending
-        increasing cooling setpoints or decreasing heating setpoints. A
-        building's break-even temperature are affected by the average building
-        temperatures (i.e., occupied & unoccupied). That means that adjusting
-        schedules for switching between an occupied and unoccupied setpoint
-        will also change the average building temperatures.
-        """
-        if ovrd_thres:
-            threshold = ovrd_val
-        else:
-            threshold = 0.001
-
-        if self.utility_type == 1 and self.base > 0 and (self.base - self.base_targ) >= (threshold * self.base_targ):
-            self.FIM_table.loc['Reduce Equipment Schedules'] = 'X'
-        elif setpoint_recommendation:
-            self.FIM_table.loc['Reduce Equipment Schedules'] = 'X'
-
+        # 9/20/13 - Added logic to also recommend schedules if recommending increasing cooling setpoints or
+        # decreasing heating setpoints. A building's break-even temperature are affected by the average building
+        # temperatures (i.e., occupied & unoccupied). That means that adjusting schedules for switching between an
+        # occupied and unoccupied setpoint will also change the average building temperatures.
+        ('Reduce Equipment Schedules', ['high_electricity_base', 'low_betc', 'high_beth'], 1),
         # Decrease Ventilation (indicated by two of the following three: high cdd, high hdd, high beth)
-        count = 0
-        if ovrd_thres:
-            threshold = ovrd_val
-        else:
-            threshold = 0.1
-        if self.cdd > 0 and (self.cdd - self.cdd_targ) >= (threshold * self.cdd_targ):
-            count = count + 1
-        if self.hdd > 0 and (self.hdd - self.hdd_targ) >= (threshold * self.hdd_targ):
-            count = count + 1
-        if ovrd_thres:
-            threshold = ovrd_val
-        else:
-            threshold = 0.2
-        if (self.beth - self.beth_targ) >= (threshold * self.beth_targ):
-            count = count + 1
-        if count >= 2:
-            self.FIM_table.loc['Decrease Ventilation'] = 'X'
-
+        ('Decrease Ventilation', ['high_cdd', 'high_hdd', 'high_beth'], 2),
         # Eliminate Any Electric Heating
-        """
-        Before 9/20/2013, electric heating indicated by electric fuel and HDD>0.
-        Added threshold to improve diagnostic and reduce mis-diagnosis of electric
-        heating. It appears that both electric and fossil heating has beta_hdd's
-        around 0.04 kWh/m2 while electric beta_hdd's without electric heating
-        are around 0.004 kWh/m2.
-        """
-        electric_htg_threshold = 0.01
-        if self.utility_type == 1 and self.hdd > electric_htg_threshold:
-            self.FIM_table.loc['Eliminate Electric Heating'] = 'X'
-
+        ('Eliminate Electric Heating', ['electric_heating'], 1),
         # Decrease Infiltration (indicated by two of the following three: high cdd, high hdd, high beth)
-        count = 0
-        if ovrd_thres:
-            threshold = ovrd_val
-        else:
-            threshold = 0.1
-        if self.cdd > 0 and (self.cdd - self.cdd_targ) >= (threshold * self.cdd_targ):
-            count = count + 1
-        if self.hdd > 0 and (self.hdd - self.hdd_targ) >= (threshold * self.hdd_targ):
-            count = count + 1
-        if ovrd_thres:
-            threshold = ovrd_val
-        else:
-            threshold = 0.2
-        if (self.beth - self.beth_targ) >= (threshold * self.beth_targ):
-            count = count + 1
-        if count >= 2:
-            self.FIM_table.loc['Decrease Infiltration'] = 'X'
-
+        ('Decrease Infiltration', ['high_cdd', 'high_hdd', 'high_beth'], 2),
         # Reduce Lighting Load (indicated by high baseload)
-        if ovrd_thres:
-            threshold = ovrd_val
-        else:
-            threshold = 0.001
-        if self.utility_type == 1 and self.base > 0 and (self.base - self.base_targ) >= (threshold * self.base_targ):
-            self.FIM_table.loc['Reduce Lighting Load'] = 'X'
-
+        ('Reduce Lighting Load', ['high_electricity_base'], 1),
         # Reduce Plug Load (indicated by high baseload)
-        if ovrd_thres:
-            threshold = ovrd_val
-        else:
-            threshold = 0.001
-        if self.utility_type == 1 and self.base > 0 and (self.base - self.base_targ) >= (threshold * self.base_targ):
-            self.FIM_table.loc['Reduce Plug Loads'] = 'X'
-
+        ('Reduce Plug Loads', ['high_electricity_base'], 1),
         # Add/Fix Economizers (indicated by low betc)
-        if ovrd_thres:
-            threshold = ovrd_val
-        else:
-            threshold = 0.2
-        if (self.betc_targ - self.betc) >= (threshold * self.betc_targ):
-            self.FIM_table.loc['Add/Fix Economizers'] = 'X'
-
+        ('Add/Fix Economizers', ['low_betc'], 1),
         # Increase Cooling Efficiency (indicated by high cdd)
-        if ovrd_thres:
-            threshold = ovrd_val
-        else:
-            threshold = 0.1
-        if self.cdd > 0 and (self.cdd - self.cdd_targ) >= (threshold * self.cdd_targ):
-            self.FIM_table.loc['Increase Cooling System Efficiency'] = 'X'
-
+        ('Increase Cooling System Efficiency', ['high_cdd'], 1),
         # Increase Heating Efficiency (indicated by high hdd)
-        if ovrd_thres:
-            threshold = ovrd_val
-        else:
-            threshold = 0.1
-        if self.hdd > 0 and (self.hdd - self.hdd_targ) >= (threshold * self.hdd_targ):
-            self.FIM_table.loc['Increase Heating System Efficiency'] = 'X'
-
+        ('Increase Heating System Efficiency', ['high_hdd'], 1),
         # Add Wall/Ceiling Insulation (indicated by two of the following three: high cdd, high hdd, high beth)
-        count = 0
-        if ovrd_thres:
-            threshold = ovrd_val
-        else:
-            threshold = 0.1
-        if self.cdd > 0 and (self.cdd - self.cdd_targ) >= (threshold * self.cdd_targ):
-            count = count + 1
-        if self.hdd > 0 and (self.hdd - self.hdd_targ) >= (threshold * self.hdd_targ):
-            count = count + 1
-        if ovrd_thres:
-            threshold = ovrd_val
-        else:
-            threshold = 0.2
-        if (self.beth - self.beth_targ) >= (threshold * self.beth_targ):
-            count = count + 1
-        if count >= 2:
-            self.FIM_table.loc['Add Wall/Ceiling Insulation'] = 'X'
-
+        ('Add Wall/Ceiling Insulation', ['high_cdd', 'high_hdd', 'high_beth'], 2),
         # Upgrade Windows (indicated by all of the following: high cdd, low betc, high hdd)
-        count = 0
-        if ovrd_thres:
-            threshold = ovrd_val
-        else:
-            threshold = 0.1
-        if self.cdd > 0 and (self.cdd - self.cdd_targ) >= (threshold * self.cdd_targ):
-            count = count + 1
-        if self.hdd > 0 and (self.hdd - self.hdd_targ) >= (threshold * self.hdd_targ):
-            count = count + 1
-        if ovrd_thres:
-            threshold = ovrd_val
-        else:
-            threshold = 0.2
-        if (self.betc_targ - self.betc) >= (threshold * self.betc_targ):
-            count = count + 1
-        if count == 3:
-            self.FIM_table.loc['Upgrade Windows'] = 'X'
-
+        ('Upgrade Windows', ['high_cdd', 'high_hdd', 'low_betc'], 3),
         # Check Excessive Fossil Fuel Baseload
-        if ovrd_thres:
-            threshold = ovrd_val
-        else:
-            threshold = 0.001
-        if self.utility_type == 2 and self.base > 0 and (self.base - self.base_targ) >= (threshold * self.base_targ):
-            self.FIM_table.loc['Check Fossil Baseload'] = 'X'
+        ('Check Fossil Baseload', ['high_fossil_fuel_base'], 1)]
+    indicator_names = ['low_betc', 'high_beth', 'high_cdd', 'high_hdd', 'high_electricity_base',
+                       'high_fossil_fuel_base', 'electric_heating']
+    FIM_names = [rule[0] for rule in FIM_rules]
+    m_FIM_rules = FIM_rule_matrix(FIM_rules, indicator_names)
+    v_FIM_min_counts = np.array([rule[2] for rule in FIM_rules])
+
+    @staticmethod
+    def adapt_coefficients(m_site_coeffs):
+        # Adapt the model coefficients to the LEAN_FIMs module, for a (buildings x 5) array of the coefficients
+        # (base, cdd, betc, hdd, beth)
+        m_site_coeffs = np.array(m_site_coeffs, dtype=float).reshape(-1, 5)
+        v_same_cp = m_site_coeffs[:, 2] == m_site_coeffs[:, 4]
+        v_no_cooling = v_same_cp & (m_site_coeffs[:, 1] == 0)
+        v_no_heating = v_same_cp & (m_site_coeffs[:, 3] == 0)
+        m_site_coeffs[np.ix_(v_no_cooling, [1, 2])] = np.nan
+        m_site_coeffs[np.ix_(v_no_heating, [3, 4])] = np.nan
+        return m_site_coeffs
+
+    @staticmethod
+    def FIM_indicators(m_site_coeffs, m_targets, utility_type, threshold=0.001, electric_htg_threshold=0.01):
+        # (buildings x indicators) boolean array, columns in the order of LEAN_FIMs.indicator_names
+        # m_site_coeffs, m_targets: (buildings x 5) arrays of the coefficients (base, cdd, betc, hdd, beth)
+        # utility_type: electricity = 1, fossil fuel = 2, for all the buildings or an array by building
+        # threshold: relative difference to the target flagging a coefficient (the override value of all measures)
+        # electric_htg_threshold: Before 9/20/2013, electric heating indicated by electric fuel and HDD>0.
+        # Added threshold to improve diagnostic and reduce mis-diagnosis of electric heating. It appears that both
+        # electric and fossil heating has beta_hdd's around 0.04 kWh/m2 while electric beta_hdd's without electric
+        # heating are around 0.004 kWh/m2.
+        m_site = np.asarray(m_site_coeffs, dtype=float).reshape(-1, 5)
+        m_targ = np.asarray(m_targets, dtype=float).reshape(-1, 5)
+        v_electricity = np.asarray(utility_type) == 1
+        v_fossil_fuel = np.asarray(utility_type) == 2
+        base, cdd, betc, hdd, beth = m_site.T
+        base_targ, cdd_targ, betc_targ, hdd_targ, beth_targ = m_targ.T
+        # NaN coefficients or targets never flag a measure
+        with np.errstate(invalid='ignore'):
+            high_base = (base > 0) & ((base - base_targ) >= (threshold * base_targ))
+            m_indicators = np.column_stack([
+                (betc_targ - betc) >= (threshold * betc_targ),
+                (beth - beth_targ) >= (threshold * beth_targ),
+                (cdd > 0) & ((cdd - cdd_targ) >= (threshold * cdd_targ)),
+                (hdd > 0) & ((hdd - hdd_targ) >= (threshold * hdd_targ)),
+                v_electricity & high_base,
+                v_fossil_fuel & high_base,
+                v_electricity & (hdd > electric_htg_threshold)])
+        return m_indicators
+
+    @staticmethod
+    def FIM_matrix(m_site_coeffs, m_targets, utility_type, threshold=0.001):
+        # (buildings x measures) boolean array of the recommended measures, columns in the order of LEAN_FIMs.FIM_names
+        m_indicators = LEAN_FIMs.FIM_indicators(m_site_coeffs, m_targets, utility_type, threshold)
+        return (m_indicators.astype(int).dot(LEAN_FIMs.m_FIM_rules) >= LEAN_FIMs.v_FIM_min_counts)
+
+    @staticmethod
+    def FIM_table_from_matrix(v_FIMs):
+        # FIM table of one building: 'X' for the recommended measures
+        FIM_table = pd.DataFrame(index=LEAN_FIMs.FIM_names, columns=['FIM Recommendations'])
+        FIM_table.loc[np.asarray(v_FIMs, dtype=bool).ravel(), 'FIM Recommendations'] = 'X'
+        return (FIM_table)
+
+    def FIM_recommendations(self, save_file=True):
+        self.v_FIMs = LEAN_FIMs.FIM_matrix(self.site_coeffs, self.targets, self.utility_type)[0]
+        self.FIM_table = LEAN_FIMs.FIM_table_from_matrix(self.v_FIMs)
         # if(save_file): self.FIM_table.to_csv(self.utility_type_str + " FIM_recommendations.csv")
         return self.FIM_table
 
+    @staticmethod
+    def savings_coefficients_matrix(m_site_coeffs, m_targets):
+        # (buildings x 5) coefficients (base, cdd, betc, hdd, beth) after the improvements: the target where the site
+        # coefficient is worse than its target (lower betc, higher other coefficients), the site coefficient otherwise
+        m_site = np.asarray(m_site_coeffs, dtype=float).reshape(-1, 5)
+        m_targ = np.asarray(m_targets, dtype=float).reshape(-1, 5)
+        with np.errstate(invalid='ignore'):
+            m_site_higher = m_site > m_targ
+        m_savings_coeffs = np.where(m_site_higher, m_targ, m_site)
+        m_savings_coeffs[:, 2] = np.where(m_site_higher[:, 2], m_site[:, 2], m_targ[:, 2])
+        return (m_savings_coeffs)
+
+    @staticmethod
+    def savings_coefficients_table(v_site_coeffs, v_savings_coeffs):
+        coeff_out = pd.DataFrame({'original_coefficients': np.asarray(v_site_coeffs, dtype=float),
+                                  'savings_coefficients': np.asarray(v_savings_coeffs, dtype=float)},
+                                 index=pd.Index(LEAN_FIMs.coefficient_names, name='coefficients'),
+                                 columns=['original_coefficients', 'savings_coefficients'])
+        return (coeff_out)
+
     def savings_coefficients(self, save_file=True):
-        columns = ['coefficients', 'original_coefficients', 'savings_coefficients']
-        rows = ['beta_base', 'beta_cdd', 'beta_betc', 'beta_hdd', 'beta_beth']
-        self.coeff_out = pd.DataFrame(columns=columns)
-        for i in range(0, len(rows)):
-            self.coeff_out.loc[i, columns[0]] = rows[i]
-            self.coeff_out.loc[i, columns[1]] = self.site_coeffs[i]
-            if(self.site_coeffs[i] > self.targets[i]):
-                if(i==2):
-                    self.coeff_out.loc[i, columns[2]] = self.site_coeffs[i]
-                else:
-                    self.coeff_out.loc[i, columns[2]] = self.targets[i]
-            else:
-                if(i==2):
-                    self.coeff_out.loc[i, columns[2]] = self.targets[i]
-                else:
-                    self.coeff_out.loc[i, columns[2]] = self.site_coeffs[i]
-        self.coeff_out = self.coeff_out.set_index(columns[0])
+        self.v_savings_coeffs = LEAN_FIMs.savings_coefficients_matrix(self.site_coeffs, self.targets)[0]
+        self.coeff_out = LEAN_FIMs.savings_coefficients_table(self.site_coeffs, self.v_savings_coeffs)
         # if(save_file): self.coeff_out.to_csv(self.utility_type_str + " Coeffs_out.csv")
         return self.coeff_out
 
@@ -9,10 +9,17 @@ NOTICE.  This Software was developed under funding from the U.S. Department of E
 '''
 
 import numpy as np
+import pandas as pd
 import scipy.stats as st
 import copy
+import bisect
+import struct
+import logging
 
 import constants
+import quantile_sketch
+
+logger = logging.getLogger(__name__)
 
 class Benchmark:
 
@@ -61,7 +68,7 @@ class Benchmark:
                 if (self.rating == 1): self.rating_str = 'Poor'
                 if (self.rating == 0): self.rating_str = 'Typical'
             except:
-                print("Benchmarking is not successful. Benchmark distribution must be provided!")
+                logger.warning("Benchmarking is not successful. Benchmark distribution must be provided!")
 
     @staticmethod
     def standardize_target(benchmark):
@@ -107,6 +114,154 @@ class Benchmark:
             bench_bar_html = ''
         return bench_bar_html
 
+class IncrementalBenchmarkStats:
+    # Benchmark stats of a peer group kept up to date as buildings are added, removed or updated, instead of
+    # recomputing them from the whole coefficient table (Portfolio.generate_benchmark_stats).
+    # The finite values of each coefficient are kept in a sorted list (bisection insert/remove). The median is read
+    # from the middle of the list. The distances to the median form two sorted sequences, the values below and above
+    # the median, so the MAD is found as the middle of their merge with a binary search.
+    # NaNs are ignored, as np.nanmedian does.
+    coefficient_columns = ['beta_base', 'beta_cdd', 'beta_betc', 'beta_hdd', 'beta_beth']
+
+    def __init__(self, df_building_models=None):
+        # df_building_models: coefficient table of Portfolio.generate_building_models, buildings identified by 'Model'
+        self.d_coeffs = {}
+        self.d_sorted = {column: [] for column in self.coefficient_columns}
+        if df_building_models is not None:
+            for row in df_building_models.to_dict('records'):
+                self.add(row['Model'], row)
+
+    def __len__(self):
+        return len(self.d_coeffs)
+
+    def add(self, building_ID, d_coeffs):
+        # d_coeffs: the coefficients of the building by column name, replaces the building's coefficients if it exists
+        if building_ID in self.d_coeffs:
+            self.remove(building_ID)
+        d_values = {column: float(d_coeffs.get(column, np.nan)) for column in self.coefficient_columns}
+        self.d_coeffs[building_ID] = d_values
+        for column, value in d_values.items():
+            if np.isfinite(value):
+                bisect.insort(self.d_sorted[column], value)
+
+    def update(self, building_ID, d_coeffs):
+        self.add(building_ID, d_coeffs)
+
+    def remove(self, building_ID):
+        d_values = self.d_coeffs.pop(building_ID)
+        for column, value in d_values.items():
+            if np.isfinite(value):
+                v_sorted = self.d_sorted[column]
+                del v_sorted[bisect.bisect_left(v_sorted, value)]
+
+    @staticmethod
+    def sorted_median(v_sorted):
+        n = len(v_sorted)
+        if n == 0:
+            return np.nan
+        if n % 2 == 1:
+            return v_sorted[n // 2]
+        return (v_sorted[n // 2 - 1] + v_sorted[n // 2]) / 2
+
+    @staticmethod
+    def sorted_median_absolute_deviation(v_sorted, median):
+        # The distances below the median (a) and above it (b) are both increasing away from the median
+        n = len(v_sorted)
+        if n == 0:
+            return np.nan
+        p = bisect.bisect_left(v_sorted, median)
+        n_a, n_b = p, n - p
+
+        def a(i):
+            return median - v_sorted[p - 1 - i]
+
+        def b(j):
+            return v_sorted[p + j] - median
+
+        def kth_smallest(k):
+            # Take i distances from a and k + 1 - i from b
+            lo, hi = max(0, k + 1 - n_b), min(k + 1, n_a)
+            while lo < hi:
+                i = (lo + hi) // 2
+                if a(i) < b(k - i):
+                    lo = i + 1
+                else:
+                    hi = i
+            i, j = lo, k + 1 - lo
+            return max(a(i - 1) if i > 0 else -np.inf, b(j - 1) if j > 0 else -np.inf)
+
+        if n % 2 == 1:
+            return kth_smallest(n // 2)
+        return (kth_smallest(n // 2 - 1) + kth_smallest(n // 2)) / 2
+
+    def median(self, column):
+        return IncrementalBenchmarkStats.sorted_median(self.d_sorted[column])
+
+    def median_absolute_deviation(self, column):
+        return IncrementalBenchmarkStats.sorted_median_absolute_deviation(self.d_sorted[column], self.median(column))
+
+    def get_benchmark_stats(self):
+        # Same frame as Portfolio.generate_benchmark_stats
+        df_bench_stats = pd.DataFrame(columns=['beta_median', 'beta_standard_deviation'])
+        df_bench_stats.index.name = "coefficient"
+        for column in self.coefficient_columns:
+            df_bench_stats.at[column, 'beta_median'] = self.median(column)
+            df_bench_stats.at[column, 'beta_standard_deviation'] = 1.4826 * self.median_absolute_deviation(column)
+        return df_bench_stats
+
+
+class BenchmarkSketch:
+    # Approximate benchmark stats of very large peer groups, with a KLL quantile sketch per model coefficient.
+    # Sketches of shards (e.g. computed by different workers or nodes) are merged, and serialized with to_bytes.
+    # The median and MAD have a rank error of about 1.7 / k of the number of buildings, they are exact for peer
+    # groups smaller than k buildings.
+    coefficient_columns = ['beta_base', 'beta_cdd', 'beta_betc', 'beta_hdd', 'beta_beth']
+
+    def __init__(self, k=200, seed=None):
+        self.d_sketches = {column: quantile_sketch.KLLSketch(k, seed) for column in self.coefficient_columns}
+
+    def add(self, d_coeffs):
+        # d_coeffs: the coefficients of a building by column name, NaNs are ignored
+        for column in self.coefficient_columns:
+            self.d_sketches[column].update(d_coeffs.get(column, np.nan))
+
+    def add_building_models(self, df_building_models):
+        # df_building_models: coefficient table of Portfolio.generate_building_models
+        for column in self.coefficient_columns:
+            self.d_sketches[column].update(np.asarray(df_building_models[column], dtype=float))
+        return self
+
+    def merge(self, other):
+        for column in self.coefficient_columns:
+            self.d_sketches[column].merge(other.d_sketches[column])
+        return self
+
+    def get_benchmark_stats(self):
+        # Same frame as Portfolio.generate_benchmark_stats
+        df_bench_stats = pd.DataFrame(columns=['beta_median', 'beta_standard_deviation'])
+        df_bench_stats.index.name = "coefficient"
+        for column in self.coefficient_columns:
+            df_bench_stats.at[column, 'beta_median'] = self.d_sketches[column].median()
+            df_bench_stats.at[column, 'beta_standard_deviation'] = \
+                1.4826 * self.d_sketches[column].median_absolute_deviation()
+        return df_bench_stats
+
+    def to_bytes(self):
+        v_raw = [self.d_sketches[column].to_bytes() for column in self.coefficient_columns]
+        return (b''.join([struct.pack('<I', len(raw_sketch)) + raw_sketch for raw_sketch in v_raw]))
+
+    @classmethod
+    def from_bytes(cls, raw_sketches):
+        benchmark_sketch = cls()
+        offset = 0
+        for column in cls.coefficient_columns:
+            size, = struct.unpack_from('<I', raw_sketches, offset)
+            benchmark_sketch.d_sketches[column] = quantile_sketch.KLLSketch.from_bytes(
+                raw_sketches[offset + 4:offset + 4 + size])
+            offset += 4 + size
+        return benchmark_sketch
+
+
 # Test
 if __name__ == "__main__":
     df = constants.Constants.df_sample_hotel_coeffs_e
@@ -0,0 +1,146 @@
+'''
+
+Building Efficiency Targeting Tool for Energy Retrofits (BETTER) Copyright (c) 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Dept. of Energy). All rights reserved.
+
+If you have questions about your rights to use or distribute this software, please contact Berkeley Lab's Intellectual Property Office at  IPO@lbl.gov.
+
+NOTICE.  This Software was developed
+under funding from the U.S. Department of Energy and the U.S. Government consequently retains certain rights. As such, the U.S. Government has been granted for itself and others acting on its behalf a paid-up, nonexclusive, irrevocable, worldwide license in the Software to reproduce, distribute copies to the public, prepare derivative works, and perform publicly and display publicly, and to permit other to do so.
+
+'''
+
+import pandas as pd
+import numpy as np
+import os
+import json
+import hashlib
+import tempfile
+
+import weather
+from constants import WeatherStationCatalog
+from weather_fetcher import WeatherFetcher
+
+
+class BenchmarkCache:
+    # On-disk store of the benchmark inputs and outputs, keyed by content hashes:
+    # - the model coefficients of each building, keyed by a hash of the building's utility data, metadata, fuel,
+    #   weather inputs (see weather_key) and the model settings, so only the new or changed buildings of a portfolio
+    #   are refit;
+    # - the benchmark stats, keyed by a hash of the building keys, so an unchanged portfolio is not refit at all.
+    # Each entry is a JSON file of its own (models/<key>.json, stats/<key>.json), so a put only writes its entries.
+    # Files are written to a temporary file then renamed: concurrent processes (e.g. two batch runs) never see a
+    # partial file and don't lose each other's entries, the last writer of a key wins with the same content.
+    # Bump settings_version when a change to the model fitting changes the coefficients.
+    default_cache = None
+    settings_version = 2
+    coefficient_columns = ['beta_base', 'beta_betc', 'beta_beth', 'beta_cdd', 'beta_hdd']
+
+    def __init__(self, cache_dir=None):
+        if cache_dir is None:
+            s_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+            cache_dir = os.environ.get('BETTER_BENCHMARK_CACHE', s_path + '/Data/Benchmark/cache')
+        self.cache_dir = cache_dir
+        for kind in ['models', 'stats']:
+            os.makedirs(os.path.join(self.cache_dir, kind), exist_ok=True)
+
+    @classmethod
+    def get_default(cls):
+        if cls.default_cache is None:
+            cls.default_cache = cls()
+        return cls.default_cache
+
+    @classmethod
+    def set_default(cls, cache):
+        cls.default_cache = cache
+
+    @staticmethod
+    def building_key(bldg_id, raw_utility, d_settings):
+        # raw_utility: the (address, area, space type, currency, utility type, Utility, coord) tuple of
+        # Portfolio.get_portfolio_raw_data_by_spaceType_and_utilityType
+        sha = hashlib.sha1()
+        sha.update(json.dumps([str(bldg_id), BenchmarkCache.settings_version, sorted(d_settings.items())] +
+                              [str(value) for value in raw_utility[:5]] + [str(raw_utility[6])] +
+                              BenchmarkCache.weather_key(raw_utility, d_settings)).encode('utf-8'))
+        utility_temp = raw_utility[5]
+        if hasattr(utility_temp, 'df_raw_data'):
+            sha.update(pd.util.hash_pandas_object(utility_temp.df_raw_data, index=False).values.tobytes())
+            sha.update(str(list(utility_temp.df_raw_data.columns)).encode('utf-8'))
+        return (sha.hexdigest())
+
+    @staticmethod
+    def weather_key(raw_utility, d_settings):
+        # The weather inputs of the model: the station catalog, the stations closest to the building if its
+        # coordinates are known (otherwise the address and the catalog determine them), and the weather source: the
+        # size and time of the pre-downloaded station-year files, or the weather server
+        v_key = [WeatherStationCatalog.fingerprint()]
+        coord, utility_temp = raw_utility[6], raw_utility[5]
+        if coord is None:
+            return v_key
+        df_stations = WeatherStationCatalog.get()
+        v_index = weather.WeatherStationIndex.get(df_stations).query(coord[0], coord[1], k=3)[0][0]
+        v_station_ID = list(df_stations['station_ID'].iloc[v_index])
+        v_key += v_station_ID
+        if not d_settings.get('cached_weather'):
+            v_key.append(WeatherFetcher.get_default().url.geturl())
+        elif hasattr(utility_temp, 'df_raw_data'):
+            v_years = weather.Weather.billing_years(pd.to_datetime(utility_temp.df_raw_data.iloc[:, 0]),
+                                                    pd.to_datetime(utility_temp.df_raw_data.iloc[:, 1]))
+            for station_ID in v_station_ID:
+                for year in v_years:
+                    try:
+                        stat = os.stat(weather.Weather.csv_weather_file(station_ID, year))
+                        v_key.append([stat.st_size, stat.st_mtime])
+                    except OSError:
+                        v_key.append(None)
+        return v_key
+
+    @staticmethod
+    def stats_key(v_building_keys):
+        return (hashlib.sha1(json.dumps(sorted(v_building_keys)).encode('utf-8')).hexdigest())
+
+    def file_path(self, kind, key):
+        return os.path.join(self.cache_dir, kind, key + '.json')
+
+    def write_json_atomic(self, file_name, data):
+        s_data = json.dumps(data).encode('utf-8')
+        f_temp, temp_name = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(f_temp, 'wb') as f:
+                f.write(s_data)
+            os.replace(temp_name, file_name)
+        except:
+            if os.path.exists(temp_name):
+                os.remove(temp_name)
+            raise
+
+    def read_json(self, file_name):
+        # Returns None if the file is missing or corrupt
+        try:
+            with open(file_name, 'r') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def get_building_models(self, v_building_keys):
+        # Returns the cached coefficients by building key: a dict of the coefficients, None if no model was fit
+        d_models = {}
+        for key in v_building_keys:
+            d_entry = self.read_json(self.file_path('models', key))
+            if d_entry is not None:
+                d_models[key] = d_entry['coefficients']
+        return (d_models)
+
+    def put_building_models(self, d_new_models):
+        for key, d_coefficients in d_new_models.items():
+            self.write_json_atomic(self.file_path('models', key), {'coefficients': d_coefficients})
+
+    def get_stats(self, stats_key):
+        d_stats = self.read_json(self.file_path('stats', stats_key))
+        if d_stats is None:
+            return None
+        df_bench_stats = pd.DataFrame(d_stats).astype(float)
+        df_bench_stats.index.name = "coefficient"
+        return (df_bench_stats)
+
+    def put_stats(self, stats_key, df_bench_stats):
+        self.write_json_atomic(self.file_path('stats', stats_key), df_bench_stats.astype(float).to_dict())
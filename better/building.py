@@ -16,19 +16,30 @@ import assessment
 
 import pandas as pd
 import numpy as np
-import geocoder
+import geocoding
 import copy
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
 
 
 class Building:
-    def __init__(self, bldg_id, bldg_name, bldg_address, bldg_type, bldg_area, currency='US Dollar', saving_target=2):
+    def __init__(self, bldg_id, bldg_name, bldg_address, bldg_type, bldg_area, currency='US Dollar', saving_target=2,
+                 coord=None):
+        # coord: (latitude, longitude) of the building if it is already known, the address is geocoded otherwise
         self.bldg_id = bldg_id
         self.bldg_name = bldg_name
         self.bldg_address = bldg_address
         self.bldg_type = bldg_type
         self.bldg_area = round(bldg_area, 1)
         self.currency = currency
-        self.geocode_address()
+        if coord is None:
+            self.geocode_address()
+        else:
+            self.coord = list(coord)
+            self.latitude, self.longitude = self.coord
+            self.geo_address = bldg_address
 
         self.saving_target = saving_target
         if(saving_target==1):
@@ -38,21 +49,13 @@ class Building:
         else:
             self.saving_target_str = 'Aggressive'
 
-    def geocode_address(self):
-        # Note: google API might not be accessible in China
-        # Change the geocoder to Baidu or other Chinese search engine for Chinese tool
-        try:
-            # Try different geocoders: Google -> ArcGIS -> Bing -> Baidu
-            self.geo_coder = geocoder.google(self.bldg_address)
-            if (self.geo_coder.latlng is None):
-                self.geo_coder = geocoder.arcgis(self.bldg_address)
-            if (self.geo_coder.latlng is None):
-                self.geo_coder = geocoder.bing(self.bldg_address)
-            if (self.geo_coder.latlng is None):
-                self.geo_coder = geocoder.baidu(self.bldg_address)
-        except:
-            raise ("Try another geocoder provider")
+    @staticmethod
+    def geocode(address):
+        # Cached, see geocoding.Geocoder
+        return (geocoding.Geocoder.get_default().geocode(address))
 
+    def geocode_address(self):
+        self.geo_coder = Building.geocode(self.bldg_address)
         self.coord = self.geo_coder.latlng
         self.latitude, self.longitude = self.coord
         self.geo_address = self.geo_coder.address
@@ -69,20 +72,18 @@ class Building:
 
     def add_weather(self, cached=True, weather_e=None, weather_f=None):
         # cached: True ~ pre-downloaded weather dat, False ~ download the weather on the go.
+        # Each fuel gets the weather of its own billing years, falling back to the next closest station on its own
+        # when a year is not available. The station-years loaded for one fuel are shared with the other, so the
+        # years common to both fuels are only loaded once.
+        d_station_years = {}
         if (weather_e is not None and hasattr(self.utility_electricity, "df_raw_data")):
             self.weather_electricity = copy.deepcopy(weather_e)
             self.weather_electricity.process(self.utility_electricity.df_periods)
-            if cached:
-                self.weather_electricity.use_downloaded_weather()
-            else:
-                self.weather_electricity.download_weather_NOAA()
+            self.weather_electricity.load_weather(cached, d_station_years)
         if (weather_f is not None and hasattr(self.utility_fossil_fuel, "df_raw_data")):
             self.weather_fossil_fuel = copy.deepcopy(weather_f)
             self.weather_fossil_fuel.process(self.utility_fossil_fuel.df_periods)
-            if cached:
-                self.weather_fossil_fuel.use_downloaded_weather()
-            else:
-                self.weather_fossil_fuel.download_weather_NOAA()
+            self.weather_fossil_fuel.load_weather(cached, d_station_years)
 
     def pre_process(self):
         # Calculate energy, cost, and EUI
@@ -110,26 +111,29 @@ class Building:
             self.annual_eui_fossil_fuel = round(
                 self.eui_daily_all_periods_fossil_fuel * constants.Constants.days_in_year, 2)
 
-    def fit_inverse_model(self):
+    def fit_inverse_model(self, solver='curve_fit'):
+        # solver: 'curve_fit' ~ iterative bounded fits, 'grid' ~ exact single-pass fit (see model.InverseModel.fit_grid)
 
         # Pre-processing
         self.pre_process()
         has_fit_e = has_fit_f = False
         # Fit change-point model for electricity consumption
-        print('Fitting electricity model...')
+        logger.debug('Fitting electricity model...')
         if (hasattr(self, "weather_electricity")):
             self.im_electricity = model.InverseModel(self.weather_electricity.v_T_C,
                                                      self.eui_daily_electricity,
-                                                     'Electricity')
+                                                     'Electricity',
+                                                     solver=solver)
             has_fit_e = self.im_electricity.fit_model()
             if (has_fit_e):
                 self.im_electricity.plot_IM(self)
         # Fit change-point model for fossil fuel consumption
-        print('Fitting fossil fuel model...')
+        logger.debug('Fitting fossil fuel model...')
         if (hasattr(self, "weather_fossil_fuel")):
             self.im_fossil_fuel = model.InverseModel(self.weather_fossil_fuel.v_T_C,
                                                      self.eui_daily_fossil_fuel,
-                                                     'Fossil Fuel')
+                                                     'Fossil Fuel',
+                                                     solver=solver)
             has_fit_f = self.im_fossil_fuel.fit_model()
             if (has_fit_f): self.im_fossil_fuel.plot_IM(self)
         return (has_fit_e or has_fit_f)
@@ -140,7 +144,7 @@ class Building:
         This function add Benchmark instances for the current Building instance
         :return:
         """
-        print("Start benchamrking")
+        logger.debug("Start benchmarking")
         if use_default:
             df_sample_bench_stats_e = constants.Constants.df_sample_benchmark_stats_e
             df_sample_bench_stats_f = constants.Constants.df_sample_benchmark_stats_f
@@ -230,8 +234,9 @@ class Building:
         self.benchmarking_bar_ccp_f_html = benchmark.Benchmark.generate_benchmark_bar_html(self.benchmark_CCP_f)
         self.benchmarking_bar_csl_f_html = benchmark.Benchmark.generate_benchmark_bar_html(self.benchmark_CSL_f)
 
-    def ee_assess(self, use_default=True, df_benchmark_stats_electricity=None,
-                  df_benchmark_stats_fossil_fuel=None):
+    def get_assessment_data(self, use_default=True, df_benchmark_stats_electricity=None,
+                            df_benchmark_stats_fossil_fuel=None):
+        # Benchmark stats and site coefficients of the electricity and fossil fuel models
         # Current building model coefficients
         if (hasattr(self, "im_electricity") and hasattr(self.im_electricity, "coeffs")):
             building_coeffs_e = [
@@ -265,44 +270,51 @@ class Building:
 
         df_assessment_e["site_coefficients"] = building_coeffs_e
         df_assessment_f["site_coefficients"] = building_coeffs_f
+        return df_assessment_e, df_assessment_f
+
+    def ee_assess(self, use_default=True, df_benchmark_stats_electricity=None,
+                  df_benchmark_stats_fossil_fuel=None):
+        df_assessment_e, df_assessment_f = self.get_assessment_data(use_default, df_benchmark_stats_electricity,
+                                                                    df_benchmark_stats_fossil_fuel)
 
         # Assess energy efficient measures
         if (not pd.isna(df_assessment_e['site_coefficients']).all()):
             # Assess only if there is an electricity change-point model
             FIM_analysis_e = assessment.LEAN_FIMs(df_assessment_e, 1)  # (electricity = 1, fossil fuel = 2)
             FIM_analysis_e.set_targets(self.saving_target)  # conservative = 1, nominal = 2, aggressive = 3
-            self.FIM_table_e = FIM_analysis_e.FIM_recommendations(save_file=False)
-            self.coeff_out_e = FIM_analysis_e.savings_coefficients(save_file=False)
-            # Save the suggested new model coefficients
-            df_new_coeffs_e = FIM_analysis_e.savings_coefficients()['savings_coefficients']
-            self.base_new_e = df_new_coeffs_e['beta_base']
-            self.hsl_new_e = -df_new_coeffs_e['beta_hdd']
-            self.hcp_new_e = df_new_coeffs_e['beta_beth']
-            self.csl_new_e = df_new_coeffs_e['beta_cdd']
-            self.ccp_new_e = df_new_coeffs_e['beta_betc']
-            self.p_new_e = self.hcp_new_e, self.ccp_new_e, self.base_new_e, self.hsl_new_e, self.csl_new_e
-
-            # print(self.p_new_e)
-
-            ls_p = FIM_analysis_e.benchmark_medians.tolist()
-            self.p_typical_e = ls_p[4], ls_p[2], ls_p[0], -ls_p[3], ls_p[1]
+            self.set_assessment('_e', FIM_analysis_e.FIM_recommendations(save_file=False),
+                                FIM_analysis_e.savings_coefficients(save_file=False), FIM_analysis_e.benchmark_medians)
 
         if (not pd.isna(df_assessment_f['site_coefficients']).all()):
             # Assess only if there is a fossil fuel change-point model
             FIM_analysis_f = assessment.LEAN_FIMs(df_assessment_f, 2)  # (electricity = 1, fossil fuel = 2)
             FIM_analysis_f.set_targets(self.saving_target)  # conservative = 1, nominal = 2, aggressive = 3
-            self.FIM_table_f = FIM_analysis_f.FIM_recommendations(save_file=False)
-            self.coeff_out_f = FIM_analysis_f.savings_coefficients(save_file=False)
-            df_new_coeffs_f = FIM_analysis_f.savings_coefficients()['savings_coefficients']
-            self.base_new_f = df_new_coeffs_f['beta_base']
-            self.hsl_new_f = -df_new_coeffs_f['beta_hdd']
-            self.hcp_new_f = df_new_coeffs_f['beta_beth']
-            self.csl_new_f = df_new_coeffs_f['beta_cdd']
-            self.ccp_new_f = df_new_coeffs_f['beta_betc']
-            self.p_new_f = self.hcp_new_f, self.ccp_new_f, self.base_new_f, self.hsl_new_f, self.csl_new_f
-            ls_p = FIM_analysis_f.benchmark_medians.tolist()
-            self.p_typical_f = ls_p[4], ls_p[2], ls_p[0], -ls_p[3], ls_p[1]
+            self.set_assessment('_f', FIM_analysis_f.FIM_recommendations(save_file=False),
+                                FIM_analysis_f.savings_coefficients(save_file=False), FIM_analysis_f.benchmark_medians)
+        self.set_FIM_list()
+
+    def set_assessment(self, suffix, FIM_table, coeff_out, v_benchmark_medians):
+        # Keep the measures and the new model coefficients of the saving target of a fuel ('_e' or '_f')
+        setattr(self, 'FIM_table' + suffix, FIM_table)
+        setattr(self, 'coeff_out' + suffix, coeff_out)
+        # Save the suggested new model coefficients
+        df_new_coeffs = coeff_out['savings_coefficients']
+        setattr(self, 'base_new' + suffix, df_new_coeffs['beta_base'])
+        setattr(self, 'hsl_new' + suffix, -df_new_coeffs['beta_hdd'])
+        setattr(self, 'hcp_new' + suffix, df_new_coeffs['beta_beth'])
+        setattr(self, 'csl_new' + suffix, df_new_coeffs['beta_cdd'])
+        setattr(self, 'ccp_new' + suffix, df_new_coeffs['beta_betc'])
+        setattr(self, 'p_new' + suffix, Building.new_model_p(df_new_coeffs))
+        ls_p = v_benchmark_medians.tolist()
+        setattr(self, 'p_typical' + suffix, (ls_p[4], ls_p[2], ls_p[0], -ls_p[3], ls_p[1]))
 
+    @staticmethod
+    def new_model_p(df_new_coeffs):
+        # Change-point model coefficients (hcp, ccp, base, hsl, csl) of the savings coefficients
+        return (df_new_coeffs['beta_beth'], df_new_coeffs['beta_betc'], df_new_coeffs['beta_base'],
+                -df_new_coeffs['beta_hdd'], df_new_coeffs['beta_cdd'])
+
+    def set_FIM_list(self):
         # Get final fim list
         if (hasattr(self, 'FIM_table_e') and not hasattr(self, 'FIM_table_f')):
             df_FIM = self.FIM_table_e
@@ -316,51 +328,63 @@ class Building:
             df_FIM = df_FIM[(df_FIM['FIM Electricity'] == 'X') | (df_FIM['FIM Fossil Fuel'] == 'X')]
         self.FIM_list = list(df_FIM.index)
 
+    # Attribute suffix of each fuel: (name, change-point model, utility and weather attributes)
+    d_fuels = OrderedDict([('_e', ('electricity', 'im_electricity', 'utility_electricity', 'weather_electricity')),
+                           ('_f', ('fossil fuel', 'im_fossil_fuel', 'utility_fossil_fuel', 'weather_fossil_fuel'))])
+
     def calculate_savings(self):
         self.total_energy_consumption_old = 0
-        if (not hasattr(self, "p_new_e")):
-            print("No saving model found for electricity consumption!")
-        else:
-            # Calculate electricity savings (all and most recent year)
-            self.v_old_daily_eui_all_e = model.InverseModel.piecewise_linear(self.weather_electricity.v_T_C, *self.im_electricity.model_p)
-            self.v_new_daily_eui_all_e = model.InverseModel.piecewise_linear(self.weather_electricity.v_T_C, *self.p_new_e)
-            self.v_old_consumption_all_e = np.round(self.bldg_area * np.multiply(self.v_old_daily_eui_all_e, self.utility_electricity.days), 1)
-            self.v_new_consumption_all_e = np.round(self.bldg_area * np.multiply(self.v_new_daily_eui_all_e, self.utility_electricity.days), 1)
-            self.v_old_consumption_last_year_e = self.v_old_consumption_all_e[-12:]
-            self.v_new_consumption_last_year_e = self.v_new_consumption_all_e[-12:]
-            self.old_consumption_last_year_e = np.sum(self.v_old_consumption_last_year_e)
-            self.new_consumption_last_year_e = np.sum(self.v_new_consumption_last_year_e)
-            self.total_energy_savings_last_year_e = self.old_consumption_last_year_e - self.new_consumption_last_year_e
-            self.total_energy_savings_pct_last_year_e = np.round(self.total_energy_savings_last_year_e / self.old_consumption_last_year_e * 100, 2)
-            # Calculate cost savings
-            if (not hasattr(self.utility_electricity, 'utility_unit_price')):
-                self.utility_electricity.utility_unit_price = constants.Constants.electricity_unit_price
-                print('Warning: No electricity cost data provided, using default value!')
-            self.total_cost_savings_e = round(self.utility_electricity.utility_unit_price * self.total_energy_savings_last_year_e, 1)
-            self.total_energy_consumption_old += self.old_consumption_last_year_e
-
-        if (not hasattr(self, "p_new_f")):
-            print("No saving model found for fossil fuel consumption!")
-        else:
-            # Calculate fossil_fuel savings (all and most recent year)
-            self.v_old_daily_eui_all_f = model.InverseModel.piecewise_linear(self.weather_fossil_fuel.v_T_C, *self.im_fossil_fuel.model_p)
-            self.v_new_daily_eui_all_f = model.InverseModel.piecewise_linear(self.weather_fossil_fuel.v_T_C, *self.p_new_f)
-            self.v_old_consumption_all_f = np.round(self.bldg_area * np.multiply(self.v_old_daily_eui_all_f, self.utility_fossil_fuel.days), 1)
-            self.v_new_consumption_all_f = np.round(self.bldg_area * np.multiply(self.v_new_daily_eui_all_f, self.utility_fossil_fuel.days), 1)
-            self.v_old_consumption_last_year_f = self.v_old_consumption_all_f[-12:]
-            self.v_new_consumption_last_year_f = self.v_new_consumption_all_f[-12:]
-            self.old_consumption_last_year_f = np.sum(self.v_old_consumption_last_year_f)
-            self.new_consumption_last_year_f = np.sum(self.v_new_consumption_last_year_f)
-            self.total_energy_savings_last_year_f = self.old_consumption_last_year_f - self.new_consumption_last_year_f
-            self.total_energy_savings_pct_last_year_f = np.round(self.total_energy_savings_last_year_f / self.old_consumption_last_year_f * 100, 2)
-            # Calculate cost savings
-            if (not hasattr(self.utility_fossil_fuel, 'utility_unit_price')):
-                self.utility_fossil_fuel.utility_unit_price = constants.Constants.fossil_fuel_unit_price
-                print('Warning: No fossil_fuel cost data provided, using default value!')
-            self.total_cost_savings_f = round(self.utility_fossil_fuel.utility_unit_price * self.total_energy_savings_last_year_f, 1)
-            self.total_energy_consumption_old += self.old_consumption_last_year_f
-
-
+        for suffix, (fuel, im_name, _, weather_name) in Building.d_fuels.items():
+            if (not hasattr(self, 'p_new' + suffix)):
+                logger.debug("No saving model found for %s consumption!", fuel)
+            else:
+                # Calculate the savings (all and most recent year)
+                v_T = getattr(self, weather_name).v_T_C
+                self.set_savings(suffix, self.fuel_savings(
+                    suffix, model.InverseModel.piecewise_linear(v_T, *getattr(self, im_name).model_p),
+                    model.InverseModel.piecewise_linear(v_T, *getattr(self, 'p_new' + suffix))))
+        self.sum_savings()
+
+    def unit_price(self, suffix):
+        # Utility unit price of a fuel ('_e' or '_f'), the default price if there is no cost data
+        utility_temp = getattr(self, Building.d_fuels[suffix][2])
+        if (not hasattr(utility_temp, 'utility_unit_price')):
+            if (suffix == '_e'):
+                utility_temp.utility_unit_price = constants.Constants.electricity_unit_price
+                logger.warning('No electricity cost data provided, using default value!')
+            else:
+                utility_temp.utility_unit_price = constants.Constants.fossil_fuel_unit_price
+                logger.warning('No fossil_fuel cost data provided, using default value!')
+        return (utility_temp.utility_unit_price)
+
+    def fuel_savings(self, suffix, v_old_daily_eui_all, v_new_daily_eui_all):
+        # Savings of a fuel ('_e' or '_f') from the daily EUI of its billing periods before and after the improvements
+        # Returns the savings attributes of the fuel without their suffix
+        days = getattr(self, Building.d_fuels[suffix][2]).days
+        d_savings = OrderedDict()
+        d_savings['v_old_daily_eui_all'] = v_old_daily_eui_all
+        d_savings['v_new_daily_eui_all'] = v_new_daily_eui_all
+        d_savings['v_old_consumption_all'] = np.round(self.bldg_area * np.multiply(v_old_daily_eui_all, days), 1)
+        d_savings['v_new_consumption_all'] = np.round(self.bldg_area * np.multiply(v_new_daily_eui_all, days), 1)
+        d_savings['v_old_consumption_last_year'] = d_savings['v_old_consumption_all'][-12:]
+        d_savings['v_new_consumption_last_year'] = d_savings['v_new_consumption_all'][-12:]
+        d_savings['old_consumption_last_year'] = np.sum(d_savings['v_old_consumption_last_year'])
+        d_savings['new_consumption_last_year'] = np.sum(d_savings['v_new_consumption_last_year'])
+        energy_savings = d_savings['old_consumption_last_year'] - d_savings['new_consumption_last_year']
+        d_savings['total_energy_savings_last_year'] = energy_savings
+        d_savings['total_energy_savings_pct_last_year'] = np.round(
+            energy_savings / d_savings['old_consumption_last_year'] * 100, 2)
+        # Calculate cost savings
+        d_savings['total_cost_savings'] = round(self.unit_price(suffix) * energy_savings, 1)
+        return (d_savings)
+
+    def set_savings(self, suffix, d_savings):
+        # Keep the savings of the saving target of a fuel ('_e' or '_f'), see fuel_savings
+        for name, value in d_savings.items():
+            setattr(self, name + suffix, value)
+        self.total_energy_consumption_old += d_savings['old_consumption_last_year']
+
+    def sum_savings(self):
         # Get combined total savings
         self.total_energy_savings = 0
         self.total_cost_savings = 0
@@ -508,6 +532,21 @@ class Building:
         return sum(v_base_consumption), sum(v_heating_consumption), sum(v_cooling_consumption)
 
     def disaggregate_consumption_wrapper(self):
+        # Annualize the consumption (How?)
+        # Calculate the diaggregated consumption of the most recent year with the current, typical and new models
+        d_disaggregation = OrderedDict()
+        for suffix, (_, im_name, utility_name, weather_name) in Building.d_fuels.items():
+            if (hasattr(self, 'v_new_consumption_last_year' + suffix)):
+                v_T_last_year = getattr(self, weather_name).v_T_C[-12:]
+                v_days_last_year = getattr(self, utility_name).days[-12:]
+                d_disaggregation[suffix] = (self.unit_price(suffix),) + tuple(
+                    self.disaggregate_consumption(v_T_last_year, v_days_last_year, model_p, self.bldg_area)
+                    for model_p in [getattr(self, im_name).model_p, getattr(self, 'p_typical' + suffix),
+                                    getattr(self, 'p_new' + suffix)])
+        self.set_disaggregation(d_disaggregation)
+
+    def set_disaggregation(self, d_disaggregation):
+        # d_disaggregation: fuel suffix -> (unit price, disaggregate_consumption of the current, typical and new models)
         # All the consumption terms are in kWh in this function
         # Consumption (kWh)
         self.base_old = 0
@@ -531,88 +570,96 @@ class Building:
         self.heating_new_cost = 0
         self.cooling_new_cost = 0
 
-        # Annualize the consumption (How?)
-        # Calculate the diaggregated consumption
-        if (hasattr(self, "v_new_consumption_last_year_e")):
-            unit_price_e = self.utility_electricity.utility_unit_price
-            base_old_e, heating_old_e, cooling_old_e = self.disaggregate_consumption(
-                self.weather_electricity.v_T_C[-12:],
-                self.utility_electricity.days[-12:],
-                self.im_electricity.model_p,
-                self.bldg_area
-            )
-            base_typical_e, heating_typical_e, cooling_typical_e = self.disaggregate_consumption(
-                self.weather_electricity.v_T_C[-12:],
-                self.utility_electricity.days[-12:],
-                self.p_typical_e,
-                self.bldg_area
-            )
-            base_new_e, heating_new_e, cooling_new_e = self.disaggregate_consumption(
-                self.weather_electricity.v_T_C[-12:],
-                self.utility_electricity.days[-12:],
-                self.p_new_e,
-                self.bldg_area
-            )
-
-            self.base_old += base_old_e
-            self.base_typical += base_typical_e
-            self.base_new += base_new_e
-            self.heating_old += heating_old_e
-            self.heating_typical += heating_typical_e
-            self.heating_new += heating_new_e
-            self.cooling_old += cooling_old_e
-            self.cooling_typical += cooling_typical_e
-            self.cooling_new += cooling_new_e
-
-            self.base_old_cost += base_old_e * unit_price_e
-            self.base_typical_cost += base_typical_e * unit_price_e
-            self.base_new_cost += base_new_e * unit_price_e
-            self.heating_old_cost += heating_old_e * unit_price_e
-            self.heating_typical_cost += heating_typical_e * unit_price_e
-            self.heating_new_cost += heating_new_e * unit_price_e
-            self.cooling_old_cost += cooling_old_e * unit_price_e
-            self.cooling_typical_cost += cooling_typical_e * unit_price_e
-            self.cooling_new_cost += cooling_new_e * unit_price_e
-
-
-        if (hasattr(self, "v_new_consumption_last_year_f")):
-            unit_price_f = self.utility_fossil_fuel.utility_unit_price
-            base_old_f, heating_old_f, cooling_old_f = self.disaggregate_consumption(
-                self.weather_fossil_fuel.v_T_C[-12:],
-                self.utility_fossil_fuel.days[-12:],
-                self.im_fossil_fuel.model_p,
-                self.bldg_area
-            )
-
-            base_typical_f, heating_typical_f, cooling_typical_f = self.disaggregate_consumption(
-                self.weather_fossil_fuel.v_T_C[-12:],
-                self.utility_fossil_fuel.days[-12:],
-                self.p_typical_f,
-                self.bldg_area
-            )
-
-            base_new_f, heating_new_f, cooling_new_f = self.disaggregate_consumption(
-                self.weather_fossil_fuel.v_T_C[-12:],
-                self.utility_fossil_fuel.days[-12:],
-                self.p_new_f,
-                self.bldg_area
-            )
-            self.base_old += base_old_f
-            self.base_typical += base_typical_f
-            self.base_new += base_new_f
-            self.heating_old += heating_old_f
-            self.heating_typical += heating_typical_f
-            self.heating_new += heating_new_f
-            self.cooling_old += cooling_old_f
-            self.cooling_typical += cooling_typical_f
-            self.cooling_new += cooling_new_f
-
-            self.base_old_cost += base_old_f * unit_price_f
-            self.base_typical_cost += base_typical_f * unit_price_f
-            self.base_new_cost += base_new_f * unit_price_f
-            self.heating_old_cost += heating_old_f * unit_price_f
-            self.heating_typical_cost += heating_typical_f * unit_price_f
-            self.heating_new_cost += heating_new_f * unit_price_f
-            self.cooling_old_cost += cooling_old_f * unit_price_f
-            self.cooling_typical_cost += cooling_typical_f * unit_price_f
-            self.cooling_new_cost += cooling_new_f * unit_price_f
\ No newline at end of file
+        for unit_price, (base_old, heating_old, cooling_old), (base_typical, heating_typical, cooling_typical), \
+                (base_new, heating_new, cooling_new) in d_disaggregation.values():
+            self.base_old += base_old
+            self.base_typical += base_typical
+            self.base_new += base_new
+            self.heating_old += heating_old
+            self.heating_typical += heating_typical
+            self.heating_new += heating_new
+            self.cooling_old += cooling_old
+            self.cooling_typical += cooling_typical
+            self.cooling_new += cooling_new
+
+            self.base_old_cost += base_old * unit_price
+            self.base_typical_cost += base_typical * unit_price
+            self.base_new_cost += base_new * unit_price
+            self.heating_old_cost += heating_old * unit_price
+            self.heating_typical_cost += heating_typical * unit_price
+            self.heating_new_cost += heating_new * unit_price
+            self.cooling_old_cost += cooling_old * unit_price
+            self.cooling_typical_cost += cooling_typical * unit_price
+            self.cooling_new_cost += cooling_new * unit_price
+
+    def assess_scenarios(self, use_default=True, df_benchmark_stats_electricity=None,
+                         df_benchmark_stats_fossil_fuel=None, v_target_levels=(1, 2, 3)):
+        # Assess the conservative, nominal and aggressive targets together: the targets, measures, savings and
+        # disaggregated consumption of each target level. The consumption of the current and typical models does not
+        # depend on the target level and is disaggregated once.
+        # The results of the saving target of the building are kept as those of ee_assess, calculate_savings and
+        # disaggregate_consumption_wrapper, which don't need to be run.
+        # Returns a dataframe with a row per target level and fuel, also kept as self.df_scenarios
+        df_assessment_e, df_assessment_f = self.get_assessment_data(use_default, df_benchmark_stats_electricity,
+                                                                    df_benchmark_stats_fossil_fuel)
+        v_target_levels = list(v_target_levels)
+        if (self.saving_target not in v_target_levels):
+            v_target_levels.append(self.saving_target)
+        self.total_energy_consumption_old = 0
+        d_disaggregation = OrderedDict()
+        v_rows = []
+        for (suffix, (_, im_name, utility_name, weather_name)), utility_type, fuel, df_assessment in zip(
+                Building.d_fuels.items(), [1, 2], ['Electricity', 'Fossil Fuel'], [df_assessment_e, df_assessment_f]):
+            # Assess only if there is a change-point model for the fuel
+            if (pd.isna(df_assessment['site_coefficients']).all()):
+                continue
+            im = getattr(self, im_name)
+            v_T = getattr(self, weather_name).v_T_C
+            v_days_last_year = getattr(self, utility_name).days[-12:]
+            unit_price = self.unit_price(suffix)
+
+            FIM_analysis = assessment.LEAN_FIMs(df_assessment, utility_type)
+            d_levels = FIM_analysis.assess_target_levels(v_target_levels)
+            ls_p = FIM_analysis.benchmark_medians.tolist()
+            p_typical = ls_p[4], ls_p[2], ls_p[0], -ls_p[3], ls_p[1]
+            v_old_daily_eui_all = model.InverseModel.piecewise_linear(v_T, *im.model_p)
+            t_old = self.disaggregate_consumption(v_T[-12:], v_days_last_year, im.model_p, self.bldg_area)
+            t_typical = self.disaggregate_consumption(v_T[-12:], v_days_last_year, p_typical, self.bldg_area)
+
+            for target_level in v_target_levels:
+                coeff_out = d_levels[target_level]['savings_coefficients']
+                df_new_coeffs = coeff_out['savings_coefficients']
+                p_new = Building.new_model_p(df_new_coeffs)
+                d_savings = self.fuel_savings(suffix, v_old_daily_eui_all,
+                                              model.InverseModel.piecewise_linear(v_T, *p_new))
+                t_new = self.disaggregate_consumption(v_T[-12:], v_days_last_year, p_new, self.bldg_area)
+                if (target_level == self.saving_target):
+                    self.set_assessment(suffix, assessment.LEAN_FIMs.FIM_table_from_matrix(
+                        d_levels[target_level]['FIMs']), coeff_out, FIM_analysis.benchmark_medians)
+                    self.set_savings(suffix, d_savings)
+                    d_disaggregation[suffix] = (unit_price, t_old, t_typical, t_new)
+                v_FIMs = [FIM_name for FIM_name, is_recommended in
+                          zip(assessment.LEAN_FIMs.FIM_names, d_levels[target_level]['FIMs']) if is_recommended]
+                v_rows.append(OrderedDict([
+                    ('target_level', target_level),
+                    ('target', assessment.LEAN_FIMs.target_level_names[target_level]),
+                    ('utility_type', fuel),
+                    ('FIM_recommendations', '; '.join(v_FIMs)),
+                    ('consumption_old', d_savings['old_consumption_last_year']),
+                    ('consumption_new', d_savings['new_consumption_last_year']),
+                    ('energy_savings', d_savings['total_energy_savings_last_year']),
+                    ('energy_savings_pct', d_savings['total_energy_savings_pct_last_year']),
+                    ('cost_savings', d_savings['total_cost_savings']),
+                    ('base_old', t_old[0]), ('heating_old', t_old[1]), ('cooling_old', t_old[2]),
+                    ('base_typical', t_typical[0]), ('heating_typical', t_typical[1]),
+                    ('cooling_typical', t_typical[2]),
+                    ('base_new', t_new[0]), ('heating_new', t_new[1]), ('cooling_new', t_new[2])] +
+                    [(coefficient + '_new', df_new_coeffs[coefficient]) for coefficient in df_new_coeffs.index]))
+
+        self.set_FIM_list()
+        self.sum_savings()
+        self.set_disaggregation(d_disaggregation)
+        self.df_scenarios = pd.DataFrame(v_rows)
+        if (len(self.df_scenarios) > 0):
+            self.df_scenarios = self.df_scenarios.sort_values(['target_level', 'utility_type']).reset_index(drop=True)
+        return self.df_scenarios
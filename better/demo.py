@@ -13,8 +13,49 @@ import weather
 import building
 import portfolio
 import report
+from instrumentation import Instrumentation
 
 import os
+import sys
+import logging
+import traceback
+import concurrent.futures
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+# Arguments of the last configure_logging call, passed on to the worker processes of run_batch
+logging_config = None
+
+
+def module_loggers():
+    # Each module of the tool logs to logging.getLogger(<module name>), __main__ when it is run as a script
+    s_dir = os.path.dirname(os.path.realpath(__file__))
+    return ([os.path.splitext(file_name)[0] for file_name in sorted(os.listdir(s_dir)) if file_name.endswith('.py')] +
+            ['__main__'])
+
+
+def configure_logging(level=logging.INFO, quiet=False):
+    # Log the messages of the tool to stdout
+    # level: logging.DEBUG ~ per-building details (model fits, targets, weather years, report files)
+    # quiet: True ~ only the warnings, errors and the progress summaries of the batch runs
+    global logging_config
+    logging_config = (level, quiet)
+    logging.basicConfig(format='%(message)s', stream=sys.stdout)
+    for name in module_loggers():
+        logging.getLogger(name).setLevel(logging.WARNING if quiet else level)
+    # The batch progress is logged by this module
+    logger.setLevel(min(logging.INFO, level) if quiet else level)
+
+
+def load_portfolio(file_name=None):
+    # Parse the portfolio spreadsheet once so it can be shared by run_single/run_batch calls
+    if file_name is None:
+        s_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        file_name = s_path + '/Data/' + 'portfolio.xlsx'
+    p = portfolio.Portfolio('Test')
+    p.read_raw_data_from_xlsx(file_name)
+    return p
+
 
 def run_single(
     bldg_id = 1, 
@@ -26,72 +67,159 @@ def run_single(
     return_data=False,
     use_default_benchmark_data=True,
     df_user_bench_stats_e=None,
-    df_user_bench_stats_f=None
+    df_user_bench_stats_f=None,
+    batch_fit=False,
+    p=None,
+    all_scenarios=False,
+    profile=False,
+    solver='curve_fit',
+    use_benchmark_cache=False
     ):
-    # Set paths
-    s_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
-    data_path = s_path + '/Data/'
-    report_path = s_path + '/outputs/'
-
-    # Create an outputs directoty if there isn't one.
-    if not os.path.exists(report_path): os.makedirs(report_path)
-
-    # Initialize a portfolio instance
-    p = portfolio.Portfolio('Test')
-    # p.read_raw_data_from_xlsx(data_path + 'portfolio.xlsx')
-    p.read_raw_data_from_xlsx(data_path + 'portfolio.xlsx')
+    # p: a portfolio parsed by load_portfolio; the portfolio spreadsheet is read if it is not passed in
+    # solver: change-point model solver, 'curve_fit' ~ iterative bounded fits, 'grid' ~ exact single-pass search
+    # (see model.InverseModel.fit_grid), also used for the buildings of the benchmark stats
+    # profile: True ~ log the wall time, CPU time and peak memory of each stage of the analysis. The peak memory is
+    # only traced with profile=True (tracemalloc slows the analysis down), otherwise the stages record the times only
+    # all_scenarios: True ~ assess the conservative, nominal and aggressive targets together in the pass that assesses
+    # the saving target, and write the scenarios to bldg_<id>_scenarios.csv
+    # use_benchmark_cache: True ~ reuse the benchmark stats and building models of previous runs when the benchmark
+    # stats are generated from the portfolio, see run_batch
+    if p is None:
+        p = load_portfolio()
 
     # Get building data from the portfolio
     building_id = bldg_id
-    building_info = p.get_building_info_by_id(building_id)
-    if(building_info == None):
+    building_view = p.get_building_view(building_id)
+    if(building_view == None):
         return False, None
     else:
-        # Initialize a building instance
-        building_test = building.Building(building_id, *building_info, saving_target)
-        # Get utility data from portfolio
-        df_raw_electricity = p.get_utility_by_building_id_and_energy_type(building_ID=building_id, energy_type=1)
-        df_raw_fossil_fuel = p.get_utility_by_building_id_and_energy_type(building_ID=building_id, energy_type=2)
+        building_info, df_raw_electricity, df_raw_fossil_fuel = building_view
+        return analyze_building(
+            building_id,
+            building_info,
+            df_raw_electricity,
+            df_raw_fossil_fuel,
+            saving_target=saving_target,
+            space_type=space_type,
+            cached_weather=cached_weather,
+            write_fim=write_fim,
+            write_model=write_model,
+            use_default_benchmark_data=use_default_benchmark_data,
+            df_user_bench_stats_e=df_user_bench_stats_e,
+            df_user_bench_stats_f=df_user_bench_stats_f,
+            batch_fit=batch_fit,
+            p=p,
+            coord=p.get_building_coord(building_id),
+            all_scenarios=all_scenarios,
+            profile=profile,
+            solver=solver,
+            use_benchmark_cache=use_benchmark_cache
+            )
+
+
+def analyze_building(
+    building_id,
+    building_info,
+    df_raw_electricity,
+    df_raw_fossil_fuel,
+    saving_target=2,
+    space_type='Office',
+    cached_weather=True,
+    write_fim=True,
+    write_model=True,
+    use_default_benchmark_data=True,
+    df_user_bench_stats_e=None,
+    df_user_bench_stats_f=None,
+    batch_fit=False,
+    p=None,
+    coord=None,
+    all_scenarios=False,
+    profile=False,
+    instrumentation=None,
+    solver='curve_fit',
+    use_benchmark_cache=False
+    ):
+    # Analyze one building from its portfolio data
+    # p: the portfolio, only needed to generate the benchmark stats when they are not passed in
+    # coord: (latitude, longitude) of the building, e.g. from Portfolio.prefetch_weather; geocoded if not passed in
+    # profile: True ~ also record the peak memory of each stage (not traced otherwise, tracemalloc slows the analysis
+    # down), and log the stage record at INFO instead of DEBUG
+    # instrumentation: an instrumentation.Instrumentation recording the stages, e.g. with a callback
+    # solver: change-point model solver, see run_single
+    # use_benchmark_cache: True ~ reuse the cached benchmark stats and building models, see run_batch
+    # The stage record is kept as building_test.timing_record
+    if instrumentation is None:
+        instrumentation = Instrumentation(building_id, trace_memory=profile)
+    stage = instrumentation.stage
+    s_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+    report_path = s_path + '/outputs/'
+
+    # Create an outputs directoty if there isn't one.
+    if not os.path.exists(report_path): os.makedirs(report_path, exist_ok=True)
+
+    # Initialize a building instance
+    with stage('geocoding'):
+        building_test = building.Building(building_id, *building_info, saving_target, coord=coord)
+    with stage('utility'):
         df_raw_utility_e = df_raw_electricity
         df_raw_utility_f = df_raw_fossil_fuel
         utility_test_e = utility.Utility('electricity', df_raw_utility_e)
         utility_test_f = utility.Utility('fossil fuel', df_raw_utility_f)
         building_test.add_utility(utility_test_e, utility_test_f)
-        weather_test_e = weather.Weather(building_test.coord)
-        weather_test_f = weather.Weather(building_test.coord)
-        building_test.add_weather(cached_weather, weather_test_e, weather_test_f)
-    
-        # Fit inverse model and benchmark
-        has_fit = building_test.fit_inverse_model()
-        # Continue only if there is at least one change-point model fit.
-        if has_fit:
-            if (use_default_benchmark_data):
+    with stage('weather'):
+        weather_test = weather.Weather(building_test.coord)
+        building_test.add_weather(cached_weather, weather_test, weather_test)
+
+    # Fit inverse model and benchmark
+    with stage('fit'):
+        has_fit = building_test.fit_inverse_model(solver)
+    # Continue only if there is at least one change-point model fit.
+    if has_fit:
+        if (use_default_benchmark_data):
+            with stage('benchmark'):
                 building_test.benchmark()
-                building_test.ee_assess()
-            else:
+            d_benchmark_stats = {}
+        else:
+            with stage('benchmark'):
                 # Note: the benchmark data sets are generated from the portfolio spreadsheet.
                 # 1 ~ electricity; 2 ~ fossil fuel
-                dict_raw_electricity = p.get_portfolio_raw_data_by_spaceType_and_utilityType(space_type, utility_type=1)
-                dict_raw_fossil_fuel = p.get_portfolio_raw_data_by_spaceType_and_utilityType(space_type, utility_type=2)
-    
                 # Generate the benchmark stats from the user provided data in the portfolio spreadsheet
                 if df_user_bench_stats_e is None:
-                    df_user_bench_stats_e = p.generate_benchmark_stats_wrapper(dict_raw_electricity, cached_weather)
+                    dict_raw_electricity = p.get_portfolio_raw_data_by_spaceType_and_utilityType(space_type, utility_type=1)
+                    df_user_bench_stats_e = p.generate_benchmark_stats_wrapper(dict_raw_electricity, cached_weather, batch_fit,
+                                                                               solver=solver,
+                                                                               use_cache=use_benchmark_cache)
                 if df_user_bench_stats_f is None:
-                    df_user_bench_stats_f = p.generate_benchmark_stats_wrapper(dict_raw_fossil_fuel, cached_weather)
-    
+                    dict_raw_fossil_fuel = p.get_portfolio_raw_data_by_spaceType_and_utilityType(space_type, utility_type=2)
+                    df_user_bench_stats_f = p.generate_benchmark_stats_wrapper(dict_raw_fossil_fuel, cached_weather, batch_fit,
+                                                                               solver=solver,
+                                                                               use_cache=use_benchmark_cache)
+
                 building_test.benchmark(use_default=False,
                                         df_benchmark_stats_electricity=df_user_bench_stats_e,
                                         df_benchmark_stats_fossil_fuel=df_user_bench_stats_f)
-                building_test.ee_assess(use_default=False,
-                                        df_benchmark_stats_electricity=df_user_bench_stats_e,
-                                        df_benchmark_stats_fossil_fuel=df_user_bench_stats_f)
-    
-            building_test.calculate_savings()
-            building_test.plot_savings()
-            building_test.disaggregate_consumption_wrapper()
-    
-            # Output to files
+            d_benchmark_stats = {'use_default': False,
+                                 'df_benchmark_stats_electricity': df_user_bench_stats_e,
+                                 'df_benchmark_stats_fossil_fuel': df_user_bench_stats_f}
+
+        if all_scenarios:
+            # One pass over the target levels, it also keeps the savings and disaggregated consumption of the saving
+            # target, in place of ee_assess, calculate_savings and disaggregate_consumption_wrapper
+            with stage('assessment'):
+                building_test.assess_scenarios(**d_benchmark_stats)
+            with stage('savings'):
+                building_test.plot_savings()
+        else:
+            with stage('assessment'):
+                building_test.ee_assess(**d_benchmark_stats)
+            with stage('savings'):
+                building_test.calculate_savings()
+                building_test.plot_savings()
+            with stage('disaggregation'):
+                building_test.disaggregate_consumption_wrapper()
+
+        # Output to files
+        with stage('csv_export'):
             # Save FIM to csv
             if (hasattr(building_test, 'FIM_table_e')):
                 if write_model: building_test.coeff_out_e.to_csv(report_path + 'bldg_' + str(building_test.bldg_id) + "_Electricity Coeffs_out.csv")
@@ -99,14 +227,33 @@ def run_single(
             if (hasattr(building_test, 'FIM_table_f')):
                 if write_model: building_test.coeff_out_f.to_csv(report_path + 'bldg_' + str(building_test.bldg_id) + "_Fossil Fuel Coeffs_out.csv")
                 if write_fim: building_test.FIM_table_f.to_csv(report_path + 'bldg_' + str(building_test.bldg_id) + "_Fossil Fuel FIM_recommendations.csv")
-    
-            # Generate static HTML report
+            if all_scenarios:
+                building_test.df_scenarios.to_csv(report_path + 'bldg_' + str(building_test.bldg_id) + "_scenarios.csv", index=False)
+
+        # Generate static HTML report
+        with stage('html_report'):
             report_building = report.Report(building = building_test)
             report_building.generate_building_report_beta(report_path)
-            return True, building_test
-        else:
-            print("No meaningful change-point model was found for the current building.")
-            return False, None
+        building_test.timing_record = instrumentation.record()
+        instrumentation.log_record(logging.INFO if profile else logging.DEBUG)
+        return True, building_test
+    else:
+        instrumentation.log_record(logging.INFO if profile else logging.DEBUG)
+        logger.info("No meaningful change-point model was found for building %s.", building_id)
+        return False, None
+
+
+def run_batch_worker(args):
+    # Runs in a worker process. Only the lightweight summary of the building is sent back.
+    building_id, building_info, df_raw_electricity, df_raw_fossil_fuel, kwargs = args
+    try:
+        single_building = analyze_building(building_id, building_info, df_raw_electricity, df_raw_fossil_fuel,
+                                           **kwargs)[1]
+    except Exception:
+        return building_id, None, traceback.format_exc()
+    if single_building is None:
+        return building_id, None, None
+    return building_id, portfolio.BuildingSummary(single_building), None
 
 
 def summary_html(report_path, start_id, end_id):
@@ -120,6 +267,14 @@ def summary_html(report_path, start_id, end_id):
         report_html.write('</body>\n')
         report_html.write('</html>\n')
 
+def log_progress(count, n_buildings, progress_every):
+    # Summary progress every progress_every buildings and at the end of the batch
+    if (count % progress_every == 0 or count == n_buildings):
+        logger.info('%s/%s buildings completed.', count, n_buildings)
+    else:
+        logger.debug('%s/%s buildings completed.', count, n_buildings)
+
+
 def run_batch(
     start_id, 
     end_id, 
@@ -127,49 +282,147 @@ def run_batch(
     saving_target=2, 
     cached_weather=True, 
     batch_report=False,
-    use_default_benchmark_data=True
+    use_default_benchmark_data=True,
+    batch_fit=False,
+    n_workers=1,
+    p=None,
+    prefetch_weather=True,
+    progress_every=10,
+    profile=False,
+    use_benchmark_cache=False,
+    solver='curve_fit'
     ):
+    # n_workers: number of worker processes (None ~ one per CPU core, 1 ~ run in the current process)
+    # progress_every: number of buildings between the progress messages, the per-building messages are logged at DEBUG
+    # profile: True ~ also record the peak memory of the stages and write the stage timings of the buildings to
+    # outputs/stage_timings.csv and their summary to outputs/stage_timings_summary.csv. Without profile, the peak
+    # memory is not traced (tracemalloc slows the analysis down) and the summary only has the times.
+    # The stage timing summary of the batch is logged at the end
+    # use_benchmark_cache: True ~ reuse the benchmark stats and building models of previous runs, stored in
+    # Data/Benchmark/cache (see benchmark_cache.BenchmarkCache); only used with use_default_benchmark_data=False
+    # solver: change-point model solver of the buildings and of the benchmark stats, see run_single
+    # p: a portfolio parsed by load_portfolio; the portfolio spreadsheet is read once if it is not passed in
+    # prefetch_weather: True ~ geocode the buildings and load the weather of the whole batch once before the analysis
+    # Stages run once for the whole batch
+    batch_instrumentation = Instrumentation('batch', trace_memory=profile)
+    if p is None:
+        with batch_instrumentation.stage('portfolio'):
+            p = load_portfolio()
+
+    if prefetch_weather:
+        with batch_instrumentation.stage('weather_prefetch'):
+            v_building_ID = list(range(start_id, end_id+1))
+            if not use_default_benchmark_data:
+                # The benchmark stats are generated from all the buildings of the space type
+                v_building_ID += list(p.df_meta.loc[p.df_meta['building_space_type_1st'] == space_type, 'building_ID'])
+            p.prefetch_weather(list(OrderedDict.fromkeys(v_building_ID)), cached_weather)
     
     # Conditionally generate the benchmark stats for the porfolio
     if use_default_benchmark_data:
         df_user_bench_stats_e, df_user_bench_stats_f = None, None
     else:
-        # Initialize a portfolio instance
-        s_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
-        data_path = s_path + '/Data/'
-        p = portfolio.Portfolio('Test')
-        p.read_raw_data_from_xlsx(data_path + 'portfolio.xlsx')
-
-        # 1 ~ electricity; 2 ~ fossil fuel
-        dict_raw_electricity = p.get_portfolio_raw_data_by_spaceType_and_utilityType(space_type, utility_type=1)
-        dict_raw_fossil_fuel = p.get_portfolio_raw_data_by_spaceType_and_utilityType(space_type, utility_type=2)
-        df_user_bench_stats_e = p.generate_benchmark_stats_wrapper(dict_raw_electricity, cached_weather)
-        df_user_bench_stats_f = p.generate_benchmark_stats_wrapper(dict_raw_fossil_fuel, cached_weather)
+        with batch_instrumentation.stage('benchmark_stats'):
+            # 1 ~ electricity; 2 ~ fossil fuel
+            dict_raw_electricity = p.get_portfolio_raw_data_by_spaceType_and_utilityType(space_type, utility_type=1)
+            dict_raw_fossil_fuel = p.get_portfolio_raw_data_by_spaceType_and_utilityType(space_type, utility_type=2)
+            df_user_bench_stats_e = p.generate_benchmark_stats_wrapper(dict_raw_electricity, cached_weather, batch_fit,
+                                                                       solver=solver, use_cache=use_benchmark_cache)
+            df_user_bench_stats_f = p.generate_benchmark_stats_wrapper(dict_raw_fossil_fuel, cached_weather, batch_fit,
+                                                                       solver=solver, use_cache=use_benchmark_cache)
         
     v_single_buildings = []
     v_single_building_reports = []
-    for i in range(start_id, end_id+1):
-        print('--------------------------------------------------')
-        print('Analyzing building ' + str(i))
-        single_building = run_single(
-            bldg_id=i, 
-            saving_target=saving_target, 
-            cached_weather=cached_weather,
-            use_default_benchmark_data=use_default_benchmark_data, 
-            df_user_bench_stats_e=df_user_bench_stats_e,
-            df_user_bench_stats_f=df_user_bench_stats_f
-            )[1]
-        v_single_buildings.append(single_building)
+    v_failed_ids = []
+    n_buildings = end_id - start_id + 1
+    if n_workers == 1:
+        for i in range(start_id, end_id+1):
+            logger.debug('Analyzing building %s', i)
+            try:
+                single_building = run_single(
+                    bldg_id=i, 
+                    saving_target=saving_target, 
+                    cached_weather=cached_weather,
+                    use_default_benchmark_data=use_default_benchmark_data, 
+                    df_user_bench_stats_e=df_user_bench_stats_e,
+                    df_user_bench_stats_f=df_user_bench_stats_f,
+                    p=p,
+                    profile=profile,
+                    solver=solver
+                    )[1]
+            except Exception:
+                logger.error('Analysis failed for building %s:\n%s', i, traceback.format_exc())
+                single_building = None
+                v_failed_ids.append(i)
+            v_single_buildings.append(single_building)
+            log_progress(i - start_id + 1, n_buildings, progress_every)
+    else:
+        # Slice the building data in the main process so each worker only receives its own building
+        kwargs = {'saving_target': saving_target,
+                  'space_type': space_type,
+                  'cached_weather': cached_weather,
+                  'use_default_benchmark_data': use_default_benchmark_data,
+                  'df_user_bench_stats_e': df_user_bench_stats_e,
+                  'df_user_bench_stats_f': df_user_bench_stats_f,
+                  'profile': profile,
+                  'solver': solver}
+        v_tasks = []
+        for i in range(start_id, end_id+1):
+            building_view = p.get_building_view(i)
+            if building_view is not None:
+                v_tasks.append((i, *building_view, dict(kwargs, coord=p.get_building_coord(i))))
+        d_results = {}
+        # Worker processes started with spawn don't inherit the logging configuration
+        d_executor_args = {} if logging_config is None else {'initializer': configure_logging, 'initargs': logging_config}
+        with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers, **d_executor_args) as executor:
+            futures = {executor.submit(run_batch_worker, task): task[0] for task in v_tasks}
+            for count, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                try:
+                    building_id, single_building, error = future.result()
+                except Exception:
+                    # The worker process itself died
+                    building_id, single_building, error = futures[future], None, traceback.format_exc()
+                if error is not None:
+                    logger.error('Analysis failed for building %s:\n%s', building_id, error)
+                    v_failed_ids.append(building_id)
+                d_results[building_id] = single_building
+                logger.debug('Building %s completed.', building_id)
+                log_progress(count, len(v_tasks), progress_every)
+        v_single_buildings = [d_results.get(i) for i in range(start_id, end_id+1)]
 
+    if len(v_failed_ids) > 0:
+        logger.warning('Analysis failed for buildings: %s', sorted(v_failed_ids))
+
+    report_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__))) + '/outputs/'
     if batch_report:
-        report_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__))) + '/outputs/'
-        portfolio_out = portfolio.Portfolio('Sample Portfolio')
-        portfolio_out.prepare_portfolio_report_data(v_single_buildings, report_path)
-        report_portfolio = report.Report(portfolio = portfolio_out)
-        report_portfolio.generate_portfolio_report(report_path)
+        with batch_instrumentation.stage('portfolio_report'):
+            portfolio_out = portfolio.Portfolio('Sample Portfolio')
+            portfolio_out.prepare_portfolio_report_data(v_single_buildings, report_path)
+            report_portfolio = report.Report(portfolio = portfolio_out)
+            report_portfolio.generate_portfolio_report(report_path)
+
+    # The buildings analyzed in worker processes send their stage record back in their BuildingSummary
+    v_timing_records = [single_building.timing_record for single_building in v_single_buildings
+                        if single_building is not None and hasattr(single_building, 'timing_record')]
+    log_timing_summary(v_timing_records, batch_instrumentation.record(), report_path if profile else None)
+
+
+def log_timing_summary(v_timing_records, d_batch_record, report_path=None):
+    # Log the time spent in each stage over the buildings of a batch, and in the batch stages
+    # report_path: also write the stage timings of each building and the summary there
+    if len(v_timing_records) > 0:
+        df_summary = Instrumentation.summarize(v_timing_records)
+        logger.info('Stage timings of %s buildings:\n%s', len(v_timing_records),
+                    df_summary.to_string(float_format=lambda x: '%.3f' % x))
+        if report_path is not None:
+            Instrumentation.records_to_dataframe(v_timing_records).to_csv(report_path + 'stage_timings.csv', index=False)
+            df_summary.to_csv(report_path + 'stage_timings_summary.csv')
+    if len(d_batch_record['stages']) > 0:
+        logger.info('Batch stage timings: %s', ', '.join(['%s %.3f s' % (name, d_stage['wall_time'])
+                                                          for name, d_stage in d_batch_record['stages'].items()]))
 
 
 def main():
+    configure_logging()
     # Saving target: 1 ~ conservative, 2 ~ nominal, 3 ~ aggressive
     # Change the building id and saving target for the building you want to analyze
     # run_single(bldg_id = 11, saving_target=2, cached_weather=True)
@@ -0,0 +1,217 @@
+'''
+
+Building Efficiency Targeting Tool for Energy Retrofits (BETTER) Copyright (c) 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Dept. of Energy). All rights reserved.
+
+If you have questions about your rights to use or distribute this software, please contact Berkeley Lab's Intellectual Property Office at  IPO@lbl.gov.
+
+NOTICE.  This Software was developed
+under funding from the U.S. Department of Energy and the U.S. Government consequently retains certain rights. As such, the U.S. Government has been granted for itself and others acting on its behalf a paid-up, nonexclusive, irrevocable, worldwide license in the Software to reproduce, distribute copies to the public, prepare derivative works, and perform publicly and display publicly, and to permit other to do so.
+
+'''
+
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+import concurrent.futures
+import unicodedata
+import pandas as pd
+from contextlib import closing
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class GeocodingError(Exception):
+    pass
+
+
+class GeocodeResult:
+    # Same attributes as the geocoder package results used by Building
+    def __init__(self, latlng, address, source):
+        self.latlng = latlng
+        self.address = address
+        self.source = source
+
+
+class RateLimiter:
+    # Token bucket shared by the threads calling a provider: at most burst requests at once, then rate per second
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.last_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last_time) * self.rate)
+                self.last_time = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_seconds = (1 - self.tokens) / self.rate
+            time.sleep(wait_seconds)
+
+
+class GeocodingProvider:
+    # Interface of the online geocoding services used by Geocoder, in fallback order.
+    # Subclasses implement request(address), returning a GeocodeResult or None if the address is not found.
+    # max_requests_per_second: None ~ no rate limit
+    def __init__(self, name, max_requests_per_second=None):
+        self.name = name
+        self.rate_limiter = None if max_requests_per_second is None else RateLimiter(max_requests_per_second)
+
+    def geocode(self, address):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        return (self.request(address))
+
+    def request(self, address):
+        raise NotImplementedError
+
+
+class GeocoderPackageProvider(GeocodingProvider):
+    # A service of the geocoder package (google, arcgis, bing, baidu, ...)
+    def request(self, address):
+        import geocoder
+        geo_coder = getattr(geocoder, self.name)(address)
+        if (geo_coder.latlng is None):
+            return None
+        return (GeocodeResult(geo_coder.latlng, geo_coder.address, self.name))
+
+
+class Geocoder:
+    # Address to coordinates lookup: persistent SQLite cache -> offline gazetteer -> online providers.
+    # Addresses are normalized before the lookups, so spelling variants of an address share the cache entry.
+    # offline: True ~ never call the online providers (e.g. air-gapped environments)
+    # gazetteer_file: CSV file with address, latitude and longitude columns
+    # providers: GeocodingProvider list tried in order, the geocoder package services by default
+    default_geocoder = None
+    abbreviations = {'street': 'st', 'avenue': 'ave', 'road': 'rd', 'boulevard': 'blvd', 'drive': 'dr',
+                     'lane': 'ln', 'court': 'ct', 'place': 'pl', 'highway': 'hwy', 'parkway': 'pkwy',
+                     'suite': 'ste', 'building': 'bldg', 'floor': 'fl', 'north': 'n', 'south': 's', 'east': 'e',
+                     'west': 'w', 'district': 'dist'}
+
+    def __init__(self, cache_file=None, gazetteer_file=None, offline=None, providers=None, n_threads=8):
+        s_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        if cache_file is None:
+            cache_file = os.environ.get('BETTER_GEOCODE_CACHE', s_path + '/Data/geocode_cache.sqlite')
+        if gazetteer_file is None:
+            gazetteer_file = os.environ.get('BETTER_GAZETTEER')
+        if offline is None:
+            offline = os.environ.get('BETTER_GEOCODE_OFFLINE', '0').lower() in ('1', 'true', 'yes')
+        self.cache_file = cache_file
+        self.gazetteer_file = gazetteer_file
+        self.offline = offline
+        self.dict_gazetteer = None
+        self.gazetteer_lock = threading.Lock()
+        if providers is None:
+            # Note: google API might not be accessible in China
+            # Change the geocoder to Baidu or other Chinese search engine for Chinese tool
+            providers = [GeocoderPackageProvider('google', max_requests_per_second=10),
+                         GeocoderPackageProvider('arcgis', max_requests_per_second=5),
+                         GeocoderPackageProvider('bing', max_requests_per_second=5),
+                         GeocoderPackageProvider('baidu', max_requests_per_second=5)]
+        self.providers = providers
+        self.n_threads = n_threads
+        if os.path.dirname(self.cache_file):
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        with closing(self.connect()) as connection, connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS geocode (address TEXT PRIMARY KEY, latitude REAL, '
+                               'longitude REAL, geo_address TEXT, source TEXT, updated REAL)')
+
+    @classmethod
+    def get_default(cls):
+        if cls.default_geocoder is None:
+            cls.default_geocoder = cls()
+        return cls.default_geocoder
+
+    @classmethod
+    def set_default(cls, geocoder):
+        cls.default_geocoder = geocoder
+
+    def connect(self):
+        # A connection per lookup, so worker processes and threads never share one
+        return (sqlite3.connect(self.cache_file, timeout=30))
+
+    @staticmethod
+    def normalize_address(address):
+        s_address = unicodedata.normalize('NFKC', str(address)).lower()
+        s_address = re.sub(r'[^\w#]+', ' ', s_address)
+        v_words = [Geocoder.abbreviations.get(word, word) for word in s_address.split()]
+        return (' '.join(v_words))
+
+    def read_cache(self, key):
+        with closing(self.connect()) as connection:
+            row = connection.execute('SELECT latitude, longitude, geo_address, source FROM geocode WHERE address = ?',
+                                     (key,)).fetchone()
+        if row is None:
+            return None
+        return (GeocodeResult([row[0], row[1]], row[2], row[3]))
+
+    def write_cache(self, key, result):
+        with closing(self.connect()) as connection, connection:
+            connection.execute('INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?, ?)',
+                               (key, float(result.latlng[0]), float(result.latlng[1]), result.address, result.source,
+                                time.time()))
+
+    def read_gazetteer(self, key):
+        if self.gazetteer_file is None:
+            return None
+        with self.gazetteer_lock:
+            if self.dict_gazetteer is None:
+                df_gazetteer = pd.read_csv(self.gazetteer_file)
+                self.dict_gazetteer = {Geocoder.normalize_address(row.address): [float(row.latitude), float(row.longitude)]
+                                       for row in df_gazetteer.itertuples()}
+        latlng = self.dict_gazetteer.get(key)
+        if latlng is None:
+            return None
+        return (GeocodeResult(latlng, None, 'gazetteer'))
+
+    def geocode_online(self, address):
+        # Try the providers in order, e.g. Google -> ArcGIS -> Bing -> Baidu
+        for provider in self.providers:
+            try:
+                result = provider.geocode(address)
+            except Exception as e:
+                # e.g. a network error, an invalid API key or an exceeded quota: try the next provider
+                logger.warning("Geocoding provider %s failed for the address %s: %r", provider.name, address, e)
+                continue
+            if result is not None:
+                return (result)
+        return None
+
+    def geocode(self, address):
+        key = Geocoder.normalize_address(address)
+        result = self.read_cache(key)
+        if result is not None:
+            return (result)
+        result = self.read_gazetteer(key)
+        if result is None and not self.offline:
+            result = self.geocode_online(address)
+        if result is None:
+            raise GeocodingError("Cannot geocode the address: " + str(address) +
+                                 (" (offline, add it to the gazetteer)" if self.offline else ". Try another geocoder provider"))
+        if result.address is None:
+            result.address = address
+        self.write_cache(key, result)
+        return (result)
+
+    def geocode_many(self, v_address):
+        # Geocode the unique addresses concurrently, the providers' rate limits are shared by the threads
+        # Returns a dict address -> GeocodeResult, None for the addresses that could not be geocoded
+        def geocode_or_none(address):
+            try:
+                return (self.geocode(address))
+            except GeocodingError:
+                return None
+
+        v_unique = list(OrderedDict.fromkeys(v_address))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.n_threads) as executor:
+            v_results = list(executor.map(geocode_or_none, v_unique))
+        return (dict(zip(v_unique, v_results)))
@@ -0,0 +1,114 @@
+'''
+
+Building Efficiency Targeting Tool for Energy Retrofits (BETTER) Copyright (c) 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Dept. of Energy). All rights reserved.
+
+If you have questions about your rights to use or distribute this software, please contact Berkeley Lab's Intellectual Property Office at  IPO@lbl.gov.
+
+NOTICE.  This Software was developed
+under funding from the U.S. Department of Energy and the U.S. Government consequently retains certain rights. As such, the U.S. Government has been granted for itself and others acting on its behalf a paid-up, nonexclusive, irrevocable, worldwide license in the Software to reproduce, distribute copies to the public, prepare derivative works, and perform publicly and display publicly, and to permit other to do so.
+
+'''
+
+import time
+import json
+import logging
+import tracemalloc
+import pandas as pd
+from contextlib import contextmanager
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class Instrumentation:
+    # Wall time, CPU time and peak memory of the stages of an analysis, e.g.
+    #     instrumentation = Instrumentation(building_id)
+    #     with instrumentation.stage('fit'):
+    #         building_test.fit_inverse_model()
+    # Stages are not nested. A stage run several times (e.g. in a loop) adds up.
+    # trace_memory: True ~ record the peak memory allocated during each stage with tracemalloc, which slows down the
+    # allocation-heavy stages, False ~ timings only
+    # callback: function(building_id, stage_name, d_stage) called at the end of each stage, e.g. to forward the
+    # measures to a monitoring system
+    # The CPU time is the time of the whole process, including the threads started by the stage (e.g. downloads).
+    def __init__(self, building_id=None, trace_memory=False, callback=None):
+        self.building_id = building_id
+        self.trace_memory = trace_memory
+        self.callback = callback
+        self.d_stages = OrderedDict()
+
+    @contextmanager
+    def stage(self, name):
+        started_tracing = False
+        # The peak is measured from the start of the stage: tracemalloc.reset_peak (Python 3.9+), or a tracing
+        # started by the stage. Without either, the peak of the stage is unknown (None).
+        measure_peak = self.trace_memory
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            elif hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            else:
+                measure_peak = False
+            memory_start = tracemalloc.get_traced_memory()[0]
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            d_stage = OrderedDict([('wall_time', time.perf_counter() - wall_start),
+                                   ('cpu_time', time.process_time() - cpu_start),
+                                   ('peak_memory', None)])
+            if measure_peak:
+                d_stage['peak_memory'] = tracemalloc.get_traced_memory()[1] - memory_start
+            if started_tracing:
+                tracemalloc.stop()
+            self.add(name, d_stage)
+
+    def add(self, name, d_stage):
+        if name in self.d_stages:
+            d_total = self.d_stages[name]
+            d_total['wall_time'] += d_stage['wall_time']
+            d_total['cpu_time'] += d_stage['cpu_time']
+            if d_stage['peak_memory'] is not None:
+                d_total['peak_memory'] = max(d_total['peak_memory'] or 0, d_stage['peak_memory'])
+        else:
+            self.d_stages[name] = OrderedDict(d_stage)
+        if self.callback is not None:
+            self.callback(self.building_id, name, d_stage)
+
+    def record(self):
+        # Structured record of the analysis: the totals and the measures of each stage (seconds, bytes)
+        v_peak_memory = [d_stage['peak_memory'] for d_stage in self.d_stages.values()
+                         if d_stage['peak_memory'] is not None]
+        return (OrderedDict([('building_id', self.building_id),
+                             ('wall_time', sum([d_stage['wall_time'] for d_stage in self.d_stages.values()])),
+                             ('cpu_time', sum([d_stage['cpu_time'] for d_stage in self.d_stages.values()])),
+                             ('peak_memory', max(v_peak_memory) if len(v_peak_memory) > 0 else None),
+                             ('stages', OrderedDict([(name, dict(d_stage)) for name, d_stage in self.d_stages.items()]))]))
+
+    def log_record(self, level=logging.DEBUG):
+        # One JSON line per analysis, so the logs can be parsed by the job runner
+        logger.log(level, json.dumps(self.record(), default=str))
+
+    @staticmethod
+    def records_to_dataframe(v_records):
+        # One row per analysis and stage
+        v_rows = [OrderedDict([('building_id', d_record['building_id']), ('stage', name)], **d_stage)
+                  for d_record in v_records for name, d_stage in d_record['stages'].items()]
+        return (pd.DataFrame(v_rows, columns=['building_id', 'stage', 'wall_time', 'cpu_time', 'peak_memory']))
+
+    @staticmethod
+    def summarize(v_records):
+        # Portfolio summary by stage, the stages taking the most time first
+        df_stages = Instrumentation.records_to_dataframe(v_records)
+        df_stages['peak_memory'] = df_stages['peak_memory'].astype(float)
+        df_summary = df_stages.groupby('stage', sort=False).agg(
+            n_buildings=('building_id', 'count'),
+            wall_time_total=('wall_time', 'sum'),
+            wall_time_mean=('wall_time', 'mean'),
+            wall_time_max=('wall_time', 'max'),
+            cpu_time_total=('cpu_time', 'sum'),
+            peak_memory_max=('peak_memory', 'max'))
+        df_summary['wall_time_share'] = df_summary['wall_time_total'] / df_summary['wall_time_total'].sum()
+        return (df_summary.sort_values('wall_time_total', ascending=False))
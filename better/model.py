@@ -10,15 +10,19 @@ NOTICE.  This Software was developed under funding from the U.S. Department of E
 
 from scipy import optimize, stats
 import numpy as np
+import logging
 
 import constants
 
+logger = logging.getLogger(__name__)
+
 
 class InverseModel:
-    def __init__(self, temperature, eui, energy_type='Energy type unknown', significance_threshold=0.1):
+    def __init__(self, temperature, eui, energy_type='Energy type unknown', significance_threshold=0.1,
+                 solver='curve_fit', analytic_jacobian=True, warm_start=True):
 
         if (np.size(eui) != np.size(temperature)):
-            print("Please make sure eui and temperature arrays have the same length")
+            logger.warning("Please make sure eui and temperature arrays have the same length")
         else:
             self.temperature = temperature
             self.eui = eui
@@ -42,6 +46,13 @@ class InverseModel:
             self.hsl_insignificant = False  # assume significant heating slope
             self.csl_insignificant = False  # assume significant cooling slope
             self.best_model = None
+            # solver: 'curve_fit' ~ iterative bounded fits, 'grid' ~ exact least-squares fit in one pass (fit_grid)
+            self.solver = solver
+            self.analytic_jacobian = analytic_jacobian  # Use piecewise_linear_jacobian instead of finite differences
+            self.warm_start = warm_start  # Start each refit from the previous solution
+            self.n_fits = 0  # Number of curve_fit calls
+            self.nfev = 0  # Number of model function evaluations (including finite-difference steps)
+            self.njev = 0  # Number of analytic Jacobian evaluations
 
     @staticmethod
     def piecewise_linear(x, hcp, ccp, base, hsl, csl):
@@ -66,6 +77,20 @@ class InverseModel:
 
         return np.piecewise(x, conds, funcs)
 
+    @staticmethod
+    def piecewise_linear_jacobian(x, hcp, ccp, base, hsl, csl):
+        # Partial derivatives of piecewise_linear with respect to (hcp, ccp, base, hsl, csl)
+        x = np.asarray(x, dtype=float)
+        left = x < hcp
+        right = x > ccp
+        jac = np.zeros((np.size(x), 5))
+        jac[:, 0] = np.where(left, -hsl, 0)
+        jac[:, 1] = np.where(right, -csl, 0)
+        jac[:, 2] = 1
+        jac[:, 3] = np.where(left, x - hcp, 0)
+        jac[:, 4] = np.where(right, x - ccp, 0)
+        return jac
+
     def rmse(self):
         yp = self.piecewise_linear(self.temperature, *self.p)
         y = self.eui
@@ -89,28 +114,229 @@ class InverseModel:
         return (r2_result)
 
     def fit(self):
+        lower_bounds = [self.hcp_min, self.ccp_min, self.base_min, self.hsl_min, self.csl_min]
+        upper_bounds = [self.hcp_max, self.ccp_max, self.base_max, self.hsl_max, self.csl_max]
+
+        # Count the evaluations so the cost of the optimizer can be reported
+        def f(x, hcp, ccp, base, hsl, csl):
+            self.nfev += 1
+            return self.piecewise_linear(x, hcp, ccp, base, hsl, csl)
+
+        def jac(x, hcp, ccp, base, hsl, csl):
+            self.njev += 1
+            return self.piecewise_linear_jacobian(x, hcp, ccp, base, hsl, csl)
+
+        # Refits only change the bounds slightly, so start from the previous solution moved into the new bounds
+        p0 = None
+        if (self.warm_start and hasattr(self, 'p') and np.all(np.isfinite(self.p))):
+            p0 = np.clip(self.p, lower_bounds, upper_bounds)
+        self.n_fits += 1
         try:
             self.p, self.e = optimize.curve_fit(
-                self.piecewise_linear,
+                f,
                 self.temperature,
                 self.eui,
-                bounds=([self.hcp_min, self.ccp_min, self.base_min, self.hsl_min, self.csl_min],
-                        [self.hcp_max, self.ccp_max, self.base_max, self.hsl_max, self.csl_max]
-                        )
+                p0=p0,
+                jac=jac if self.analytic_jacobian else None,
+                bounds=(lower_bounds, upper_bounds)
             )
             # Model coefficients
             self.hcp, self.ccp, self.base, self.hsl, self.csl = self.p
+            self.set_p_values()
+        except:
+            self.has_fit = False
 
-            # Get p-value from t-stes for the model coefficients
-            n = len(self.temperature)
+    def set_p_values(self):
+        # Get p-value from t-stes for the model coefficients
+        n = len(self.temperature)
+        with np.errstate(divide='ignore', invalid='ignore'):
             self.p_base = stats.t.sf(self.base / np.sqrt(np.diag(self.e)[2] / n), df=n - 2)
             self.p_hsl = stats.t.cdf(self.hsl / np.sqrt(np.diag(self.e)[3] / n), df=n - 2)
             self.p_csl = stats.t.sf(self.csl / np.sqrt(np.diag(self.e)[4] / n), df=n - 2)
-            # self.p_hcp = stats.t.cdf(abs(self.hcp - self.hcp_min) / np.sqrt(np.diag(self.e)[0]/n), df = n-2)
-            # self.p_ccp = stats.t.cdf(abs(self.ccp - self.ccp_max) / np.sqrt(np.diag(self.e)[1]/n), df = n-2)
-        except:
-            self.has_fit = False
+        # self.p_hcp = stats.t.cdf(abs(self.hcp - self.hcp_min) / np.sqrt(np.diag(self.e)[0]/n), df = n-2)
+        # self.p_ccp = stats.t.cdf(abs(self.ccp - self.ccp_max) / np.sqrt(np.diag(self.e)[1]/n), df = n-2)
+
+
+    def fit_grid(self, threshold=0.1, min_points=2, significance_threshold=0.05):
+        # Exact least-squares fit of the 3P/4P/5P models in one pass, without an iterative optimizer.
+        # All the candidate solutions are solved in closed form from prefix sums over the sorted temperatures
+        # (see grid_candidates). The best candidate of each model is then selected as BatchInverseModel does.
+        x = np.asarray(self.temperature, dtype=float)
+        y = np.asarray(self.eui, dtype=float)
+        x_mean = np.mean(x)
+        order = np.argsort(x, kind='stable')
+        xs, ys = x[order] - x_mean, y[order]
+        n = len(xs)
+
+        d_best = {}
+        for family, m_candidates in InverseModel.grid_candidates(xs, ys, min_points).items():
+            # The constant model is always a candidate
+            v_best = m_candidates[np.argmin(m_candidates[:, 5])]
+            # Variance factors of the slopes, the change-points being given
+            h = np.minimum(xs - v_best[0], 0) if family != 'C' else np.zeros(n)
+            c = np.maximum(xs - v_best[1], 0) if family != 'H' else np.zeros(n)
+            m_X = np.column_stack([np.ones(n), h, c])
+            v_var = np.diag(np.linalg.pinv(m_X.T.dot(m_X)))
+            d_best[family] = (v_best[None, :5], v_best[5:6], np.array([True]), v_var[1:2], v_var[2:3])
+
+        p, r2, model_type_str, _, _ = BatchInverseModel.select(
+            np.array([n]), np.array([np.sum(ys)]), np.array([np.sum(ys ** 2)]), d_best['H'], d_best['C'],
+            d_best['2'], significance_threshold, threshold)
+        if (model_type_str[0] == 'No fit'):
+            return False
+        self.p = p[0] + np.array([x_mean, x_mean, 0, 0, 0])
+        self.hcp, self.ccp, self.base, self.hsl, self.csl = self.p
+        # Covariance of the coefficients as returned by curve_fit, for the p-values
+        m_J = self.piecewise_linear_jacobian(x, *self.p)
+        sse = np.sum((y - self.piecewise_linear(x, *self.p)) ** 2)
+        self.e = np.linalg.pinv(m_J.T.dot(m_J)) * sse / max(n - 5, 1)
+        self.set_p_values()
+        self.hsl_insignificant = model_type_str[0] == '3P Cooling'
+        self.csl_insignificant = model_type_str[0] == '3P Heating'
+        return True
 
+    @staticmethod
+    def grid_candidates(xs, ys, min_points=2):
+        # Candidate least-squares solutions of the models of the sorted (centered) temperatures xs and euis ys,
+        # as (hcp, ccp, base, hsl, csl, sse) rows, for the 3P heating ('H'), 3P cooling ('C') and 4P/5P ('2') models.
+        # Given the split of the temperatures between the heating, baseload and cooling segments, the optimum either
+        # has its change-points on temperatures, where the regressors min(x - hcp, 0) and max(x - ccp, 0) are known
+        # and the fit is linear, or strictly between two consecutive temperatures, where it is the intersection of
+        # the segments fitted separately (Hudson, 1966). Both kinds are candidates, for all the splits.
+        # A slope or baseload out of its bounds puts the optimum on the bound, i.e. on a zero slope (a simpler model)
+        # or a zero baseload, so these solutions are candidates too and the unbounded ones out of bounds are dropped.
+        n = len(xs)
+        c1, c2, cy, cxy, cyy = [np.concatenate([[0], np.cumsum(v)]) for v in [xs, xs ** 2, ys, xs * ys, ys ** 2]]
+        d_candidates = {'H': [], 'C': [], '2': []}
+
+        def add(families, ok, hcp, ccp, base, hsl, csl, sse):
+            v_columns = np.broadcast_arrays(hcp, ccp, base, hsl, csl, sse, ok)
+            ok = v_columns[6].astype(bool) & (v_columns[2] >= 0) & (v_columns[3] <= 0) & (v_columns[4] >= 0)
+            for family in families:
+                d_candidates[family].append(np.column_stack([v[ok] for v in v_columns[:6]]))
+
+        def line(i, j):
+            # Least-squares line y = a + b * x of the points [i, j)
+            m, sx, sxx = j - i, c1[j] - c1[i], c2[j] - c2[i]
+            sy, sxy, syy = cy[j] - cy[i], cxy[j] - cxy[i], cyy[j] - cyy[i]
+            det = m * sxx - sx ** 2
+            ok = (m >= min_points) & (det > 1e-12)
+            det = np.where(ok, det, 1)
+            b = (m * sxy - sx * sy) / det
+            a = (sy - b * sx) / np.maximum(m, 1)
+            return a, b, syy - a * sy - b * sxy, ok
+
+        def constant(i, j):
+            # Mean of the points [i, j) and the squared residuals, with the mean and with a zero baseload
+            m, sy, syy = j - i, cy[j] - cy[i], cyy[j] - cyy[i]
+            mean = sy / np.maximum(m, 1)
+            return mean, syy - mean * sy, syy
+
+        def hinge(m, sy, syy, s, ss, sgy, ok):
+            # y = base + slope * g of m points, from the sums of y, y^2, g, g^2 and g * y, and with a zero baseload
+            ss = np.where(ok, ss, 1)
+            g = s / ss
+            d = m - s * g
+            ok_d = ok & (d > 1e-12)
+            base = (sy - g * sgy) / np.where(ok_d, d, 1)
+            slope = (sgy - s * base) / ss
+            slope_0 = sgy / ss
+            return (base, slope, syy - base * sy - slope * sgy, ok_d), (slope_0, syy - slope_0 * sgy, ok)
+
+        # Temperatures for the change-points on a temperature, with the number of points below (l) and up to (r) them
+        v_t = np.unique(xs)
+        v_l = np.searchsorted(xs, v_t, side='left')
+        v_r = np.searchsorted(xs, v_t, side='right')
+        # Heating regressor sums of every temperature, the regressor is only non-zero on the points [0, l)
+        sh = c1[v_l] - v_l * v_t
+        shh = c2[v_l] - 2 * v_t * c1[v_l] + v_l * v_t ** 2
+        shy = cxy[v_l] - v_t * cy[v_l]
+        ok_h = (v_l >= min_points) & (shh > 0)
+        # Cooling regressor sums of every temperature, the regressor is only non-zero on the points [r, n)
+        v_nc = n - v_r
+        sc = (c1[n] - c1[v_r]) - v_nc * v_t
+        scc = (c2[n] - c2[v_r]) - 2 * v_t * (c1[n] - c1[v_r]) + v_nc * v_t ** 2
+        scy = (cxy[n] - cxy[v_r]) - v_t * (cy[n] - cy[v_r])
+        ok_c = (v_nc >= min_points) & (scc > 0)
+        # Splits for the change-points strictly between the temperatures xs[k - 1] < xs[k]
+        v_k = np.nonzero(xs[1:] > xs[:-1])[0] + 1
+        lo, hi = xs[v_k - 1], xs[v_k]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Constant model, the optimum of every model when both slopes are on their bound
+            mean, sse_mean, _ = constant(0, n)
+            add(['H', 'C', '2'], True, 0, 0, max(mean, 0), 0, 0, sse_mean if mean >= 0 else cyy[n])
+
+            # 3P heating, hcp on a temperature
+            (base, hsl, sse, ok), (hsl_0, sse_0, ok_0) = hinge(n, cy[n], cyy[n], sh, shh, shy, ok_h)
+            add(['H', '2'], ok, v_t, v_t, base, hsl, 0, sse)
+            add(['H', '2'], ok_0, v_t, v_t, 0, hsl_0, 0, sse_0)
+            # 3P heating, hcp between temperatures
+            a, b, sse_line, ok = line(0, v_k)
+            mean, sse_mean, sse_zero = constant(v_k, n)
+            for base, sse in [(mean, sse_mean), (0, sse_zero)]:
+                hcp = (base - a) / b
+                add(['H', '2'], ok & (b < 0) & (hcp > lo) & (hcp < hi), hcp, hcp, base, b, 0, sse_line + sse)
+
+            # 3P cooling, ccp on a temperature
+            (base, csl, sse, ok), (csl_0, sse_0, ok_0) = hinge(n, cy[n], cyy[n], sc, scc, scy, ok_c)
+            add(['C', '2'], ok, v_t, v_t, base, 0, csl, sse)
+            add(['C', '2'], ok_0, v_t, v_t, 0, 0, csl_0, sse_0)
+            # 3P cooling, ccp between temperatures
+            a, b, sse_line, ok = line(v_k, n)
+            mean, sse_mean, sse_zero = constant(0, v_k)
+            for base, sse in [(mean, sse_mean), (0, sse_zero)]:
+                ccp = (base - a) / b
+                add(['C', '2'], ok & (b > 0) & (ccp > lo) & (ccp < hi), ccp, ccp, base, 0, b, sse_line + sse)
+
+            # 4P/5P, both change-points on temperatures hcp <= ccp: (hcp, ccp) pairs
+            pair = (slice(None), None), (None, slice(None))
+            ok_2 = ok_h[pair[0]] & ok_c[pair[1]] & (v_t[pair[0]] <= v_t[pair[1]])
+            gh, gc = sh / np.where(ok_h, shh, 1), sc / np.where(ok_c, scc, 1)
+            d_2 = n - (sh * gh)[pair[0]] - (sc * gc)[pair[1]]
+            base = (cy[n] - (gh * shy)[pair[0]] - (gc * scy)[pair[1]]) / d_2
+            hsl = (shy[pair[0]] - sh[pair[0]] * base) / np.where(ok_h, shh, 1)[pair[0]]
+            csl = (scy[pair[1]] - sc[pair[1]] * base) / np.where(ok_c, scc, 1)[pair[1]]
+            add(['2'], ok_2 & (d_2 > 1e-12), v_t[pair[0]], v_t[pair[1]], base, hsl, csl,
+                cyy[n] - base * cy[n] - hsl * shy[pair[0]] - csl * scy[pair[1]])
+            hsl, csl = shy / np.where(ok_h, shh, 1), scy / np.where(ok_c, scc, 1)
+            add(['2'], ok_2, v_t[pair[0]], v_t[pair[1]], 0, hsl[pair[0]], csl[pair[1]],
+                cyy[n] - (hsl * shy)[pair[0]] - (csl * scy)[pair[1]])
+
+            # 4P/5P, hcp on a temperature t <= xs[k - 1] and ccp between xs[k - 1] and xs[k]: (t, k) pairs
+            k = v_k[pair[1]]
+            a, b, sse_line, ok = line(k, n)
+            fixed = hinge(k, cy[k], cyy[k], sh[pair[0]], shh[pair[0]], shy[pair[0]],
+                          ok_h[pair[0]] & (v_r[pair[0]] <= k))
+            for base, hsl, sse, ok_fixed in [fixed[0], (0,) + fixed[1]]:
+                ccp = (base - a) / b
+                add(['2'], ok & ok_fixed & (b > 0) & (ccp > lo[pair[1]]) & (ccp < hi[pair[1]]), v_t[pair[0]], ccp,
+                    base, hsl, b, sse + sse_line)
+
+            # 4P/5P, hcp between xs[k - 1] and xs[k] and ccp on a temperature t >= xs[k]: (k, t) pairs
+            k = v_k[pair[0]]
+            a, b, sse_line, ok = line(0, k)
+            fixed = hinge(n - k, cy[n] - cy[k], cyy[n] - cyy[k], sc[pair[1]], scc[pair[1]], scy[pair[1]],
+                          ok_c[pair[1]] & (v_l[pair[1]] >= k))
+            for base, csl, sse, ok_fixed in [fixed[0], (0,) + fixed[1]]:
+                hcp = (base - a) / b
+                add(['2'], ok & ok_fixed & (b < 0) & (hcp > lo[pair[0]]) & (hcp < hi[pair[0]]), hcp, v_t[pair[1]],
+                    base, b, csl, sse + sse_line)
+
+            # 4P/5P, both change-points between temperatures, hcp in split k_h <= ccp in split k_c: (k_h, k_c) pairs
+            k_h, k_c = v_k[pair[0]], v_k[pair[1]]
+            a_h, b_h, sse_h, ok_h_line = line(0, k_h)
+            a_c, b_c, sse_c, ok_c_line = line(k_c, n)
+            ok = ok_h_line & ok_c_line & (b_h < 0) & (b_c > 0) & (k_h <= k_c)
+            mean, sse_mean, sse_zero = constant(k_h, k_c)
+            # Empty baseload segment (k_h == k_c) with a free baseload: the lines intersect at the change-point
+            base_4P = a_h + b_h * (a_c - a_h) / (b_h - b_c)
+            for base, sse in [(np.where(k_h < k_c, mean, base_4P), sse_mean), (0, sse_zero)]:
+                hcp, ccp = (base - a_h) / b_h, (base - a_c) / b_c
+                add(['2'], ok & (hcp > lo[pair[0]]) & (hcp < hi[pair[0]]) & (ccp > lo[pair[1]]) & (ccp < hi[pair[1]]) &
+                    (hcp <= ccp), hcp, ccp, base, b_h, b_c, sse_h + sse + sse_c)
+
+        return {family: np.concatenate(v_candidates) for family, v_candidates in d_candidates.items()}
 
     def optimize_cp_limit(self, point):
         # Finds the optimum range for heating and cooling change-points bounds
@@ -150,8 +376,19 @@ class InverseModel:
         self.fit()
         return optimum_limits
 
-    def fit_model(self, has_fit=False, threshold=0.1):
+    def fit_model(self, has_fit=False, threshold=0.1, report_evaluations=False):
         ### Handle outliers (TBD)
+        if (self.solver == 'grid'):
+            return self.fit_model_grid(has_fit, threshold)
+        has_fit = self.fit_model_curve_fit(has_fit, threshold)
+        if (report_evaluations): self.print_evaluations()
+        return (has_fit)
+
+    def print_evaluations(self):
+        logger.info('%s: %s curve_fit calls, %s function evaluations, %s Jacobian evaluations',
+                    self.energy_type, self.n_fits, self.nfev, self.njev)
+
+    def fit_model_curve_fit(self, has_fit=False, threshold=0.1):
 
         ### Fit change-point model
         self.fit()  # Initial guess
@@ -170,7 +407,7 @@ class InverseModel:
         # return (has_fit)
 
         if (self.R_Squared() < threshold):
-            print('No fit found')
+            logger.debug('%s: no fit found', self.energy_type)
             # Cannot accept model immediately. No meaningful correlation found.
             return (has_fit)
         else:
@@ -185,6 +422,17 @@ class InverseModel:
             # Save final model coefficients
             return (has_fit)
 
+    def fit_model_grid(self, has_fit=False, threshold=0.1):
+        # Single-pass alternative to the nested curve_fit retries of fit_model
+        if (not self.fit_grid(threshold)):
+            logger.debug('%s: no fit found', self.energy_type)
+            return (has_fit)
+        self.p_init = self.p
+        self.model_type()  # Get model type
+        has_fit = True
+        self.has_fit = has_fit
+        return (has_fit)
+
     def optimize_slopes(self):
         import math
         if (not (self.significant(self.p_hsl)) or math.isnan(self.p_hsl)):
@@ -426,3 +674,214 @@ class InverseModel:
         print(
             '    P value: base= {:04.3f}, left= {:04.3f}, right= {:04.3f}'.format(self.p_base, self.p_hsl, self.p_csl))
         print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+
+
+class BatchInverseModel:
+    # Vectorized change-point model fitting for a stack of buildings.
+    # temperature and eui are (buildings x periods) arrays. Shorter histories are padded (e.g. with NaN)
+    # and the valid periods are flagged by mask.
+    # Candidate change-points are taken from a grid of per-building temperature percentiles, and the
+    # 3P/4P/5P least-squares problems are solved in closed form for all candidates at once.
+    valid_coeffs = {
+        'No fit': {'base': False, 'csl': False, 'ccp': False, 'hsl': False, 'hcp': False},
+        '3P Cooling': {'base': True, 'csl': True, 'ccp': True, 'hsl': False, 'hcp': False},
+        '3P Heating': {'base': True, 'csl': False, 'ccp': False, 'hsl': True, 'hcp': True},
+        '4P': {'base': True, 'csl': True, 'ccp': True, 'hsl': True, 'hcp': True},
+        '5P': {'base': True, 'csl': True, 'ccp': True, 'hsl': True, 'hcp': True},
+    }
+
+    def __init__(self, temperature, eui, mask=None, energy_type='Energy type unknown',
+                 significance_threshold=0.05, r2_threshold=0.1, min_points=2,
+                 cp_percentiles=np.arange(10, 95, 5), chunk_size=1024):
+        self.temperature = np.atleast_2d(np.asarray(temperature, dtype=float))
+        self.eui = np.atleast_2d(np.asarray(eui, dtype=float))
+        if (self.temperature.shape != self.eui.shape):
+            raise ValueError("Please make sure eui and temperature arrays have the same shape")
+        valid = np.isfinite(self.temperature) & np.isfinite(self.eui)
+        self.mask = valid if mask is None else (np.asarray(mask, dtype=bool) & valid)
+        self.energy_type = energy_type
+        self.significance_threshold = significance_threshold
+        self.r2_threshold = r2_threshold
+        self.min_points = min_points  # Minimum number of periods on the sloped side of a change-point
+        self.cp_percentiles = np.asarray(cp_percentiles)
+        self.chunk_size = chunk_size
+
+    @classmethod
+    def from_ragged(cls, v_temperature, v_eui, **kwargs):
+        # Stack per-building arrays of different lengths into NaN-padded arrays
+        n_buildings = len(v_temperature)
+        n_periods = max([np.size(t) for t in v_temperature]) if n_buildings > 0 else 0
+        temperature = np.full((n_buildings, n_periods), np.nan)
+        eui = np.full((n_buildings, n_periods), np.nan)
+        for i, (t, e) in enumerate(zip(v_temperature, v_eui)):
+            if (np.size(t) != np.size(e)):
+                raise ValueError("Please make sure eui and temperature arrays have the same length")
+            temperature[i, :np.size(t)] = t
+            eui[i, :np.size(e)] = e
+        return cls(temperature, eui, **kwargs)
+
+    @staticmethod
+    def slope_p_value(slope, sse, var_factor, n, n_params, heating):
+        # One-sided t-test of the slope (heating slopes are negative, cooling slopes positive)
+        dof = np.maximum(n - n_params, 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = slope / np.sqrt(np.maximum(sse, 0) / dof * var_factor)
+        return stats.t.cdf(t, df=dof) if heating else stats.t.sf(t, df=dof)
+
+    def fit_model(self):
+        n_buildings = self.temperature.shape[0]
+        self.model_p = np.full((n_buildings, 5), np.nan)  # hcp, ccp, base, hsl, csl
+        self.r2 = np.full(n_buildings, np.nan)
+        self.model_type_str = np.full(n_buildings, 'No fit', dtype=object)
+        for start in range(0, n_buildings, self.chunk_size):
+            self.fit_chunk(slice(start, min(start + self.chunk_size, n_buildings)))
+        self.has_fit = self.model_type_str != 'No fit'
+        self.model_type()
+        return self.has_fit
+
+    def fit_chunk(self, rows):
+        mask = self.mask[rows]
+        w = mask.astype(float)
+        x = np.where(mask, self.temperature[rows], 0.0)
+        y = np.where(mask, self.eui[rows], 0.0)
+        n = w.sum(axis=1)
+        sy = (w * y).sum(axis=1)
+        syy = (w * y * y).sum(axis=1)
+
+        # Candidate change-points: (buildings, candidates)
+        x_nan = np.where(mask, x, np.nan)
+        x_nan[n == 0] = 0
+        cps = np.nanpercentile(x_nan, self.cp_percentiles, axis=1).T
+
+        # Heating and cooling regressors for every candidate: (buildings, candidates, periods)
+        d = x[:, None, :] - cps[:, :, None]
+        h = np.minimum(d, 0) * w[:, None, :]
+        c = np.maximum(d, 0) * w[:, None, :]
+        nh = ((d < 0) * w[:, None, :]).sum(axis=2)
+        nc = ((d > 0) * w[:, None, :]).sum(axis=2)
+        sh, shh, shy = h.sum(axis=2), (h * h).sum(axis=2), (h * y[:, None, :]).sum(axis=2)
+        sc, scc, scy = c.sum(axis=2), (c * c).sum(axis=2), (c * y[:, None, :]).sum(axis=2)
+
+        p, r2, model_type_str, _, _ = self.solve(cps, n, sy, syy, nh, sh, shh, shy, nc, sc, scc, scy,
+                                                 self.min_points, self.significance_threshold, self.r2_threshold)
+        self.model_p[rows] = p
+        self.r2[rows] = r2
+        self.model_type_str[rows] = model_type_str
+
+    @staticmethod
+    def solve(cps, n, sy, syy, nh, sh, shh, shy, nc, sc, scc, scy,
+              min_points=2, significance_threshold=0.05, r2_threshold=0.1):
+        # Solve the 3P/4P/5P least-squares problems in closed form for every candidate change-point and
+        # select the best significant model of each building.
+        # cps and the heating (h = min(x - cp, 0)) / cooling (c = max(x - cp, 0)) regressor sums are
+        # (buildings, candidates) arrays; n, sy = sum(y) and syy = sum(y^2) are (buildings,) arrays.
+        ok_h = (nh >= min_points) & (shh > 0)
+        ok_c = (nc >= min_points) & (scc > 0)
+        shh = np.where(ok_h, shh, 1)
+        scc = np.where(ok_c, scc, 1)
+        gh, gc = sh / shh, sc / scc
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # 3P heating: y = base + hsl * min(x - hcp, 0)
+            d_h = n[:, None] - sh * gh
+            base_h = (sy[:, None] - gh * shy) / d_h
+            hsl_h = (shy - sh * base_h) / shh
+            sse_h = syy[:, None] - (base_h * sy[:, None] + hsl_h * shy)
+            ok_h3 = ok_h & (d_h > 1e-12) & (hsl_h <= 0) & (base_h >= 0)
+
+            # 3P cooling: y = base + csl * max(x - ccp, 0)
+            d_c = n[:, None] - sc * gc
+            base_c = (sy[:, None] - gc * scy) / d_c
+            csl_c = (scy - sc * base_c) / scc
+            sse_c = syy[:, None] - (base_c * sy[:, None] + csl_c * scy)
+            ok_c3 = ok_c & (d_c > 1e-12) & (csl_c >= 0) & (base_c >= 0)
+
+            # 4P/5P for every pair of candidates with hcp <= ccp: (buildings, hcp candidates, ccp candidates)
+            # The heating and cooling regressors never overlap, so the normal equations reduce to a
+            # scalar equation for the baseload.
+            d_2 = n[:, None, None] - (sh * gh)[:, :, None] - (sc * gc)[:, None, :]
+            base_2 = (sy[:, None, None] - (gh * shy)[:, :, None] - (gc * scy)[:, None, :]) / d_2
+            hsl_2 = (shy[:, :, None] - sh[:, :, None] * base_2) / shh[:, :, None]
+            csl_2 = (scy[:, None, :] - sc[:, None, :] * base_2) / scc[:, None, :]
+            sse_2 = syy[:, None, None] - (base_2 * sy[:, None, None] + hsl_2 * shy[:, :, None] +
+                                          csl_2 * scy[:, None, :])
+            ok_2 = (ok_h[:, :, None] & ok_c[:, None, :] & (cps[:, :, None] <= cps[:, None, :]) &
+                    (d_2 > 1e-12) & (hsl_2 <= 0) & (csl_2 >= 0) & (base_2 >= 0))
+
+        # Best candidate of each model family
+        index = np.arange(len(n))
+        k = cps.shape[1]
+        i_h = np.argmin(np.where(ok_h3, sse_h, np.inf), axis=1)
+        j_c = np.argmin(np.where(ok_c3, sse_c, np.inf), axis=1)
+        best_2 = np.argmin(np.where(ok_2, sse_2, np.inf).reshape(len(n), -1), axis=1)
+        i_2, j_2 = best_2 // k, best_2 % k
+
+        p_h = np.column_stack([cps[index, i_h], cps[index, i_h], base_h[index, i_h], hsl_h[index, i_h],
+                               np.zeros(len(n))])
+        p_c = np.column_stack([cps[index, j_c], cps[index, j_c], base_c[index, j_c], np.zeros(len(n)),
+                               csl_c[index, j_c]])
+        p_2 = np.column_stack([cps[index, i_2], cps[index, j_2], base_2[index, i_2, j_2],
+                               hsl_2[index, i_2, j_2], csl_2[index, i_2, j_2]])
+        sse_h, sse_c, sse_2 = sse_h[index, i_h], sse_c[index, j_c], sse_2[index, i_2, j_2]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            var_hsl_2 = 1 / shh[index, i_2] + gh[index, i_2] ** 2 / d_2[index, i_2, j_2]
+            var_csl_2 = 1 / scc[index, j_2] + gc[index, j_2] ** 2 / d_2[index, i_2, j_2]
+            var_hsl_h = 1 / shh[index, i_h] + gh[index, i_h] ** 2 / d_h[index, i_h]
+            var_csl_c = 1 / scc[index, j_c] + gc[index, j_c] ** 2 / d_c[index, j_c]
+        return BatchInverseModel.select(n, sy, syy,
+                                        (p_h, sse_h, ok_h3[index, i_h], var_hsl_h, np.nan),
+                                        (p_c, sse_c, ok_c3[index, j_c], np.nan, var_csl_c),
+                                        (p_2, sse_2, ok_2[index, i_2, j_2], var_hsl_2, var_csl_2),
+                                        significance_threshold, r2_threshold)
+
+    @staticmethod
+    def select(n, sy, syy, t_heating, t_cooling, t_both, significance_threshold=0.05, r2_threshold=0.1):
+        # Select the best significant model of each building from its best 3P heating, 3P cooling and 4P/5P solutions.
+        # Each solution is a tuple of the coefficients (hcp, ccp, base, hsl, csl), the sum of squared residuals, whether
+        # it exists, and the variance factors of the heating and cooling slopes, as (buildings, ...) arrays.
+        p_h, sse_h, ok_h, var_hsl_h, _ = t_heating
+        p_c, sse_c, ok_c, _, var_csl_c = t_cooling
+        p_2, sse_2, ok_2, var_hsl_2, var_csl_2 = t_both
+
+        # Keep a slope only if it is significant, as InverseModel.optimize_slopes does
+        n_params_2 = np.where(p_2[:, 0] == p_2[:, 1], 4, 5)
+        p_hsl_2 = BatchInverseModel.slope_p_value(p_2[:, 3], sse_2, var_hsl_2, n, n_params_2, heating=True)
+        p_csl_2 = BatchInverseModel.slope_p_value(p_2[:, 4], sse_2, var_csl_2, n, n_params_2, heating=False)
+        p_hsl_h = BatchInverseModel.slope_p_value(p_h[:, 3], sse_h, var_hsl_h, n, 3, heating=True)
+        p_csl_c = BatchInverseModel.slope_p_value(p_c[:, 4], sse_c, var_csl_c, n, 3, heating=False)
+        use_2 = ok_2 & (p_hsl_2 < significance_threshold) & (p_csl_2 < significance_threshold)
+        sig_h = ok_h & (p_hsl_h < significance_threshold)
+        sig_c = ok_c & (p_csl_c < significance_threshold)
+        use_h = ~use_2 & sig_h & (~sig_c | (sse_h <= sse_c))
+        use_c = ~use_2 & sig_c & ~use_h
+
+        p = np.full((len(n), 5), np.nan)
+        sse = np.full(len(n), np.nan)
+        p_hsl = np.full(len(n), np.nan)
+        p_csl = np.full(len(n), np.nan)
+        for use, p_use, sse_use, p_hsl_use, p_csl_use in [(use_2, p_2, sse_2, p_hsl_2, p_csl_2),
+                                                          (use_h, p_h, sse_h, p_hsl_h, np.nan),
+                                                          (use_c, p_c, sse_c, np.nan, p_csl_c)]:
+            p[use] = p_use[use]
+            sse[use] = sse_use[use]
+            p_hsl[use] = np.broadcast_to(p_hsl_use, len(n))[use]
+            p_csl[use] = np.broadcast_to(p_csl_use, len(n))[use]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r2 = 1 - sse / (syy - sy ** 2 / n)
+        accepted = (use_2 | use_h | use_c) & (r2 >= r2_threshold)
+
+        model_type_str = np.select([use_2 & (p[:, 0] == p[:, 1]), use_2, use_h, use_c],
+                                   ['4P', '5P', '3P Heating', '3P Cooling'], 'No fit').astype(object)
+        model_type_str[~accepted] = 'No fit'
+        p[~accepted] = np.nan
+        r2[~accepted] = np.nan
+        return p, r2, model_type_str, p_hsl, p_csl
+
+    def model_type(self):
+        # Assign the model coefficients in the same format as InverseModel.model_type
+        self.coeffs = []
+        self.coeff_validation = []
+        for (hcp, ccp, base, hsl, csl), model_type_str in zip(self.model_p, self.model_type_str):
+            self.coeffs.append({'base': base, 'csl': csl, 'ccp': ccp, 'hsl': abs(hsl), 'hcp': hcp})
+            self.coeff_validation.append(dict(self.valid_coeffs[model_type_str]))
@@ -9,18 +9,44 @@ NOTICE.  This Software was developed under funding from the U.S. Department of E
 '''
 
 import os
+import logging
 import pandas as pd
 import numpy as np
 from collections import OrderedDict
 
 import constants
 import building
+import model
 import utility
 import weather
 import benchmark
+import geocoding
+from benchmark_cache import BenchmarkCache
+
+logger = logging.getLogger(__name__)
+
+
+class BuildingSummary:
+    # Lightweight copy of the building results used by Portfolio.prepare_portfolio_report_data.
+    # It is small enough to be sent back from worker processes instead of the full Building instance.
+    report_attributes = ['bldg_id', 'bldg_name', 'bldg_address', 'bldg_area',
+                         'recent_annual_electricity_kWh', 'recent_annual_fossil_fuel_kWh',
+                         'recent_annual_electricity_cost', 'recent_annual_fossil_fuel_cost',
+                         'recent_annual_electricity_EUI', 'recent_annual_fossil_fuel_EUI',
+                         'total_cost_savings', 'total_energy_savings_pct',
+                         # Stage timings of the analysis, see instrumentation.Instrumentation
+                         'timing_record']
+
+    def __init__(self, single_building):
+        # Only copy the attributes the building has, so hasattr checks still work on the summary
+        for attribute in self.report_attributes:
+            if hasattr(single_building, attribute):
+                setattr(self, attribute, getattr(single_building, attribute))
 
 
 class Portfolio:
+    # Number of buildings between the progress messages of the portfolio-wide loops
+    progress_every = 10
 
     def __init__(self, name):
         self.name = name
@@ -31,66 +57,199 @@ class Portfolio:
 
     def read_raw_data_from_xlsx(self, filename):
         # clean up the raw data and save it as a dataframe
-        self.df_meta = pd.read_excel(filename, sheet_name="Metadata", skiprows=[0, 1], usecols="A:I")
+        df_meta = pd.read_excel(filename, sheet_name="Metadata", skiprows=[0, 1])
+        self.df_meta = df_meta.iloc[:, :9].copy()
         self.df_detail = pd.read_excel(filename, sheet_name="Utility", skiprows=[0, 1], usecols="A:G",
                                        parse_dates=[1, 2], infer_datetime_format=True)
         # Change column names in the dataframe
         self.df_meta.columns = ["building_ID", "building_name", "building_address", "building_area",
                                 "building_space_type_1st", "building_space_type_2nd", "building_cooling_fuel_type",
                                 "building_heating_fuel_type", "currency"]
+        # Optional latitude and longitude columns after the currency column, the address is geocoded if they are empty
+        for s_column, s_prefix in [('building_latitude', 'lat'), ('building_longitude', 'lon')]:
+            v_columns = [c for c in df_meta.columns[9:] if str(c).strip().lower().startswith(s_prefix)]
+            self.df_meta[s_column] = pd.to_numeric(df_meta[v_columns[0]], errors='coerce') if v_columns else np.nan
         self.df_detail.columns = ["building_ID", "bill_start_dates", "bill_end_dates", "energy_type",
                                   "energy_unit", "energy_consumption", "energy_cost"]
 
         # Drop rows where necessary values are missing
         self.df_meta = self.df_meta[np.isfinite(self.df_meta['building_ID'])]
         self.df_detail = self.df_detail[np.isfinite(self.df_detail['building_ID'])]
-
-    def get_utility_by_building_id_and_energy_type(self, building_ID, energy_type):
-        # energy_type: 1 ~ electricity; 2 ~ fossil fuel
-        df_temp = self.df_detail.loc[self.df_detail['building_ID'] == building_ID]
-        df_temp = df_temp[['bill_start_dates', 'bill_end_dates', 'energy_type',
-                           'energy_unit', 'energy_consumption', 'energy_cost']]
-        if (energy_type == 1):
-            df_temp = df_temp.loc[df_temp['energy_type'] == 'Electricity - Grid Purchased']
-            if df_temp.empty: return None
-        else:
-            df_temp = df_temp.loc[df_temp['energy_type'] != 'Electricity - Grid Purchased']
-            if df_temp.empty: return None
-
-            '''
-            Need to address how to combine multiple fossil fuel with different billing periods
-            Current solution: proportionally allocate the by the number of days in each calendar month
-            '''
-        # Convert the energy unit to kwh
-        df_temp.loc[df_temp['energy_unit'] == 'MJ', 'energy_consumption'] *= constants.Constants.MJ_to_kWh
-        df_temp.loc[df_temp['energy_unit'] == 'GJ', 'energy_consumption'] *= constants.Constants.GJ_to_kWh
-        df_temp.loc[df_temp['energy_unit'] == 'MWh', 'energy_consumption'] *= constants.Constants.MWH_to_kWh
-        df_temp.loc[df_temp['energy_unit'] == 'Btu', 'energy_consumption'] *= constants.Constants.Btu_to_kWh
-        df_temp.loc[df_temp['energy_unit'] == 'MMBtu', 'energy_consumption'] *= constants.Constants.MMBtu_to_kWh
-        df_temp.loc[df_temp['energy_unit'] == 'Cubic Meters', 'energy_consumption'] *= constants.Constants.M3_to_kWh
-        df_temp.loc[df_temp['energy_unit'] == 'Therms', 'energy_consumption'] *= constants.Constants.Therms_to_kWh
-        df_temp.loc[df_temp['energy_unit'] == 'Decatherms', 'energy_consumption'] *= constants.Constants.Decatherms_to_kWh
+        self.build_index()
+
+    def build_index(self):
+        # Index the utility and meta data by building once, so a lookup only touches that building's rows
+        # Convert the energy unit to kwh for the whole table
+        unit_to_kWh = {'MJ': constants.Constants.MJ_to_kWh,
+                       'GJ': constants.Constants.GJ_to_kWh,
+                       'MWh': constants.Constants.MWH_to_kWh,
+                       'Btu': constants.Constants.Btu_to_kWh,
+                       'MMBtu': constants.Constants.MMBtu_to_kWh,
+                       'Cubic Meters': constants.Constants.M3_to_kWh,
+                       'Therms': constants.Constants.Therms_to_kWh,
+                       'Decatherms': constants.Constants.Decatherms_to_kWh}
+        v_factor = self.df_detail['energy_unit'].map(unit_to_kWh).fillna(1)
 
         # Format the dataframe to match he raw utility data frame
-        df_temp = df_temp[['bill_start_dates', 'bill_end_dates', 'energy_consumption', 'energy_cost']]
-        df_temp.columns = ["Monthly Billing Start Date", "Monthly Billing End Date",
-                           "kWh", "Cost"]
+        df_utility = pd.DataFrame({"Monthly Billing Start Date": self.df_detail['bill_start_dates'],
+                                   "Monthly Billing End Date": self.df_detail['bill_end_dates'],
+                                   "kWh": self.df_detail['energy_consumption'] * v_factor,
+                                   "Cost": self.df_detail['energy_cost']})
+        # energy_type: 1 ~ electricity; 2 ~ fossil fuel
+        # Need to address how to combine multiple fossil fuel with different billing periods
+        # Current solution: proportionally allocate the by the number of days in each calendar month
+        v_energy_type = np.where(self.df_detail['energy_type'] == 'Electricity - Grid Purchased', 1, 2)
+        self.dict_utility = {key: df_group for key, df_group in
+                             df_utility.groupby([self.df_detail['building_ID'].values, v_energy_type], sort=False)}
+
+        # The first row is used for duplicate building IDs
+        self.df_meta_by_id = self.df_meta.drop_duplicates('building_ID').set_index('building_ID', drop=False)
+
+        # Coordinates given in the portfolio sheet
+        if not hasattr(self, 'dict_building_coord'):
+            self.dict_building_coord = {}
+        if 'building_latitude' in self.df_meta_by_id.columns:
+            df_coord = self.df_meta_by_id[np.isfinite(self.df_meta_by_id['building_latitude']) &
+                                          np.isfinite(self.df_meta_by_id['building_longitude'])]
+            for row in df_coord.itertuples():
+                self.dict_building_coord.setdefault(row.building_ID, (row.building_latitude, row.building_longitude))
 
-        return (df_temp)
+    def get_utility_by_building_id_and_energy_type(self, building_ID, energy_type):
+        # energy_type: 1 ~ electricity; 2 ~ fossil fuel
+        if not hasattr(self, 'dict_utility'):
+            self.build_index()
+        df_temp = self.dict_utility.get((building_ID, 1 if energy_type == 1 else 2))
+        if df_temp is None: return None
+        return (df_temp.copy())
 
     def get_building_info_by_id(self, building_ID):
+        if not hasattr(self, 'df_meta_by_id'):
+            self.build_index()
         try:
-            df_temp = self.df_meta.loc[self.df_meta['building_ID'] == building_ID]
-            building_info = df_temp.iloc[0]['building_name'], \
-                            df_temp.iloc[0]['building_address'], \
-                            df_temp.iloc[0]['building_space_type_1st'], \
-                            df_temp.iloc[0]['building_area'], \
-                            df_temp.iloc[0]['currency']
+            row = self.df_meta_by_id.loc[building_ID]
+            building_info = row['building_name'], \
+                            row['building_address'], \
+                            row['building_space_type_1st'], \
+                            row['building_area'], \
+                            row['currency']
         except:
             building_info = None
-            print('Cannot find the building with ID: ' + str(building_ID))
+            logger.warning('Cannot find the building with ID: %s', building_ID)
         return building_info
 
+    def get_building_view(self, building_ID):
+        # Everything needed to analyze a single building: its metadata and utility data (1 ~ electricity; 2 ~ fossil fuel)
+        building_info = self.get_building_info_by_id(building_ID)
+        if building_info is None:
+            return None
+        return (building_info,
+                self.get_utility_by_building_id_and_energy_type(building_ID=building_ID, energy_type=1),
+                self.get_utility_by_building_id_and_energy_type(building_ID=building_ID, energy_type=2))
+
+    def get_building_coord(self, building_ID):
+        # (latitude, longitude) of the building from the portfolio sheet or geocoded by plan_weather, None if unknown
+        if not hasattr(self, 'dict_building_coord'):
+            return None
+        return self.dict_building_coord.get(building_ID)
+
+    def geocode_buildings(self, v_building_ID=None):
+        # Geocode the unique addresses of the buildings (all the buildings in df_meta by default) concurrently, see
+        # geocoding.Geocoder.geocode_many. The coordinates are written back into df_meta.
+        if not hasattr(self, 'df_meta_by_id'):
+            self.build_index()
+        if not hasattr(self, 'dict_building_coord'):
+            self.dict_building_coord = {}
+        if v_building_ID is None:
+            v_building_ID = list(self.df_meta_by_id.index)
+        v_ID = [i for i in v_building_ID if i not in self.dict_building_coord and i in self.df_meta_by_id.index]
+        dict_address_ID = {}
+        for building_ID in v_ID:
+            dict_address_ID.setdefault(self.df_meta_by_id.loc[building_ID, 'building_address'], []).append(building_ID)
+        dict_results = geocoding.Geocoder.get_default().geocode_many(list(dict_address_ID.keys()))
+        for address, result in dict_results.items():
+            if result is None:
+                logger.warning('Cannot geocode the address of building: %s',
+                               ', '.join([str(building_ID) for building_ID in dict_address_ID[address]]))
+                continue
+            for building_ID in dict_address_ID[address]:
+                self.dict_building_coord[building_ID] = tuple(result.latlng)
+
+        # Write the coordinates back into the metadata
+        v_coord = [self.dict_building_coord.get(i, (np.nan, np.nan)) for i in self.df_meta['building_ID']]
+        self.df_meta = self.df_meta.assign(building_latitude=[coord[0] for coord in v_coord],
+                                           building_longitude=[coord[1] for coord in v_coord])
+        self.df_meta_by_id = self.df_meta.drop_duplicates('building_ID').set_index('building_ID', drop=False)
+
+    def get_building_years(self, building_ID):
+        # The calendar years covered by the billing periods of all the fuels of the building, without the gap years
+        set_years = set()
+        for energy_type in (1, 2):
+            df_temp = self.dict_utility.get((building_ID, energy_type))
+            if df_temp is not None:
+                set_years.update(weather.Weather.billing_years(df_temp['Monthly Billing Start Date'],
+                                                               df_temp['Monthly Billing End Date']))
+        return sorted(set_years)
+
+    def plan_weather(self, v_building_ID):
+        # The 3 closest weather stations (closest first) and the weather years needed by each building
+        self.geocode_buildings(v_building_ID)
+        v_ID = [i for i in v_building_ID if self.get_building_coord(i) is not None]
+        df_plan = pd.DataFrame(columns=['station_IDs', 'years'])
+        if len(v_ID) > 0:
+            m_coord = np.array([self.dict_building_coord[i] for i in v_ID], dtype=float)
+            df_stations = constants.Constants.df_us_weather_station
+            v_index, v_distance = weather.WeatherStationIndex.get(df_stations).query(m_coord[:, 0], m_coord[:, 1], k=3)
+            m_station_ID = np.asarray(df_stations['station_ID'])[v_index]
+            df_plan = pd.DataFrame({'station_IDs': [list(v_station_ID) for v_station_ID in m_station_ID],
+                                    'years': [self.get_building_years(i) for i in v_ID]}, index=v_ID)
+        self.df_weather_plan = df_plan
+        return df_plan
+
+    def prefetch_weather(self, v_building_ID, cached_weather=True, weather_cache=None, weather_fetcher=None):
+        # Load the weather of all the buildings before they are analyzed: each station-year is loaded once into the
+        # weather cache and kept in memory, so Building.add_weather reads the shared series.
+        # A building falls back to its next closest station if a station-year of its closest one is not available.
+        # cached_weather: True ~ pre-downloaded weather files, False ~ download the weather
+        if weather_cache is None:
+            weather_cache = weather.WeatherCache.get_default()
+        if weather_fetcher is None:
+            weather_fetcher = weather.WeatherFetcher.get_default()
+        n_bytes_fetched = weather_fetcher.n_bytes_fetched
+        df_plan = self.plan_weather(v_building_ID)
+
+        v_pending = list(df_plan.index)
+        set_requested, set_failed = set(), set()
+        n_cache_hits = 0
+        for rank in range(3):
+            if len(v_pending) == 0:
+                break
+            dict_needed = {i: [(df_plan.at[i, 'station_IDs'][rank], year) for year in df_plan.at[i, 'years']]
+                           for i in v_pending}
+            set_station_years = set([station_year for v_station_years in dict_needed.values()
+                                     for station_year in v_station_years]) - set_requested
+            n_cache_hits += sum([weather_cache.contains(*station_year) for station_year in set_station_years])
+            d_errors = weather.Weather.prefetch_weather(set_station_years, weather_cache, weather_fetcher,
+                                                        cached=cached_weather)
+            set_requested |= set_station_years
+            set_failed |= set(d_errors)
+            for station_year in set_station_years - set(d_errors):
+                weather_cache.pin(*station_year)
+            v_pending = [i for i in v_pending if any([station_year in set_failed for station_year in dict_needed[i]])]
+
+        dict_report = {'n_buildings': len(df_plan),
+                       'n_station_years': len(set_requested),
+                       'n_cache_hits': n_cache_hits,
+                       'cache_hit_rate': n_cache_hits / float(len(set_requested)) if len(set_requested) > 0 else np.nan,
+                       'n_failed_station_years': len(set_failed),
+                       'n_buildings_without_weather': len(v_pending),
+                       'n_bytes_fetched': weather_fetcher.n_bytes_fetched - n_bytes_fetched}
+        logger.info("Weather prefetched for %s buildings: %s station-years, cache hit rate %.1f%%, %s bytes fetched, "
+                    "%s station-years not available.", dict_report['n_buildings'], dict_report['n_station_years'],
+                    100 * dict_report['cache_hit_rate'], dict_report['n_bytes_fetched'],
+                    dict_report['n_failed_station_years'])
+        self.weather_prefetch_report = dict_report
+        return dict_report
+
     def fit_model_for_buildings(self):
         # Fit change-point model for all buildings by default
         return 42
@@ -116,7 +275,8 @@ class Portfolio:
                                     (df_temp_meta['building_area'].notnull())]
 
         # Add raw utility date into the dictionaries
-        for i in df_temp_meta['building_ID']:
+        for row in df_temp_meta.itertuples():
+            i = row.building_ID
             if (utility_type == 1):
                 df_temp_detail_utility = (self.get_utility_by_building_id_and_energy_type(i, 1))
                 utility_temp = utility.Utility('electricity', df_temp_detail_utility)
@@ -124,21 +284,22 @@ class Portfolio:
                 df_temp_detail_utility = (self.get_utility_by_building_id_and_energy_type(i, 2))
                 utility_temp = utility.Utility('fossil fuel', df_temp_detail_utility)
 
-            index = df_temp_meta[df_temp_meta['building_ID'] == i].index.tolist()[0]
-
-            dict_temp_utility = {i: (df_temp_meta.iloc[index]['building_address'],
-                                     df_temp_meta.iloc[index]['building_area'],
+            dict_temp_utility = {i: (row.building_address,
+                                     row.building_area,
                                      space_type,
-                                     df_temp_meta.iloc[index]['currency'],
+                                     row.currency,
                                      utility_type,
-                                     utility_temp
+                                     utility_temp,
+                                     self.get_building_coord(i)
                                      )}
             dict_raw_utility.update(dict_temp_utility)
         return (dict_raw_utility)
 
     @staticmethod
-    def generate_building_models(dict_raw_utility, cached_weather):
-        # This function may take several minutes, print the progress
+    def generate_building_models(dict_raw_utility, cached_weather, batch_fit=False, solver='curve_fit'):
+        # This function may take several minutes, the progress is logged every Portfolio.progress_every buildings
+        # batch_fit: True ~ fit all buildings at once with model.BatchInverseModel
+        # solver: the model.InverseModel solver of the buildings fitted one at a time, 'curve_fit' or 'grid'
         v_building_ID = list(dict_raw_utility.keys())
         v_EUI = np.empty(0)
         v_Model = np.empty(0)
@@ -147,12 +308,13 @@ class Portfolio:
         v_beta_beth = np.empty(0)
         v_beta_cdd = np.empty(0)
         v_beta_hdd = np.empty(0)
+        v_batch_ID = []
+        v_batch_T = []
+        v_batch_EUI = []
         i = 0
         for bldg_id in v_building_ID:
             i += 1
-            print('----------------------------------------------------')
-            print("Fitting change-point model for all buildings.")
-            print("Building ID: " + str(bldg_id))
+            logger.debug("Fitting change-point model for building %s", bldg_id)
 
             bldg_name = str(bldg_id) + '_dummy_name'
             bldg_address = dict_raw_utility[bldg_id][0]
@@ -161,14 +323,24 @@ class Portfolio:
             currency = dict_raw_utility[bldg_id][3]
             utility_type = 'electricity' if dict_raw_utility[bldg_id][4] == 1 else 'fossil fuel'
             utility_temp = dict_raw_utility[bldg_id][5]
+            coord = dict_raw_utility[bldg_id][6]
 
             if (hasattr(utility_temp, "df_raw_data")):
                 # Proceed only if there is utility data for the current building
-                building_temp = building.Building(bldg_id, bldg_name, bldg_address, bldg_type, bldg_area, currency)
+                building_temp = building.Building(bldg_id, bldg_name, bldg_address, bldg_type, bldg_area, currency,
+                                                  coord=coord)
                 weather_temp = weather.Weather(building_temp.coord)
                 building_temp.add_utility(utility_temp)
                 building_temp.add_weather(cached_weather, weather_temp)
-                has_fit = building_temp.fit_inverse_model()
+                if (batch_fit):
+                    # Defer the fitting until the data of all buildings are collected
+                    building_temp.pre_process()
+                    v_batch_ID.append(bldg_id)
+                    v_batch_T.append(building_temp.weather_electricity.v_T_C)
+                    v_batch_EUI.append(np.array(building_temp.eui_daily_electricity, dtype=float))
+                    has_fit = False
+                else:
+                    has_fit = building_temp.fit_inverse_model(solver)
                 if (has_fit):
                     v_EUI = np.append(v_EUI, np.nan)
                     v_Model = np.append(v_Model, str(bldg_id))
@@ -177,10 +349,24 @@ class Portfolio:
                     v_beta_beth = np.append(v_beta_beth, building_temp.im_electricity.coeffs['hcp'])
                     v_beta_cdd = np.append(v_beta_cdd, building_temp.im_electricity.coeffs['csl'])
                     v_beta_hdd = np.append(v_beta_hdd, building_temp.im_electricity.coeffs['hsl'])
-                print(str(i) + '/' + str(len(v_building_ID)) + " completed.")
             else:
-                print("No " + utility_type + " utility data found for current building, ",
-                      str(i) + '/' + str(len(v_building_ID)) + " completed.")
+                logger.debug("No %s utility data found for building %s", utility_type, bldg_id)
+            if (i % Portfolio.progress_every == 0 or i == len(v_building_ID)):
+                logger.info("Fitting change-point models: %s/%s completed.", i, len(v_building_ID))
+
+        if (batch_fit and len(v_batch_ID) > 0):
+            logger.info("Fitting change-point models for %s buildings at once.", len(v_batch_ID))
+            im_batch = model.BatchInverseModel.from_ragged(v_batch_T, v_batch_EUI)
+            v_has_fit = im_batch.fit_model()
+            for bldg_id, has_fit, coeffs in zip(v_batch_ID, v_has_fit, im_batch.coeffs):
+                if (has_fit):
+                    v_EUI = np.append(v_EUI, np.nan)
+                    v_Model = np.append(v_Model, str(bldg_id))
+                    v_beta_base = np.append(v_beta_base, coeffs['base'])
+                    v_beta_betc = np.append(v_beta_betc, coeffs['ccp'])
+                    v_beta_beth = np.append(v_beta_beth, coeffs['hcp'])
+                    v_beta_cdd = np.append(v_beta_cdd, coeffs['csl'])
+                    v_beta_hdd = np.append(v_beta_hdd, coeffs['hsl'])
 
         d_bench_coeffs = {'EUI': v_EUI,
                           'Model': v_Model,
@@ -193,7 +379,10 @@ class Portfolio:
         return df_bench_coeffs
 
     @staticmethod
-    def generate_benchmark_stats(df_building_models):
+    def generate_benchmark_stats(df_building_models, use_sketch=False):
+        # use_sketch: True ~ approximate stats from quantile sketches (benchmark.BenchmarkSketch) for very large groups
+        if use_sketch:
+            return benchmark.BenchmarkSketch().add_building_models(df_building_models).get_benchmark_stats()
         df_bench_stats = pd.DataFrame(columns=['beta_median', 'beta_standard_deviation'])
         df_bench_stats.index.name = "coefficient"
         median_BASE, std_BASE = benchmark.Benchmark.generate_benchmark_stats('BASE', df_building_models['beta_base'])
@@ -209,15 +398,55 @@ class Portfolio:
         return df_bench_stats
 
     @staticmethod
-    def generate_benchmark_stats_wrapper(dict_raw_utility, cached_weather):
-        df_building_models = Portfolio.generate_building_models(dict_raw_utility, cached_weather)
+    def generate_benchmark_stats_wrapper(dict_raw_utility, cached_weather, batch_fit=False, solver='curve_fit',
+                                         use_cache=False, bench_cache=None):
+        # use_cache: True ~ reuse the benchmark stats of an unchanged portfolio and the models of the unchanged
+        # buildings from previous runs (see benchmark_cache.BenchmarkCache), False ~ refit all the buildings
+        if not use_cache:
+            df_building_models = Portfolio.generate_building_models(dict_raw_utility, cached_weather, batch_fit, solver)
+            return Portfolio.generate_benchmark_stats(df_building_models)
+
+        if bench_cache is None:
+            bench_cache = BenchmarkCache.get_default()
+        logger.info("Using the benchmark cache in %s", bench_cache.cache_dir)
+        d_settings = {'cached_weather': bool(cached_weather), 'batch_fit': bool(batch_fit), 'solver': solver}
+        d_keys = OrderedDict([(bldg_id, BenchmarkCache.building_key(bldg_id, raw_utility, d_settings))
+                              for bldg_id, raw_utility in dict_raw_utility.items()])
+        stats_key = BenchmarkCache.stats_key(list(d_keys.values()))
+        df_bench_stats = bench_cache.get_stats(stats_key)
+        if df_bench_stats is not None:
+            logger.info("Using the cached benchmark stats of %s buildings.", len(d_keys))
+            return df_bench_stats
+
+        # Only fit the buildings without a cached model
+        d_models = bench_cache.get_building_models(d_keys.values())
+        dict_changed = OrderedDict([(bldg_id, raw_utility) for bldg_id, raw_utility in dict_raw_utility.items()
+                                    if d_keys[bldg_id] not in d_models])
+        logger.info("Fitting %s/%s buildings for the benchmark stats.", len(dict_changed), len(d_keys))
+        if len(dict_changed) > 0:
+            df_new_models = Portfolio.generate_building_models(dict_changed, cached_weather, batch_fit, solver)
+            df_new_models = df_new_models.set_index('Model')
+            d_new_models = {}
+            for bldg_id in dict_changed:
+                if str(bldg_id) in df_new_models.index:
+                    d_new_models[d_keys[bldg_id]] = {column: float(df_new_models.at[str(bldg_id), column])
+                                                     for column in BenchmarkCache.coefficient_columns}
+                else:
+                    # No model was fit for the building
+                    d_new_models[d_keys[bldg_id]] = None
+            bench_cache.put_building_models(d_new_models)
+            d_models.update(d_new_models)
+
+        v_rows = [dict(d_models[d_keys[bldg_id]], EUI=np.nan, Model=str(bldg_id)) for bldg_id in d_keys
+                  if d_models[d_keys[bldg_id]] is not None]
+        df_building_models = pd.DataFrame(v_rows, columns=['EUI', 'Model'] + BenchmarkCache.coefficient_columns)
         df_bench_stats = Portfolio.generate_benchmark_stats(df_building_models)
+        bench_cache.put_stats(stats_key, df_bench_stats)
         return df_bench_stats
 
 
     def prepare_portfolio_report_data(self, v_single_buildings, report_path, save_portfolio_results=True):
         # This function prepares the data for portfolio report
-        print(v_single_buildings)
         # Count of effective building in the porfolio
         count = 0
         total_area = 0
@@ -310,16 +539,7 @@ class Portfolio:
         if total_area > 0: self.portfolio_eui_f = round(self.total_annual_consumption_f/total_area, 0)
 
 
-        print(v_single_ids)
-        print(v_single_names)
-        print(v_single_address)
-        print(v_single_area)
-        print(v_single_annual_consumption_e)
-        print(v_single_annual_consumption_f)
-        print(v_single_annual_cost_e)
-        print(v_single_annual_cost_f)
-        print(v_single_eui_e)
-        print(v_single_eui_f)
+        logger.debug('Portfolio report buildings: %s', v_single_ids)
 
 
         d_bldg_summary = OrderedDict({
@@ -0,0 +1,131 @@
+'''
+
+Building Efficiency Targeting Tool for Energy Retrofits (BETTER) Copyright (c) 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Dept. of Energy). All rights reserved.
+
+If you have questions about your rights to use or distribute this software, please contact Berkeley Lab's Intellectual Property Office at  IPO@lbl.gov.
+
+NOTICE.  This Software was developed
+under funding from the U.S. Department of Energy and the U.S. Government consequently retains certain rights. As such, the U.S. Government has been granted for itself and others acting on its behalf a paid-up, nonexclusive, irrevocable, worldwide license in the Software to reproduce, distribute copies to the public, prepare derivative works, and perform publicly and display publicly, and to permit other to do so.
+
+'''
+
+import numpy as np
+import struct
+
+
+class KLLSketch:
+    # Mergeable streaming quantile sketch (Karnin, Lang & Liberty, "Optimal Quantile Approximation in Streams", 2016).
+    # Values are kept in a hierarchy of compactors, an item of level h stands for 2^h values. When the sketch is
+    # full, a level is sorted and every other item (random offset) is promoted to the next level. The memory is
+    # O(k) items whatever the number of values, and the rank error is about 1.7 / k of the count (k=200: ~1%).
+    # Until the first compaction the sketch holds all the values and the quantiles are exact.
+    header_format = '<4sIQI'
+    magic = b'KLL1'
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self.rng = np.random.default_rng(seed)
+
+    def capacity(self, h):
+        # Lower levels are smaller, by a factor 2/3 per level below the top one
+        return max(2, int(np.ceil(self.k * (2.0 / 3.0) ** (len(self.levels) - 1 - h))))
+
+    def size(self):
+        return sum([len(v_level) for v_level in self.levels])
+
+    def update(self, values):
+        # Add one value or an array of values, NaNs are skipped
+        v_values = np.atleast_1d(np.asarray(values, dtype=float))
+        v_values = v_values[np.isfinite(v_values)]
+        self.n += len(v_values)
+        self.levels[0] = np.concatenate([self.levels[0], v_values])
+        self.compress()
+
+    def compress(self):
+        while self.size() > sum([self.capacity(h) for h in range(len(self.levels))]):
+            for h in range(len(self.levels)):
+                if len(self.levels[h]) >= self.capacity(h):
+                    if h + 1 == len(self.levels):
+                        self.levels.append(np.empty(0))
+                    v_level = np.sort(self.levels[h])
+                    # An odd item out stays at this level
+                    v_keep = v_level[len(v_level) - len(v_level) % 2:]
+                    v_level = v_level[:len(v_level) - len(v_level) % 2]
+                    self.levels[h + 1] = np.concatenate([self.levels[h + 1], v_level[self.rng.integers(2)::2]])
+                    self.levels[h] = v_keep
+                    break
+
+    def merge(self, other):
+        # Add the values summarized by another sketch
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h in range(len(other.levels)):
+            self.levels[h] = np.concatenate([self.levels[h], other.levels[h]])
+        self.n += other.n
+        self.compress()
+        return self
+
+    def is_exact(self):
+        return len(self.levels) == 1
+
+    def weighted_items(self):
+        v_items = np.concatenate(self.levels)
+        v_weights = np.concatenate([np.full(len(v_level), 2.0 ** h) for h, v_level in enumerate(self.levels)])
+        return (v_items, v_weights)
+
+    @staticmethod
+    def weighted_median(v_items, v_weights):
+        order = np.argsort(v_items, kind='stable')
+        v_cum_weights = np.cumsum(v_weights[order])
+        return (v_items[order][np.searchsorted(v_cum_weights, v_cum_weights[-1] / 2.0, side='left')])
+
+    def cdf(self, x):
+        # Approximate fraction of the values <= x
+        if self.n == 0:
+            return np.nan
+        v_items, v_weights = self.weighted_items()
+        return (v_weights[v_items <= x].sum() / v_weights.sum())
+
+    def quantile(self, q):
+        if self.n == 0:
+            return np.nan
+        v_items, v_weights = self.weighted_items()
+        if self.is_exact():
+            return (np.quantile(v_items, q))
+        order = np.argsort(v_items, kind='stable')
+        v_cum_weights = np.cumsum(v_weights[order])
+        index = min(np.searchsorted(v_cum_weights, q * v_cum_weights[-1], side='left'), len(v_items) - 1)
+        return (v_items[order][index])
+
+    def median(self):
+        return self.quantile(0.5)
+
+    def median_absolute_deviation(self):
+        # Median of the distances to the median, over the weighted items of the sketch
+        if self.n == 0:
+            return np.nan
+        median = self.median()
+        v_items, v_weights = self.weighted_items()
+        if self.is_exact():
+            return (np.median(np.abs(v_items - median)))
+        return (KLLSketch.weighted_median(np.abs(v_items - median), v_weights))
+
+    def to_bytes(self):
+        v_sizes = np.array([len(v_level) for v_level in self.levels], dtype='<u4')
+        return (struct.pack(self.header_format, self.magic, self.k, self.n, len(self.levels)) + v_sizes.tobytes() +
+                np.concatenate(self.levels).astype('<f8').tobytes())
+
+    @classmethod
+    def from_bytes(cls, raw_sketch, seed=None):
+        magic, k, n, n_levels = struct.unpack_from(cls.header_format, raw_sketch)
+        if magic != cls.magic:
+            raise ValueError("Not a KLL sketch")
+        offset = struct.calcsize(cls.header_format)
+        v_sizes = np.frombuffer(raw_sketch, dtype='<u4', count=n_levels, offset=offset)
+        v_items = np.frombuffer(raw_sketch, dtype='<f8', count=int(v_sizes.sum()), offset=offset + 4 * n_levels)
+        sketch = cls(k, seed)
+        sketch.n = n
+        sketch.levels = [np.array(v_level) for v_level in np.split(v_items, np.cumsum(v_sizes)[:-1])]
+        return sketch
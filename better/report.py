@@ -10,8 +10,11 @@ NOTICE.  This Software was developed under funding from the U.S. Department of E
 
 import datetime
 import numpy as np
+import logging
 import constants
 
+logger = logging.getLogger(__name__)
+
 class Report:
 
     def __init__(self, building=None, portfolio=None):
@@ -115,7 +118,7 @@ class Report:
     def generate_building_report_beta(self, report_path):
         report_file = report_path + str(self.building.bldg_id) + '_' + self.building.bldg_address + '_' + self.building.bldg_name + '_report.html'
         report_file = report_file.replace(' ', '_')
-        print(report_file)
+        logger.debug('Writing the building report: %s', report_file)
         with open(report_file, 'w', encoding="utf-8") as report_html:
             report_html.write('<!DOCTYPE html>')
             report_html.write('<html>')
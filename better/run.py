@@ -8,6 +8,12 @@ from demo import *
 # Notes:
     # Saving target: 1 ~ conservative, 2 ~ nominal, 3 ~ aggressive
     # Change the building id and saving target for the building you want to analyze
-run_single(bldg_id=1, saving_target=2, cached_weather=False)
+    # The guard is required to run batches with worker processes (n_workers > 1)
+    # configure_logging(logging.DEBUG) shows the per-building details, configure_logging(quiet=True) only the
+    # warnings and the batch progress
+if __name__ == "__main__":
+    configure_logging()
+    run_single(bldg_id=1, saving_target=2, cached_weather=False)
     # Uncomment the line below [delete the '#' before run_batch(...)] to run the analysis for buildings between start_id and end_id
-#run_batch(start_id = 1, end_id = 2, saving_target=2, cached_weather=False, batch_report=True, use_default_benchmark_data=True)
+    # Set n_workers to the number of CPU cores to use (None ~ all cores)
+    #run_batch(start_id = 1, end_id = 2, saving_target=2, cached_weather=False, batch_report=True, use_default_benchmark_data=True, n_workers=1)
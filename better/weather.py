@@ -13,18 +13,77 @@ from constants import Constants
 import pandas as pd
 import numpy as np
 import os
-from ish_parser import ish_report, ish_reportException
-from ftplib import FTP
-import gzip
+import logging
+import weakref
+from weather_cache import WeatherCache
+from weather_fetcher import WeatherFetcher
+from scipy.spatial import cKDTree
+
+logger = logging.getLogger(__name__)
+
+
+class WeatherStationIndex:
+    # KD-tree of the weather stations on the unit sphere. The straight-line (chord) distance between unit
+    # vectors increases with the great-circle distance, so the tree answers k-nearest station queries.
+    # Indexes are built once per station list and shared by all Weather instances. They are keyed by the id of the
+    # station list (dataframes are not hashable) and dropped when the list is garbage collected, e.g. after
+    # WeatherStationCatalog.set_file. An index doesn't reference its station list, so it doesn't keep it alive.
+    indexes = {}
+
+    def __init__(self, df_weather_station_list):
+        if 'latitude_rad' in df_weather_station_list.columns:
+            v_lat_rad = np.asarray(df_weather_station_list['latitude_rad'], dtype=float)
+            v_lon_rad = np.asarray(df_weather_station_list['longitude_rad'], dtype=float)
+        else:
+            v_lat_rad = np.radians(np.asarray(df_weather_station_list['latitude'], dtype=float))
+            v_lon_rad = np.radians(np.asarray(df_weather_station_list['longitude'], dtype=float))
+        self.tree = cKDTree(WeatherStationIndex.unit_vectors_rad(v_lat_rad, v_lon_rad))
+
+    @classmethod
+    def get(cls, df_weather_station_list):
+        station_index = cls.indexes.get(id(df_weather_station_list))
+        if station_index is None:
+            station_index = cls(df_weather_station_list)
+            cls.indexes[id(df_weather_station_list)] = station_index
+            weakref.finalize(df_weather_station_list, cls.indexes.pop, id(df_weather_station_list), None)
+        return station_index
+
+    @staticmethod
+    def unit_vectors(latitudes, longitudes):
+        return WeatherStationIndex.unit_vectors_rad(np.radians(latitudes), np.radians(longitudes))
+
+    @staticmethod
+    def unit_vectors_rad(r_lat, r_lon):
+        return np.column_stack([np.cos(r_lat) * np.cos(r_lon), np.cos(r_lat) * np.sin(r_lon), np.sin(r_lat)])
+
+    def query(self, latitudes, longitudes, k=3):
+        # Find the k closest stations of each location
+        # Returns the positions of the stations in the list and the distances (km), both (locations x k) arrays
+        v_chord, v_index = self.tree.query(
+            WeatherStationIndex.unit_vectors(np.atleast_1d(latitudes), np.atleast_1d(longitudes)), k=k)
+        v_index, v_chord = np.atleast_2d(v_index).reshape(-1, k), np.atleast_2d(v_chord).reshape(-1, k)
+        # Catalogs with less than k stations: repeat the farthest station
+        for j in range(1, k):
+            v_missing = v_index[:, j] >= self.tree.n
+            v_index[v_missing, j], v_chord[v_missing, j] = v_index[v_missing, j - 1], v_chord[v_missing, j - 1]
+        v_distance = 2 * Constants.earth_radius * np.arcsin(np.minimum(v_chord / 2, 1))
+        return v_index, v_distance
 
 
 class Weather:
+    # Parse the downloaded ISH records with the ish_parser package (slow) instead of Weather.parse_ish
+    use_ish_parser = False
+
 
-    def __init__(self, coord):
+    def __init__(self, coord, weather_cache=None):
         self.coord = coord
+        self.weather_cache = weather_cache
         self.latitude, self.longitude = coord  # geo-coded address
         self.find_closest_weather_station()
 
+    def get_weather_cache(self):
+        return (self.weather_cache if self.weather_cache is not None else WeatherCache.get_default())
+
     def process(self, df_periods):
         df_periods['start_dates'] = pd.to_datetime(df_periods['start_dates'], utc=True)
         df_periods['end_dates'] = pd.to_datetime(df_periods['end_dates'], utc=True)
@@ -33,6 +92,19 @@ class Weather:
         self.v_end_dates = self.df_periods.loc[:, 'end_dates']
         self.start_year = pd.DatetimeIndex(np.sort(self.v_start_dates)).year[0]
         self.end_year = pd.DatetimeIndex(np.sort(self.v_end_dates)).year[-1]
+        # The years with billing days, without the gaps between the billing periods
+        self.v_years = Weather.billing_years(self.v_start_dates, self.v_end_dates)
+
+    @staticmethod
+    def billing_years(v_start_dates, v_end_dates):
+        # Sorted calendar years covered by the billing periods, from the start year to the end year of each period
+        v_start_years = pd.DatetimeIndex(v_start_dates).year
+        v_end_years = pd.DatetimeIndex(v_end_dates).year
+        set_years = set()
+        for start_year, end_year in zip(v_start_years, v_end_years):
+            if np.isfinite(start_year) and np.isfinite(end_year):
+                set_years.update(range(int(start_year), int(end_year) + 1))
+        return sorted(set_years)
 
     @staticmethod
     def haversine_distance(lat1, lon1, lat2, lon2):
@@ -44,120 +116,190 @@ class Weather:
         distance = 2 * Constants.earth_radius * np.arcsin(np.sqrt(temp))
         return (distance)
 
-    def find_closest_weather_station(self, df_weather_station_list=Constants.df_us_weather_station):
-        self.v_coord = np.asarray(df_weather_station_list[['latitude', 'longitude']].values)
+    def find_closest_weather_station(self, df_weather_station_list=None):
         # Find the closest and second closest weather station (backup if the closest doesn't work)
-        v_distance = [Weather.haversine_distance(self.latitude, self.longitude, coord[0], coord[1])
-                      for coord in self.v_coord]
-        closest_index = np.argmin(v_distance)
-        second_closest_index = np.argpartition(v_distance, 2)[2]
-        third_closest_index = np.argpartition(v_distance, 3)[2]
-
-        self.closest_weather_station_ID = df_weather_station_list.loc[closest_index, 'station_ID']
-        self.closest_weather_station_name = df_weather_station_list.loc[closest_index, 'station_name']
-        self.second_closest_weather_station_ID = df_weather_station_list.loc[second_closest_index, 'station_ID']
-        self.second_closest_weather_station_name = df_weather_station_list.loc[second_closest_index, 'station_name']
-        self.third_closest_weather_station_ID = df_weather_station_list.loc[third_closest_index, 'station_ID']
-        self.third_closest_weather_station_name = df_weather_station_list.loc[third_closest_index, 'station_name']
+        # df_weather_station_list: None ~ the weather station catalog (Constants.df_us_weather_station)
+        if df_weather_station_list is None:
+            df_weather_station_list = Constants.df_us_weather_station
+        v_index, v_distance = WeatherStationIndex.get(df_weather_station_list).query(self.latitude, self.longitude, k=3)
+        closest_index, second_closest_index, third_closest_index = v_index[0]
+        self.closest_weather_station_distance = v_distance[0, 0]
 
-    def download_weather_NOAA(self):
-        print("Downloading weather data...")
+        self.closest_weather_station_ID = df_weather_station_list.iloc[closest_index]['station_ID']
+        self.closest_weather_station_name = df_weather_station_list.iloc[closest_index]['station_name']
+        self.second_closest_weather_station_ID = df_weather_station_list.iloc[second_closest_index]['station_ID']
+        self.second_closest_weather_station_name = df_weather_station_list.iloc[second_closest_index]['station_name']
+        self.third_closest_weather_station_ID = df_weather_station_list.iloc[third_closest_index]['station_ID']
+        self.third_closest_weather_station_name = df_weather_station_list.iloc[third_closest_index]['station_name']
+
+    def fetch_hourly_weather(self, cached=True, d_station_years=None):
+        # Get the hourly weather of the billing years (v_years), the closest weather station first
+        # cached: True ~ pre-downloaded weather data, False ~ download the weather on the go.
+        # d_station_years: (station_ID, year) -> hourly weather of the station-years already loaded, e.g. by the other
+        # fuel of the building; only the other station-years are loaded, and they are added to it
+        if d_station_years is None:
+            d_station_years = {}
+        if cached:
+            s_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+            process_weather = lambda weather_station_ID: self.process_cached_weather(weather_station_ID, s_path,
+                                                                                     d_station_years)
+        else:
+            logger.debug("Downloading weather data...")
+            process_weather = lambda weather_station_ID: self.process_downloaded_weather(weather_station_ID,
+                                                                                         d_station_years)
         try:
-            self.v_T_F, self.v_T_C = self.process_downloaded_weather(self.closest_weather_station_ID)
+            self.df_hourly = process_weather(self.closest_weather_station_ID)
+            self.weather_station_ID = self.closest_weather_station_ID
         except:
             try:
-                print("Weather from the closest weather station not available...")
-                print("Trying to download the third second data from the third closest weather station.")
-                self.v_T_F, self.v_T_C = self.process_downloaded_weather(self.second_closest_weather_station_ID)
+                logger.info("Weather from the closest weather station %s not available, trying the second closest "
+                            "weather station.", self.closest_weather_station_ID)
+                self.df_hourly = process_weather(self.second_closest_weather_station_ID)
+                self.weather_station_ID = self.second_closest_weather_station_ID
             except:
-                print("Weather from the second closest weather station not available...")
-                print("Trying to download the third weather data from the third closest weather station.")
-                self.v_T_F, self.v_T_C = self.process_downloaded_weather(self.third_closest_weather_station_ID)
+                logger.info("Weather from the second closest weather station %s not available, trying the third "
+                            "closest weather station.", self.second_closest_weather_station_ID)
+                self.df_hourly = process_weather(self.third_closest_weather_station_ID)
+                self.weather_station_ID = self.third_closest_weather_station_ID
+
+    def load_weather(self, cached=True, d_station_years=None):
+        # Get the hourly weather and aggregate it to the billing periods, see fetch_hourly_weather
+        self.fetch_hourly_weather(cached, d_station_years)
+        self.v_T_F, self.v_T_C = self.aggregate_weather(self.df_hourly)
+
+    def download_weather_NOAA(self):
+        self.fetch_hourly_weather(cached=False)
+        self.v_T_F, self.v_T_C = self.aggregate_weather(self.df_hourly)
 
     def use_downloaded_weather(self):
-        s_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
-        try:
-            self.v_T_F, self.v_T_C = self.process_cached_weather(self.closest_weather_station_ID, s_path)
-        except:
-            try:
-                print("Weather from the closest weather station not available...")
-                print("Trying to process the third second data from the third closest weather station.")
-                self.v_T_F, self.v_T_C = self.process_cached_weather(self.second_closest_weather_station_ID, s_path)
-            except:
-                print("Weather from the second closest weather station not available...")
-                print("Trying to process the third weather data from the third closest weather station.")
-                self.v_T_F, self.v_T_C = self.process_cached_weather(self.third_closest_weather_station_ID, s_path)
-    
-    def process_cached_weather(self, weather_station_ID, s_path):
-        for year in range(self.start_year, self.end_year + 1):
-            print("Process weather data for year: " + str(year))
-            # Read pre-processed weather files from weather file folders
-            file_name = (s_path + "/Data/Weather/" + str(year) + "/" +
-                         str(year) + "_" + weather_station_ID + '.csv')
+        self.fetch_hourly_weather(cached=True)
+        self.v_T_F, self.v_T_C = self.aggregate_weather(self.df_hourly)
     
-            if (year == self.start_year):
-                df_new = pd.read_csv(file_name)
-            else:
-                df_new = df_new.append(pd.read_csv(file_name), ignore_index=True)
-        df_new['Datetime'] = df_new['Datetime'].astype('datetime64[ns]')
+    def process_cached_weather(self, weather_station_ID, s_path, d_station_years=None):
+        load_function = lambda station_ID, year: Weather.read_csv_weather(station_ID, year, s_path)
+        return (self.concat_station_years(weather_station_ID, load_function, d_station_years))
+
+    def concat_station_years(self, weather_station_ID, load_function, d_station_years=None):
+        # Hourly weather of the billing years of the station, from d_station_years or the weather cache, loaded with
+        # load_function(station_ID, year) if it is in neither. All the years are read before they are shared in
+        # d_station_years, so a missing year leaves it unchanged for the fallback station.
+        if d_station_years is None:
+            d_station_years = {}
+        d_new = {}
+        for year in self.v_years:
+            if (weather_station_ID, year) not in d_station_years:
+                logger.debug("Process weather data for year: %s", year)
+                d_new[(weather_station_ID, year)] = self.get_weather_cache().get_or_load(weather_station_ID, year,
+                                                                                         load_function)
+        d_station_years.update(d_new)
+        df_new = pd.concat([d_station_years[(weather_station_ID, year)] for year in self.v_years], ignore_index=True)
         df_new['Date'] = df_new['Datetime'].dt.date
-        v_T_F, v_T_C = self.aggregate_weather(df_new)
-        return(v_T_F, v_T_C)
-
-    def process_downloaded_weather(self, weather_station_ID):
-
-        # Helper functions
-        def download_sub_hourly_weather(station_ID, year):
-            ftp = FTP('ftp.ncdc.noaa.gov')
-            ftp.login()
-            ftp_path = '/pub/data/noaa/' + str(year)  # Hourly
-            ftp.cwd(ftp_path)
-            # Save gz files locally
-            file_name_noaa = 'RETR ' + station_ID + '-' + str(year) + '.gz'
-            file_name_local = station_ID + '-' + str(year) + '.gz'
-            ftp.retrbinary(file_name_noaa, open(file_name_local, 'wb').write)
-
-        def save_as_csv(stationID, year):
-            file_name_gz = stationID + '-' + str(year) + '.gz'
-            file_name_csv = stationID + '-' + str(year) + '.csv'
-            with gzip.open(file_name_gz, 'rb') as infile:
-                with open(file_name_csv, 'wb') as outfile:
-                    for line in infile:
-                        outfile.write(line)
-            os.remove(file_name_gz)
-
-        def get_ish_report_helper(raw_rpt):
-            return (ish_report().loads(raw_rpt))
-
-        def get_ish_report_datetime_helper(raw_rpt):
-            return (raw_rpt.datetime)
-
-        def get_ish_report_temperature_helper(raw_rpt):
-            return (raw_rpt.air_temperature.get_fahrenheit())
-        
-        for year in range(self.start_year, self.end_year + 1):
-            print("--->" + str(year))
-            download_sub_hourly_weather(weather_station_ID, year)
-            save_as_csv(weather_station_ID, year)
-            raw_csv = weather_station_ID + '-' + str(year) + '.csv'
-            if (year == self.start_year):
-                df_raw = pd.read_csv(raw_csv, names=['Old'])
+        return(df_new)
+
+    @staticmethod
+    def csv_weather_file(station_ID, year, s_path=None):
+        # Pre-processed weather file of the station-year
+        if s_path is None:
+            s_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        return (s_path + "/Data/Weather/" + str(year) + "/" + str(year) + "_" + station_ID + '.csv')
+
+    @staticmethod
+    def read_csv_weather(station_ID, year, s_path=None):
+        # Read pre-processed weather files from weather file folders
+        df_year = pd.read_csv(Weather.csv_weather_file(station_ID, year, s_path))
+        df_year['Datetime'] = df_year['Datetime'].astype('datetime64[ns]')
+        return (df_year[['Datetime', 'Temperature']])
+
+    def process_downloaded_weather(self, weather_station_ID, d_station_years=None):
+
+        def download_and_parse(station_ID, year):
+            logger.debug("Downloading the weather of station %s for year %s", station_ID, year)
+            raw_ish = WeatherFetcher.get_default().fetch(station_ID, year)
+            return (Weather.parse_ish_records(raw_ish))
+
+        # Download the missing years concurrently, then read each station-year from the weather cache
+        d_errors = Weather.prefetch_weather([(weather_station_ID, year) for year in self.v_years
+                                             if d_station_years is None or (weather_station_ID, year) not in
+                                             d_station_years],
+                                            self.get_weather_cache())
+        if len(d_errors) > 0:
+            # Not retried here, the caller falls back to the next closest station
+            raise d_errors[min(d_errors)]
+        return (self.concat_station_years(weather_station_ID, download_and_parse, d_station_years))
+
+    @staticmethod
+    def prefetch_weather(v_station_years, weather_cache=None, weather_fetcher=None, cached=False):
+        # Load and cache the (station_ID, year) pairs that are not in the weather cache yet, concurrently
+        # cached: True ~ read the pre-downloaded weather files, False ~ download and parse the ISH files
+        # Returns the errors of the station-years that could not be loaded, keyed by (station_ID, year)
+        if weather_cache is None:
+            weather_cache = WeatherCache.get_default()
+        if weather_fetcher is None:
+            weather_fetcher = WeatherFetcher.get_default()
+        v_missing = sorted(set([station_year for station_year in v_station_years
+                                if not weather_cache.contains(*station_year)]))
+
+        def load_and_cache(station_year):
+            if cached:
+                df_hourly = Weather.read_csv_weather(*station_year)
             else:
-                df_raw = df_raw.append(pd.read_csv(raw_csv, names=['Old']),
-                                       ignore_index=True)
-            # Cleaning up
-            os.remove(raw_csv)
-        # Parse ish text data to readable weather data
-        print("Processing downloaded data...")
-        v_rpt = list(map(get_ish_report_helper, df_raw['Old']))
-        v_noaa_datetime = np.array(list(map(get_ish_report_datetime_helper, v_rpt)))
-        v_noaa_temperature_F = np.array(list(map(get_ish_report_temperature_helper, v_rpt)))
+                df_hourly = Weather.parse_ish_records(weather_fetcher.fetch(*station_year))
+            weather_cache.put(station_year[0], station_year[1], df_hourly)
+
+        d_results, d_errors = weather_fetcher.map(load_and_cache, v_missing)
+        return (d_errors)
+
+    @staticmethod
+    def parse_ish_records(raw_ish):
+        if Weather.use_ish_parser:
+            return (Weather.parse_ish_with_ish_parser(raw_ish.decode('ascii').splitlines()))
+        return (Weather.parse_ish(raw_ish))
+
+    @staticmethod
+    def parse_ish(raw_ish, v_rejected_quality_codes=()):
+        # Parse the date, time and air temperature from the fixed-width mandatory section of ISH records
+        # (https://www.ncei.noaa.gov/data/global-hourly/doc/isd-format-document.pdf) with array operations.
+        # raw_ish: the decompressed bytes of a station-year file, one record per line
+        # v_rejected_quality_codes: air temperature quality codes (e.g. b'37') to set to NaN, all are kept by default
+        # Returns the UTC date times (naive) and air temperatures (F), missing values (+9999) are NaN.
+        v_bytes = np.frombuffer(raw_ish, dtype=np.uint8)
+        v_line_ends = np.flatnonzero(v_bytes == ord('\n'))
+        if len(v_bytes) > 0 and v_bytes[-1] != ord('\n'):
+            v_line_ends = np.append(v_line_ends, len(v_bytes))
+        v_line_starts = np.concatenate([[0], v_line_ends[:-1] + 1])
+        # Skip the records too short to hold the air temperature quality code (column 93)
+        v_line_starts = v_line_starts[v_line_ends - v_line_starts >= 93]
+
+        def read_digits(first, last):
+            m_digits = v_bytes[v_line_starts[:, None] + np.arange(first, last)].astype(np.int64) - ord('0')
+            return (m_digits.dot(10 ** np.arange(last - first - 1, -1, -1)))
+
+        v_year, v_month, v_day = read_digits(15, 19), read_digits(19, 21), read_digits(21, 23)
+        v_hour, v_minute = read_digits(23, 25), read_digits(25, 27)
+        # Hour 24 is midnight of the next day, the offsets below roll it over
+        v_datetime = (((v_year - 1970) * 12 + v_month - 1).astype('datetime64[M]').astype('datetime64[D]')
+                      + (v_day - 1).astype('timedelta64[D]')).astype('datetime64[ns]')
+        v_datetime = v_datetime + (v_hour * 60 + v_minute).astype('timedelta64[m]')
+
+        v_T_tenth_C = read_digits(88, 92)
+        v_T_C = np.where(v_bytes[v_line_starts + 87] == ord('-'), -v_T_tenth_C, v_T_tenth_C) / 10.0
+        v_T_F = np.round(1.8 * v_T_C + 32.0, 1)
+        v_missing = v_T_tenth_C == 9999
+        if len(v_rejected_quality_codes) > 0:
+            v_missing |= np.isin(v_bytes[v_line_starts + 92], np.frombuffer(bytes(v_rejected_quality_codes), np.uint8))
+        v_T_F[v_missing] = np.nan
+        return (pd.DataFrame({'Datetime': v_datetime, 'Temperature': v_T_F}))
+
+    @staticmethod
+    def parse_ish_with_ish_parser(v_raw_records):
+        # Legacy parser building an ish_parser report per record, used when Weather.use_ish_parser is set
+        from ish_parser import ish_report
+        v_rpt = [ish_report().loads(raw_rpt) for raw_rpt in v_raw_records]
+        v_noaa_datetime = np.array([rpt.datetime for rpt in v_rpt])
+        v_noaa_temperature_F = np.array([rpt.air_temperature.get_fahrenheit() for rpt in v_rpt])
         # Sanitize the array
         v_noaa_temperature_F = pd.to_numeric(v_noaa_temperature_F, errors='coerce')
-        df_new = pd.DataFrame({'Datetime': v_noaa_datetime, 'Temperature': v_noaa_temperature_F})
-        df_new['Date'] = df_new['Datetime'].dt.date
-        v_T_F, v_T_C = self.aggregate_weather(df_new)
-        return(v_T_F, v_T_C)
+        return (pd.DataFrame({'Datetime': v_noaa_datetime, 'Temperature': v_noaa_temperature_F}))
 
     def aggregate_weather(self, df_daily):
         # Get daily weather data
@@ -165,20 +307,25 @@ class Weather:
         # Remove time zone information
         self.v_start_dates = np.array(self.v_start_dates, dtype=np.datetime64)
         self.v_end_dates = np.array(self.v_end_dates, dtype=np.datetime64)
-        df_daily['Datetime'] = np.array(df_daily['Datetime'], dtype=np.datetime64)
-
-        df_daily = df_daily.loc[(df_daily['Datetime'] >=min(self.v_start_dates)) &
-                                (df_daily['Datetime'] <= max(self.v_end_dates))]
+        v_temp_datetime = np.array(df_daily['Datetime'], dtype='datetime64[ns]')
+        v_temp_T_F = np.array(df_daily['Temperature'], dtype=float)
 
         # Aggregate the weather data to the billing periods level.
-        v_avg_period_T_F = np.empty(0, dtype=float)
-        v_start_dates = np.array(self.v_start_dates)
-        v_end_dates = np.array(self.v_end_dates)
-        v_temp_datetime = np.array(df_daily['Datetime'], dtype=np.datetime64)
-        for i in range(len(self.v_start_dates)):
-            df_temp = df_daily.loc[(v_temp_datetime >= v_start_dates[i]) &
-                                   (v_temp_datetime <= v_end_dates[i])]
-            v_avg_period_T_F = np.append(v_avg_period_T_F, df_temp['Temperature'].mean())
+        # Sort the records once, then get the sum and count of the valid (non-NaN) temperatures of all the
+        # billing periods from cumulative sums. Billing periods may overlap or be out of order.
+        order = np.argsort(v_temp_datetime, kind='stable')
+        v_temp_datetime = v_temp_datetime[order]
+        v_temp_T_F = v_temp_T_F[order]
+        v_valid = ~np.isnan(v_temp_T_F)
+        v_cum_T_F = np.concatenate([[0], np.cumsum(np.where(v_valid, v_temp_T_F, 0))])
+        v_cum_count = np.concatenate([[0], np.cumsum(v_valid)])
+        # Both the start and end dates are included in the billing period
+        v_first = np.searchsorted(v_temp_datetime, self.v_start_dates.astype('datetime64[ns]'), side='left')
+        v_last = np.searchsorted(v_temp_datetime, self.v_end_dates.astype('datetime64[ns]'), side='right')
+        v_count = v_cum_count[v_last] - v_cum_count[v_first]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            v_avg_period_T_F = (v_cum_T_F[v_last] - v_cum_T_F[v_first]) / v_count
+        v_avg_period_T_F[v_count == 0] = np.nan
         v_avg_period_T_C = (v_avg_period_T_F - 32) / 1.8
 
-        return (v_avg_period_T_F, v_avg_period_T_C)
\ No newline at end of file
+        return (v_avg_period_T_F, v_avg_period_T_C)
@@ -0,0 +1,152 @@
+'''
+
+Building Efficiency Targeting Tool for Energy Retrofits (BETTER) Copyright (c) 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Dept. of Energy). All rights reserved.
+
+If you have questions about your rights to use or distribute this software, please contact Berkeley Lab's Intellectual Property Office at  IPO@lbl.gov.
+
+NOTICE.  This Software was developed
+under funding from the U.S. Department of Energy and the U.S. Government consequently retains certain rights. As such, the U.S. Government has been granted for itself and others acting on its behalf a paid-up, nonexclusive, irrevocable, worldwide license in the Software to reproduce, distribute copies to the public, prepare derivative works, and perform publicly and display publicly, and to permit other to do so.
+
+'''
+
+import pandas as pd
+import numpy as np
+import os
+import zipfile
+import tempfile
+
+
+class WeatherCache:
+    # On-disk store of the parsed hourly temperatures, one compressed NumPy file per (station, year).
+    # A read touches the modification time of the file, so the file times record the last access. When the store
+    # grows over max_size_bytes, the least recently used files are evicted, from the sizes and times listed by
+    # os.scandir. There is no shared index to keep consistent: files are written to a temporary file then renamed,
+    # so concurrent readers and writers (e.g. batch worker processes) never see a partial file, and a file removed
+    # by another process is simply a cache miss.
+    default_cache = None
+
+    def __init__(self, cache_dir=None, max_size_bytes=2 * 1024 ** 3):
+        if cache_dir is None:
+            s_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+            cache_dir = os.environ.get('BETTER_WEATHER_CACHE', s_path + '/Data/Weather/cache')
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        self.n_hits = 0
+        self.n_misses = 0
+        # Station-years kept in memory, e.g. the weather of a whole portfolio while it is analyzed
+        self.d_pinned = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @classmethod
+    def get_default(cls):
+        if cls.default_cache is None:
+            cls.default_cache = cls()
+        return cls.default_cache
+
+    @classmethod
+    def set_default(cls, cache):
+        cls.default_cache = cache
+
+    @staticmethod
+    def key(station_ID, year):
+        return str(station_ID) + '_' + str(year)
+
+    def file_path(self, key):
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    def write_atomic(self, file_name, write_function):
+        f_temp, temp_name = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(f_temp, 'wb') as f:
+                write_function(f)
+            os.replace(temp_name, file_name)
+        except:
+            if os.path.exists(temp_name):
+                os.remove(temp_name)
+            raise
+
+    def get(self, station_ID, year):
+        # Return the hourly weather (Datetime, Temperature) of the station-year, None if it is not in the store
+        key = WeatherCache.key(station_ID, year)
+        if key in self.d_pinned:
+            self.n_hits += 1
+            return self.d_pinned[key]
+        try:
+            with np.load(self.file_path(key)) as npz:
+                df_hourly = pd.DataFrame({'Datetime': npz['datetime'].astype('datetime64[ns]'),
+                                          'Temperature': npz['temperature']})
+        except (IOError, ValueError, KeyError, zipfile.BadZipFile):
+            # Missing, or corrupt e.g. truncated by a full disk
+            self.n_misses += 1
+            return None
+        self.n_hits += 1
+        try:
+            # Record the access for the LRU eviction
+            os.utime(self.file_path(key))
+        except OSError:
+            # Evicted by another process meanwhile
+            pass
+        return df_hourly
+
+    def put(self, station_ID, year, df_hourly):
+        key = WeatherCache.key(station_ID, year)
+        # Time stamps are stored as naive UTC nanoseconds, whatever the unit of the input (e.g. us with pandas 3)
+        v_datetime = pd.DatetimeIndex(pd.to_datetime(df_hourly['Datetime'], utc=True)).tz_localize(None) \
+            .astype('datetime64[ns]').asi8
+        v_temperature = np.array(df_hourly['Temperature'], dtype=float)
+        self.write_atomic(self.file_path(key),
+                          lambda f: np.savez_compressed(f, datetime=v_datetime, temperature=v_temperature))
+        self.evict(keep=key)
+
+    def contains(self, station_ID, year):
+        key = WeatherCache.key(station_ID, year)
+        return (key in self.d_pinned or os.path.exists(self.file_path(key)))
+
+    def pin(self, station_ID, year):
+        # Keep the station-year in memory, returns False if it is not in the store
+        df_hourly = self.get(station_ID, year)
+        if df_hourly is None:
+            return False
+        self.d_pinned[WeatherCache.key(station_ID, year)] = df_hourly
+        return True
+
+    def unpin_all(self):
+        self.d_pinned = {}
+
+    def get_or_load(self, station_ID, year, load_function):
+        # Read the station-year from the store, or load it with load_function(station_ID, year) and store it
+        df_hourly = self.get(station_ID, year)
+        if df_hourly is None:
+            df_hourly = load_function(station_ID, year)
+            self.put(station_ID, year, df_hourly)
+        return df_hourly
+
+    def list_files(self):
+        # (last access time, size, key) of the files in the store
+        v_files = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith('.npz'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                v_files.append((stat.st_mtime, stat.st_size, entry.name[:-len('.npz')]))
+        return v_files
+
+    def evict(self, keep=None):
+        # Remove the least recently used files until the store fits in max_size_bytes
+        v_files = self.list_files()
+        total_size = sum([size for _, size, _ in v_files])
+        for _, size, key in sorted(v_files):
+            if total_size <= self.max_size_bytes:
+                break
+            if key == keep:
+                continue
+            total_size -= size
+            try:
+                os.remove(self.file_path(key))
+            except OSError:
+                # Removed by another process
+                pass
@@ -0,0 +1,181 @@
+'''
+
+Building Efficiency Targeting Tool for Energy Retrofits (BETTER) Copyright (c) 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Dept. of Energy). All rights reserved.
+
+If you have questions about your rights to use or distribute this software, please contact Berkeley Lab's Intellectual Property Office at  IPO@lbl.gov.
+
+NOTICE.  This Software was developed
+under funding from the U.S. Department of Energy and the U.S. Government consequently retains certain rights. As such, the U.S. Government has been granted for itself and others acting on its behalf a paid-up, nonexclusive, irrevocable, worldwide license in the Software to reproduce, distribute copies to the public, prepare derivative works, and perform publicly and display publicly, and to permit other to do so.
+
+'''
+
+import os
+import time
+import zlib
+import queue
+import ftplib
+import threading
+import http.client
+import concurrent.futures
+from urllib.parse import urlparse
+
+
+class WeatherFetchError(IOError):
+    # The station-year file does not exist on the server, not retried
+    pass
+
+
+class WeatherFetcher:
+    # Downloads the NOAA ISH station-year files (<url>/<year>/<station_ID>-<year>.gz) over FTP or HTTP(S).
+    # Connections are kept in a pool and reused across downloads, station-years are downloaded concurrently by a
+    # bounded thread pool, and failed transfers are retried with exponential backoff.
+    # The station-years missing on the server are remembered, they are not requested again by the fetcher.
+    # The server can be a local stand-in, e.g. url='http://localhost:8000' serving <year>/<station_ID>-<year>.gz
+    default_fetcher = None
+
+    def __init__(self, url=None, n_threads=8, n_retries=3, backoff_seconds=1.0, timeout=60):
+        if url is None:
+            url = os.environ.get('BETTER_WEATHER_URL', 'ftp://ftp.ncdc.noaa.gov/pub/data/noaa')
+        self.url = urlparse(url)
+        if self.url.scheme not in ('ftp', 'http', 'https'):
+            raise ValueError("Unsupported weather server URL: " + url)
+        self.n_threads = n_threads
+        self.n_retries = n_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self.connections = queue.LifoQueue()
+        # The process the pooled connections belong to, a forked child opens its own
+        self.pid = os.getpid()
+        # Compressed bytes downloaded
+        self.n_bytes_fetched = 0
+        self.set_not_found = set()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def get_default(cls):
+        if cls.default_fetcher is None:
+            cls.default_fetcher = cls()
+        return cls.default_fetcher
+
+    @classmethod
+    def set_default(cls, fetcher):
+        cls.default_fetcher = fetcher
+
+    def file_path(self, station_ID, year):
+        return self.url.path.rstrip('/') + '/' + str(year) + '/' + station_ID + '-' + str(year) + '.gz'
+
+    def connect(self):
+        if self.url.scheme == 'ftp':
+            connection = ftplib.FTP(timeout=self.timeout)
+            connection.connect(self.url.hostname, self.url.port or 21)
+            connection.login(self.url.username or 'anonymous', self.url.password or '')
+        elif self.url.scheme == 'https':
+            connection = http.client.HTTPSConnection(self.url.hostname, self.url.port, timeout=self.timeout)
+        else:
+            connection = http.client.HTTPConnection(self.url.hostname, self.url.port, timeout=self.timeout)
+        return (connection)
+
+    def check_process(self):
+        if os.getpid() != self.pid:
+            # Forked: the sockets of the pool are shared with the parent, leave them to it
+            self.connections = queue.LifoQueue()
+            self.lock = threading.Lock()
+            self.pid = os.getpid()
+
+    def acquire(self):
+        self.check_process()
+        try:
+            return (self.connections.get_nowait())
+        except queue.Empty:
+            return (self.connect())
+
+    def release(self, connection):
+        self.connections.put(connection)
+
+    @staticmethod
+    def discard(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def download(self, connection, station_ID, year, decompressor):
+        # Download the gz file into memory, decompressing the chunks as they arrive
+        # Returns the decompressed chunks and the number of compressed bytes downloaded
+        v_chunks = []
+        v_sizes = []
+
+        def add_chunk(chunk):
+            v_sizes.append(len(chunk))
+            v_chunks.append(decompressor.decompress(chunk))
+
+        if self.url.scheme == 'ftp':
+            try:
+                connection.retrbinary('RETR ' + self.file_path(station_ID, year), add_chunk)
+            except ftplib.error_perm as e:
+                raise WeatherFetchError(str(e))
+            return (v_chunks, sum(v_sizes))
+        connection.request('GET', self.file_path(station_ID, year))
+        response = connection.getresponse()
+        if response.status != 200:
+            response.read()
+            if response.status == 404:
+                raise WeatherFetchError(station_ID + '-' + str(year) + '.gz not found')
+            raise IOError('HTTP ' + str(response.status) + ' ' + response.reason)
+        chunk = response.read(65536)
+        while chunk:
+            add_chunk(chunk)
+            chunk = response.read(65536)
+        return (v_chunks, sum(v_sizes))
+
+    def fetch(self, station_ID, year):
+        # Return the decompressed ISH records of the station-year
+        if (station_ID, str(year)) in self.set_not_found:
+            raise WeatherFetchError(station_ID + '-' + str(year) + '.gz not found (previous request)')
+        for attempt in range(self.n_retries + 1):
+            connection = self.acquire()
+            try:
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)  # gzip header
+                v_chunks, n_bytes = self.download(connection, station_ID, year, decompressor)
+                v_chunks.append(decompressor.flush())
+            except WeatherFetchError:
+                self.release(connection)
+                with self.lock:
+                    self.set_not_found.add((station_ID, str(year)))
+                raise
+            except (IOError, EOFError, ftplib.Error, http.client.HTTPException, zlib.error):
+                # The connection may be broken, open a new one for the next attempt
+                WeatherFetcher.discard(connection)
+                if attempt == self.n_retries:
+                    raise
+                time.sleep(self.backoff_seconds * 2 ** attempt)
+                continue
+            self.release(connection)
+            with self.lock:
+                self.n_bytes_fetched += n_bytes
+            return (b''.join(v_chunks))
+
+    def map(self, function, v_items):
+        # Run function on the items with the thread pool
+        # Returns the results and the exceptions raised, both dicts keyed by item
+        # The thread pool only lives for the call, a process forked later doesn't inherit its dead threads
+        d_results, d_errors = {}, {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.n_threads) as executor:
+            d_futures = {executor.submit(function, item): item for item in v_items}
+            for future in concurrent.futures.as_completed(d_futures):
+                try:
+                    d_results[d_futures[future]] = future.result()
+                except Exception as e:
+                    d_errors[d_futures[future]] = e
+        return (d_results, d_errors)
+
+    def close(self):
+        self.check_process()
+        while not self.connections.empty():
+            connection = self.connections.get_nowait()
+            if self.url.scheme == 'ftp':
+                try:
+                    connection.quit()
+                except Exception:
+                    pass
+            WeatherFetcher.discard(connection)
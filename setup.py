@@ -10,12 +10,14 @@ setup(name='CERC_BEE_Tool',
       packages=[],
       install_requires=[
           'geocoder>=1.38.1',
-          'ish_parser>=0.0.22',
           'numpy>=1.14.2',
           'pandas>=0.22.0',
           'scipy>=1.0.0',
           'xlrd>= 0.9.0'
       ],
+      extras_require={
+          'ish_parser': ['ish_parser>=0.0.22']
+      },
       zip_safe=False)
 
 
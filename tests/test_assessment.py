@@ -0,0 +1,143 @@
+'''
+
+Building Efficiency Targeting Tool for Energy Retrofits (BETTER) Copyright (c) 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Dept. of Energy). All rights reserved.
+
+If you have questions about your rights to use or distribute this software, please contact Berkeley Lab's Intellectual Property Office at  IPO@lbl.gov.
+
+NOTICE.  This Software was developed
+under funding from the U.S. Department of Energy and the U.S. Government consequently retains certain rights. As such, the U.S. Government has been granted for itself and others acting on its behalf a paid-up, nonexclusive, irrevocable, worldwide license in the Software to reproduce, distribute copies to the public, prepare derivative works, and perform publicly and display publicly, and to permit other to do so.
+
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from assessment import LEAN_FIMs
+
+FIM_NAMES = ['Increase Cooling Setpoints', 'Decrease Heating Setpoints', 'Reduce Equipment Schedules',
+             'Decrease Ventilation', 'Eliminate Electric Heating', 'Decrease Infiltration', 'Reduce Lighting Load',
+             'Reduce Plug Loads', 'Add/Fix Economizers', 'Increase Cooling System Efficiency',
+             'Increase Heating System Efficiency', 'Add Wall/Ceiling Insulation', 'Upgrade Windows',
+             'Check Fossil Baseload']
+
+
+def scalar_targets(site_coeffs, medians, stdevs, target_level):
+    # The per-coefficient loop LEAN_FIMs.set_targets had before the targets were vectorized
+    targets = np.zeros(5)
+    for i in range(5):
+        if np.isnan(site_coeffs[i]):
+            targets[i] = np.nan
+        elif target_level == 1:
+            targets[i] = (max(medians[i] - stdevs[i], site_coeffs[i]) if i == 2 else
+                          min(medians[i] + stdevs[i], site_coeffs[i]))
+        elif target_level == 2:
+            targets[i] = max(medians[i], site_coeffs[i]) if i == 2 else min(medians[i], site_coeffs[i])
+        else:
+            targets[i] = (max(medians[i] + 0.5 * stdevs[i], site_coeffs[i]) if i == 2 else
+                          min(medians[i] - 0.5 * stdevs[i], site_coeffs[i]))
+    return (targets)
+
+
+def scalar_FIMs(site_coeffs, targets, utility_type):
+    # The if chain LEAN_FIMs.FIM_recommendations had before the measures were table-driven, with the override
+    # threshold it used for every measure
+    base, cdd, betc, hdd, beth = site_coeffs
+    base_targ, cdd_targ, betc_targ, hdd_targ, beth_targ = targets
+    threshold = 0.001
+    set_FIMs = set()
+    # Counted as ints, numpy booleans add up as a logical or
+    low_betc = int((betc_targ - betc) >= (threshold * betc_targ))
+    high_beth = int((beth - beth_targ) >= (threshold * beth_targ))
+    high_cdd = int(cdd > 0 and (cdd - cdd_targ) >= (threshold * cdd_targ))
+    high_hdd = int(hdd > 0 and (hdd - hdd_targ) >= (threshold * hdd_targ))
+    high_base = int(base > 0 and (base - base_targ) >= (threshold * base_targ))
+    setpoint_recommendation = False
+    if low_betc:
+        set_FIMs.add('Increase Cooling Setpoints')
+        setpoint_recommendation = True
+    if high_beth:
+        set_FIMs.add('Decrease Heating Setpoints')
+        setpoint_recommendation = True
+    if utility_type == 1 and high_base:
+        set_FIMs.add('Reduce Equipment Schedules')
+    elif setpoint_recommendation:
+        set_FIMs.add('Reduce Equipment Schedules')
+    if high_cdd + high_hdd + high_beth >= 2:
+        set_FIMs.add('Decrease Ventilation')
+    if utility_type == 1 and hdd > 0.01:
+        set_FIMs.add('Eliminate Electric Heating')
+    if high_cdd + high_hdd + high_beth >= 2:
+        set_FIMs.add('Decrease Infiltration')
+    if utility_type == 1 and high_base:
+        set_FIMs.add('Reduce Lighting Load')
+        set_FIMs.add('Reduce Plug Loads')
+    if low_betc:
+        set_FIMs.add('Add/Fix Economizers')
+    if high_cdd:
+        set_FIMs.add('Increase Cooling System Efficiency')
+    if high_hdd:
+        set_FIMs.add('Increase Heating System Efficiency')
+    if high_cdd + high_hdd + high_beth >= 2:
+        set_FIMs.add('Add Wall/Ceiling Insulation')
+    if high_cdd + high_hdd + low_betc == 3:
+        set_FIMs.add('Upgrade Windows')
+    if utility_type == 2 and high_base:
+        set_FIMs.add('Check Fossil Baseload')
+    return ([FIM_name in set_FIMs for FIM_name in FIM_NAMES])
+
+
+def random_buildings(n_buildings, seed):
+    # Site coefficients (base, cdd, betc, hdd, beth) around the benchmark medians, with missing slopes and
+    # change-points, zeros, and coefficients equal to their median
+    rng = np.random.default_rng(seed)
+    v_medians = np.array([0.5, 0.05, 18.0, 0.03, 12.0])
+    v_stdevs = np.array([0.2, 0.02, 3.0, 0.015, 3.0])
+    m_site = np.abs(v_medians + v_stdevs * rng.normal(0, 1.5, (n_buildings, 5)))
+    m_site[rng.random(m_site.shape) < 0.1] = 0
+    m_site[rng.random(m_site.shape) < 0.1] = np.nan
+    v_equal = rng.random(m_site.shape) < 0.1
+    m_site[v_equal] = np.broadcast_to(v_medians, m_site.shape)[v_equal]
+    return (m_site, v_medians, v_stdevs)
+
+
+@pytest.mark.parametrize('target_level', [1, 2, 3])
+def test_targets_match_the_scalar_loop(target_level):
+    m_site, v_medians, v_stdevs = random_buildings(500, target_level)
+    m_targets = LEAN_FIMs.targets(m_site, v_medians, v_stdevs, target_level)
+    np.testing.assert_array_equal(m_targets, [scalar_targets(site, v_medians, v_stdevs, target_level)
+                                              for site in m_site])
+
+
+@pytest.mark.parametrize('utility_type', [1, 2])
+@pytest.mark.parametrize('target_level', [1, 2, 3])
+def test_FIM_rules_match_the_scalar_if_chain(utility_type, target_level):
+    m_site, v_medians, v_stdevs = random_buildings(2000, 10 * utility_type + target_level)
+    m_targets = LEAN_FIMs.targets(m_site, v_medians, v_stdevs, target_level)
+    # Also targets above and below the site coefficients, not only from the benchmark
+    m_targets[::2] *= np.random.default_rng(target_level).uniform(0.5, 1.5, m_targets[::2].shape)
+    assert LEAN_FIMs.FIM_names == FIM_NAMES
+    m_FIMs = LEAN_FIMs.FIM_matrix(m_site, m_targets, utility_type)
+    m_expected = np.array([scalar_FIMs(site, targets, utility_type) for site, targets in zip(m_site, m_targets)])
+    np.testing.assert_array_equal(m_FIMs, m_expected)
+    # Every measure is recommended to some buildings and not to others
+    assert (m_expected.any(axis=0) == [True] * 4 + [utility_type == 1] + [True] + [utility_type == 1] * 2 +
+            [True] * 5 + [utility_type == 2]).all()
+    assert not m_expected.all(axis=0).any()
+
+
+def test_FIM_recommendations_of_an_assessment():
+    v_medians, v_stdevs = [0.5, 0.05, 18.0, 0.03, 12.0], [0.2, 0.02, 3.0, 0.015, 3.0]
+    df_assessment = pd.DataFrame({'beta_median': v_medians, 'beta_standard_deviation': v_stdevs,
+                                  'site_coefficients': [0.9, 0.08, 15.0, 0.02, 12.5]},
+                                 index=LEAN_FIMs.coefficient_names)
+    FIM_analysis = LEAN_FIMs(df_assessment, 1)
+    FIM_analysis.set_targets(2)
+    df_FIM = FIM_analysis.FIM_recommendations(save_file=False)
+    v_expected = scalar_FIMs(FIM_analysis.site_coeffs,
+                             scalar_targets(FIM_analysis.site_coeffs, v_medians, v_stdevs, 2), 1)
+    v_recommended = list(df_FIM.index[df_FIM['FIM Recommendations'] == 'X'])
+    assert v_recommended == [FIM_name for FIM_name, is_recommended in zip(FIM_NAMES, v_expected) if is_recommended]
+    # Low cooling change-point, high baseload and cooling slope
+    assert {'Increase Cooling Setpoints', 'Reduce Lighting Load', 'Increase Cooling System Efficiency'} <= \
+        set(v_recommended)
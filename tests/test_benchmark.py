@@ -0,0 +1,113 @@
+'''
+
+Building Efficiency Targeting Tool for Energy Retrofits (BETTER) Copyright (c) 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Dept. of Energy). All rights reserved.
+
+If you have questions about your rights to use or distribute this software, please contact Berkeley Lab's Intellectual Property Office at  IPO@lbl.gov.
+
+NOTICE.  This Software was developed
+under funding from the U.S. Department of Energy and the U.S. Government consequently retains certain rights. As such, the U.S. Government has been granted for itself and others acting on its behalf a paid-up, nonexclusive, irrevocable, worldwide license in the Software to reproduce, distribute copies to the public, prepare derivative works, and perform publicly and display publicly, and to permit other to do so.
+
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmark import IncrementalBenchmarkStats, BenchmarkSketch
+from portfolio import Portfolio
+
+COLUMNS = IncrementalBenchmarkStats.coefficient_columns
+
+
+def building_models(n_buildings, seed, nan_fraction=0.2, ties=True):
+    # Coefficient table with NaNs (no fit, or no slope) and ties (values rounded to 0.1)
+    rng = np.random.default_rng(seed)
+    m_coeffs = rng.lognormal(0, 1, (n_buildings, len(COLUMNS)))
+    if ties:
+        m_coeffs = np.round(m_coeffs, 1)
+    m_coeffs[rng.random(m_coeffs.shape) < nan_fraction] = np.nan
+    df_building_models = pd.DataFrame(m_coeffs, columns=COLUMNS)
+    df_building_models.insert(0, 'Model', ['bldg_' + str(i) for i in range(n_buildings)])
+    return (df_building_models)
+
+
+def numpy_stats(df_building_models):
+    # Median and MAD of each coefficient with numpy, NaNs ignored
+    d_stats = {}
+    for column in COLUMNS:
+        v_values = np.asarray(df_building_models[column], dtype=float)
+        median = np.nanmedian(v_values) if np.isfinite(v_values).any() else np.nan
+        mad = np.nanmedian(np.abs(v_values - median)) if np.isfinite(v_values).any() else np.nan
+        d_stats[column] = (median, mad)
+    return (d_stats)
+
+
+def assert_stats_equal(stats, df_building_models):
+    for column, (median, mad) in numpy_stats(df_building_models).items():
+        np.testing.assert_equal([stats.median(column), stats.median_absolute_deviation(column)], [median, mad],
+                                err_msg=column)
+
+
+@pytest.mark.parametrize('n_buildings', [1, 2, 7, 50, 51])
+def test_incremental_stats_match_numpy(n_buildings):
+    df_building_models = building_models(n_buildings, n_buildings)
+    assert_stats_equal(IncrementalBenchmarkStats(df_building_models), df_building_models)
+
+
+def test_incremental_stats_follow_adds_updates_and_removes():
+    rng = np.random.default_rng(0)
+    df_building_models = building_models(40, 1).set_index('Model', drop=False)
+    stats = IncrementalBenchmarkStats(df_building_models)
+    for step in range(200):
+        building_ID = 'bldg_' + str(rng.integers(60))
+        if building_ID in df_building_models.index and rng.random() < 0.4:
+            stats.remove(building_ID)
+            df_building_models = df_building_models.drop(building_ID)
+        else:
+            d_coeffs = {column: float(value) for column, value in
+                        zip(COLUMNS, np.round(rng.lognormal(0, 1, len(COLUMNS)), 1))}
+            d_coeffs[COLUMNS[rng.integers(len(COLUMNS))]] = np.nan
+            stats.update(building_ID, d_coeffs)
+            df_building_models.loc[building_ID, COLUMNS] = [d_coeffs[column] for column in COLUMNS]
+        assert len(stats) == len(df_building_models)
+        assert_stats_equal(stats, df_building_models)
+
+
+def test_incremental_stats_frame_matches_the_portfolio_stats():
+    df_building_models = building_models(101, 2)
+    df_incremental = IncrementalBenchmarkStats(df_building_models).get_benchmark_stats()
+    df_portfolio = Portfolio.generate_benchmark_stats(df_building_models)
+    pd.testing.assert_frame_equal(df_incremental.astype(float), df_portfolio.loc[COLUMNS].astype(float))
+
+
+def test_sketch_is_exact_below_k():
+    df_building_models = building_models(150, 3)
+    df_sketch = BenchmarkSketch(k=200, seed=0).add_building_models(df_building_models).get_benchmark_stats()
+    for column, (median, mad) in numpy_stats(df_building_models).items():
+        assert df_sketch.at[column, 'beta_median'] == median
+        assert df_sketch.at[column, 'beta_standard_deviation'] == pytest.approx(1.4826 * mad)
+
+
+def rank_error(v_values, value):
+    # Distance of the value from the middle of the sorted values, as a fraction of the number of values
+    rank_below, rank_at = np.mean(v_values < value), np.mean(v_values <= value)
+    return (max(rank_below - 0.5, 0.5 - rank_at, 0))
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_sketch_rank_error_of_large_groups(seed):
+    k = 200
+    df_building_models = building_models(20000, seed, nan_fraction=0.1, ties=False)
+    # Sketches of 4 shards, merged after a serialization round trip
+    sketch = BenchmarkSketch(k, seed)
+    for v_rows in np.array_split(np.arange(len(df_building_models)), 4):
+        raw_sketch = BenchmarkSketch(k, seed).add_building_models(df_building_models.iloc[v_rows]).to_bytes()
+        sketch.merge(BenchmarkSketch.from_bytes(raw_sketch))
+    df_sketch = sketch.get_benchmark_stats()
+    for column, (median, mad) in numpy_stats(df_building_models).items():
+        v_values = np.asarray(df_building_models[column], dtype=float)
+        v_values = v_values[np.isfinite(v_values)]
+        # About 1.7 / k for the median, the MAD also carries the error of the median
+        assert rank_error(v_values, df_sketch.at[column, 'beta_median']) <= 2.0 / k
+        assert rank_error(np.abs(v_values - median), df_sketch.at[column, 'beta_standard_deviation'] / 1.4826) \
+            <= 3.0 / k
@@ -0,0 +1,71 @@
+'''
+
+Building Efficiency Targeting Tool for Energy Retrofits (BETTER) Copyright (c) 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Dept. of Energy). All rights reserved.
+
+If you have questions about your rights to use or distribute this software, please contact Berkeley Lab's Intellectual Property Office at  IPO@lbl.gov.
+
+NOTICE.  This Software was developed
+under funding from the U.S. Department of Energy and the U.S. Government consequently retains certain rights. As such, the U.S. Government has been granted for itself and others acting on its behalf a paid-up, nonexclusive, irrevocable, worldwide license in the Software to reproduce, distribute copies to the public, prepare derivative works, and perform publicly and display publicly, and to permit other to do so.
+
+'''
+
+import os
+import multiprocessing
+
+import pandas as pd
+
+from benchmark_cache import BenchmarkCache
+
+
+def put_models(cache_dir, v_keys):
+    cache = BenchmarkCache(cache_dir)
+    for key in v_keys:
+        cache.put_building_models({key: {'beta_base': float(len(key))}})
+
+
+def test_building_models_round_trip(tmp_path):
+    cache = BenchmarkCache(str(tmp_path))
+    cache.put_building_models({'a': {'beta_base': 1.5, 'beta_hdd': 0.25}, 'b': None})
+    assert cache.get_building_models(['a', 'b', 'c']) == {'a': {'beta_base': 1.5, 'beta_hdd': 0.25}, 'b': None}
+
+
+def test_stats_round_trip(tmp_path):
+    cache = BenchmarkCache(str(tmp_path))
+    df_bench_stats = pd.DataFrame({'median': [1.0, 2.0], 'std': [0.5, 0.25]},
+                                  index=pd.Index(['beta_base', 'beta_hdd'], name='coefficient'))
+    assert cache.get_stats('portfolio') is None
+    cache.put_stats('portfolio', df_bench_stats)
+    pd.testing.assert_frame_equal(BenchmarkCache(str(tmp_path)).get_stats('portfolio'), df_bench_stats)
+
+
+def test_put_only_writes_its_entries(tmp_path):
+    cache = BenchmarkCache(str(tmp_path))
+    cache.put_building_models({'a': {'beta_base': 1.0}})
+    file_a = cache.file_path('models', 'a')
+    stat_a = os.stat(file_a)
+    cache.put_building_models({'b': {'beta_base': 2.0}})
+    assert os.stat(file_a).st_mtime_ns == stat_a.st_mtime_ns
+    assert sorted(os.listdir(os.path.join(str(tmp_path), 'models'))) == ['a.json', 'b.json']
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    cache = BenchmarkCache(str(tmp_path))
+    cache.put_building_models({'a': {'beta_base': 1.0}, 'b': {'beta_base': 2.0}})
+    with open(cache.file_path('models', 'a'), 'w') as f:
+        f.write('{"coeff')
+    assert cache.get_building_models(['a', 'b']) == {'b': {'beta_base': 2.0}}
+
+
+def test_concurrent_processes_keep_all_entries(tmp_path):
+    v_processes = [multiprocessing.Process(target=put_models,
+                                           args=(str(tmp_path), ['p' + str(i) + '_' + str(j) for j in range(50)]))
+                   for i in range(4)]
+    for process in v_processes:
+        process.start()
+    for process in v_processes:
+        process.join(30)
+        assert process.exitcode == 0
+    d_models = BenchmarkCache(str(tmp_path)).get_building_models(
+        ['p' + str(i) + '_' + str(j) for i in range(4) for j in range(50)])
+    assert len(d_models) == 200
+    assert not [name for name in os.listdir(str(tmp_path)) if name.endswith('.tmp')]
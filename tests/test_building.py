@@ -0,0 +1,79 @@
+'''
+
+Building Efficiency Targeting Tool for Energy Retrofits (BETTER) Copyright (c) 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Dept. of Energy). All rights reserved.
+
+If you have questions about your rights to use or distribute this software, please contact Berkeley Lab's Intellectual Property Office at  IPO@lbl.gov.
+
+NOTICE.  This Software was developed
+under funding from the U.S. Department of Energy and the U.S. Government consequently retains certain rights. As such, the U.S. Government has been granted for itself and others acting on its behalf a paid-up, nonexclusive, irrevocable, worldwide license in the Software to reproduce, distribute copies to the public, prepare derivative works, and perform publicly and display publicly, and to permit other to do so.
+
+'''
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from building import Building
+from model import InverseModel
+
+V_T = np.array([-2.0, 1.5, 6.0, 11.0, 16.5, 21.0, 25.5, 27.0, 22.0, 15.0, 8.0, 2.5, -1.0, 3.0, 9.5, 14.0,
+                19.0, 24.0, 26.5, 23.5, 17.0, 10.5, 5.0, 0.5])
+V_DAYS = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31] * 2)
+
+
+def fitted_model(hcp, ccp, base, hsl, csl, seed):
+    rng = np.random.default_rng(seed)
+    eui = InverseModel.piecewise_linear(V_T, hcp, ccp, base, hsl, csl) + rng.normal(0, 0.005, len(V_T))
+    im = InverseModel(V_T, eui)
+    assert im.fit_model()
+    return (im)
+
+
+def fitted_building(saving_target):
+    bldg = Building(1, 'Office', 'Berkeley, CA', 'Office', 5000, saving_target=saving_target, coord=(37.87, -122.27))
+    bldg.im_electricity = fitted_model(10, 18, 0.3, -0.01, 0.04, 0)
+    bldg.im_fossil_fuel = fitted_model(14, 14, 0.05, -0.06, 0, 1)
+    bldg.utility_electricity = SimpleNamespace(days=V_DAYS, utility_unit_price=0.15)
+    bldg.utility_fossil_fuel = SimpleNamespace(days=V_DAYS, utility_unit_price=0.03)
+    bldg.weather_electricity = SimpleNamespace(v_T_C=V_T)
+    bldg.weather_fossil_fuel = SimpleNamespace(v_T_C=V_T)
+    return (bldg)
+
+
+V_ATTRIBUTES = ['FIM_list', 'total_energy_consumption_old', 'total_energy_savings', 'total_cost_savings',
+                'total_energy_savings_pct'] + \
+               [name + suffix for name in ['base_new', 'hsl_new', 'hcp_new', 'csl_new', 'ccp_new', 'p_new', 'p_typical',
+                                           'v_old_consumption_all', 'v_new_consumption_all',
+                                           'old_consumption_last_year', 'new_consumption_last_year',
+                                           'total_energy_savings_last_year', 'total_energy_savings_pct_last_year',
+                                           'total_cost_savings'] for suffix in ['_e', '_f']] + \
+               [name + cost for name in ['base', 'heating', 'cooling'] for name in
+                [name + '_old', name + '_typical', name + '_new'] for cost in ['', '_cost']]
+
+
+@pytest.mark.parametrize('saving_target', [1, 2, 3])
+def test_scenarios_keep_the_saving_target_results(saving_target):
+    bldg_single = fitted_building(saving_target)
+    bldg_single.ee_assess()
+    bldg_single.calculate_savings()
+    bldg_single.disaggregate_consumption_wrapper()
+    bldg_scenarios = fitted_building(saving_target)
+    df_scenarios = bldg_scenarios.assess_scenarios(v_target_levels=[1, 2, 3])
+    assert len(df_scenarios) == 6
+    for name in V_ATTRIBUTES:
+        np.testing.assert_equal(getattr(bldg_scenarios, name), getattr(bldg_single, name), err_msg=name)
+    for suffix in ['_e', '_f']:
+        assert getattr(bldg_scenarios, 'FIM_table' + suffix).equals(getattr(bldg_single, 'FIM_table' + suffix))
+        assert getattr(bldg_scenarios, 'coeff_out' + suffix).equals(getattr(bldg_single, 'coeff_out' + suffix))
+    # The row of the saving target is the single target assessment
+    df_target = df_scenarios[df_scenarios['target_level'] == saving_target].set_index('utility_type')
+    assert df_target.loc['Electricity', 'energy_savings'] == bldg_single.total_energy_savings_last_year_e
+    assert df_target.loc['Fossil Fuel', 'cost_savings'] == bldg_single.total_cost_savings_f
+
+
+def test_scenarios_add_the_saving_target_level():
+    bldg = fitted_building(3)
+    df_scenarios = bldg.assess_scenarios(v_target_levels=[1])
+    assert sorted(df_scenarios['target_level'].unique()) == [1, 3]
+    assert hasattr(bldg, 'p_new_e') and hasattr(bldg, 'cooling_new_cost')
@@ -0,0 +1,123 @@
+'''
+
+Building Efficiency Targeting Tool for Energy Retrofits (BETTER) Copyright (c) 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Dept. of Energy). All rights reserved.
+
+If you have questions about your rights to use or distribute this software, please contact Berkeley Lab's Intellectual Property Office at  IPO@lbl.gov.
+
+NOTICE.  This Software was developed
+under funding from the U.S. Department of Energy and the U.S. Government consequently retains certain rights. As such, the U.S. Government has been granted for itself and others acting on its behalf a paid-up, nonexclusive, irrevocable, worldwide license in the Software to reproduce, distribute copies to the public, prepare derivative works, and perform publicly and display publicly, and to permit other to do so.
+
+'''
+
+import logging
+
+import pytest
+
+import geocoding
+from geocoding import Geocoder, GeocodingProvider, GeocodeResult, GeocodingError, RateLimiter
+
+
+class FakeProvider(GeocodingProvider):
+    # Answers from its dict of addresses, or raises its error; records the addresses requested
+    def __init__(self, name, d_latlng=None, error=None, max_requests_per_second=None):
+        super().__init__(name, max_requests_per_second)
+        self.d_latlng = {} if d_latlng is None else d_latlng
+        self.error = error
+        self.v_requests = []
+
+    def request(self, address):
+        self.v_requests.append(address)
+        if self.error is not None:
+            raise self.error
+        if address not in self.d_latlng:
+            return None
+        return (GeocodeResult(self.d_latlng[address], address.upper(), self.name))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+        self.v_sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.v_sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_geocoder(tmp_path, providers, **kwargs):
+    return (Geocoder(cache_file=str(tmp_path / 'geocode_cache.sqlite'), providers=providers, **kwargs))
+
+
+def test_providers_are_tried_in_order(tmp_path):
+    v_providers = [FakeProvider('first'), FakeProvider('second', {'1 Main Street, Berkeley': [37.8, -122.2]}),
+                   FakeProvider('third', {'1 Main Street, Berkeley': [0, 0]})]
+    result = make_geocoder(tmp_path, v_providers, offline=False).geocode('1 Main Street, Berkeley')
+    assert (result.latlng, result.source, result.address) == ([37.8, -122.2], 'second', '1 MAIN STREET, BERKELEY')
+    assert [len(provider.v_requests) for provider in v_providers] == [1, 1, 0]
+
+
+def test_provider_errors_are_logged_and_skipped(tmp_path, caplog):
+    v_providers = [FakeProvider('broken', error=IOError('quota exceeded')),
+                   FakeProvider('working', {'1 Main St': [37.8, -122.2]})]
+    with caplog.at_level(logging.WARNING, logger='geocoding'):
+        result = make_geocoder(tmp_path, v_providers, offline=False).geocode('1 Main St')
+    assert result.source == 'working'
+    assert len(caplog.records) == 1
+    assert caplog.records[0].levelno == logging.WARNING
+    assert 'broken' in caplog.records[0].getMessage()
+    assert '1 Main St' in caplog.records[0].getMessage()
+    assert 'quota exceeded' in caplog.records[0].getMessage()
+
+
+def test_cache_hit_skips_the_providers(tmp_path):
+    provider = FakeProvider('online', {'1 Main Street': [37.8, -122.2]})
+    make_geocoder(tmp_path, [provider], offline=False).geocode('1 Main Street')
+    # A new geocoder on the same cache file, with a spelling variant of the address
+    result = make_geocoder(tmp_path, [provider], offline=False).geocode('1  MAIN st.')
+    assert result.latlng == [37.8, -122.2]
+    assert result.source == 'online'
+    assert provider.v_requests == ['1 Main Street']
+
+
+def test_gazetteer_is_used_before_the_providers(tmp_path):
+    gazetteer_file = tmp_path / 'gazetteer.csv'
+    gazetteer_file.write_text('address,latitude,longitude\n"1 Main Street, Berkeley",37.87,-122.27\n')
+    provider = FakeProvider('online', {'2 Main Street': [1.0, 2.0]})
+    geocoder = make_geocoder(tmp_path, [provider], gazetteer_file=str(gazetteer_file), offline=False)
+    result = geocoder.geocode('1 Main St Berkeley')
+    assert (result.latlng, result.source, result.address) == ([37.87, -122.27], 'gazetteer', '1 Main St Berkeley')
+    assert provider.v_requests == []
+    assert geocoder.geocode('2 Main Street').source == 'online'
+
+
+def test_offline_geocoder_never_calls_the_providers(tmp_path):
+    provider = FakeProvider('online', {'1 Main Street': [37.8, -122.2]})
+    with pytest.raises(GeocodingError):
+        make_geocoder(tmp_path, [provider], offline=True).geocode('1 Main Street')
+    assert provider.v_requests == []
+
+
+def test_rate_limiter_spaces_the_requests(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(geocoding.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(geocoding.time, 'sleep', clock.sleep)
+    provider = FakeProvider('limited', {'a': [1, 2]}, max_requests_per_second=4)
+    v_times = []
+    for _ in range(5):
+        provider.geocode('a')
+        v_times.append(clock.now)
+    # The first request uses the burst token, then one request every 1/4 s
+    assert v_times == pytest.approx([100.0, 100.25, 100.5, 100.75, 101.0])
+
+
+def test_rate_limiter_burst(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(geocoding.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(geocoding.time, 'sleep', clock.sleep)
+    rate_limiter = RateLimiter(2, burst=3)
+    for _ in range(4):
+        rate_limiter.acquire()
+    assert clock.v_sleeps == pytest.approx([0.5])
@@ -0,0 +1,167 @@
+'''
+
+Building Efficiency Targeting Tool for Energy Retrofits (BETTER) Copyright (c) 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Dept. of Energy). All rights reserved.
+
+If you have questions about your rights to use or distribute this software, please contact Berkeley Lab's Intellectual Property Office at  IPO@lbl.gov.
+
+NOTICE.  This Software was developed
+under funding from the U.S. Department of Energy and the U.S. Government consequently retains certain rights. As such, the U.S. Government has been granted for itself and others acting on its behalf a paid-up, nonexclusive, irrevocable, worldwide license in the Software to reproduce, distribute copies to the public, prepare derivative works, and perform publicly and display publicly, and to permit other to do so.
+
+'''
+
+import numpy as np
+import pytest
+from scipy import optimize
+
+from model import InverseModel, BatchInverseModel
+
+
+def change_point_eui(x, hcp, ccp, base, hsl, csl, noise, rng):
+    return (base + hsl * np.minimum(x - hcp, 0) + csl * np.maximum(x - ccp, 0) + rng.normal(0, noise, len(x)))
+
+
+def bounded_sse(x, y, hcp, ccp, heating, cooling):
+    # Least squares of the model with the change-points given, baseload >= 0, heating slope <= 0, cooling slope >= 0
+    v_columns, lower, upper = [np.ones(len(x))], [0], [np.inf]
+    if heating:
+        v_columns.append(np.minimum(x - hcp, 0))
+        lower.append(-np.inf)
+        upper.append(0)
+    if cooling:
+        v_columns.append(np.maximum(x - ccp, 0))
+        lower.append(0)
+        upper.append(np.inf)
+    m_X = np.column_stack(v_columns)
+    coeffs = optimize.lsq_linear(m_X, y, bounds=(lower, upper)).x
+    return (np.sum((m_X.dot(coeffs) - y) ** 2))
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_grid_candidates_match_a_brute_force_search(seed):
+    rng = np.random.default_rng(seed)
+    x = np.sort(np.round(rng.uniform(-10, 30, 11), 1))
+    x = x - np.mean(x)
+    y = change_point_eui(x, -5, 5, 2, -0.2, 0.3, 0.6, rng) - seed
+    d_candidates = InverseModel.grid_candidates(x, y, min_points=1)
+    v_cp = np.linspace(x[0], x[-1], 41)
+    sse_h = min([bounded_sse(x, y, cp, cp, True, False) for cp in v_cp])
+    sse_c = min([bounded_sse(x, y, cp, cp, False, True) for cp in v_cp])
+    sse_2 = min([bounded_sse(x, y, hcp, ccp, True, True) for i, hcp in enumerate(v_cp) for ccp in v_cp[i:]])
+    # The search is exact, it can only be better than any point of the brute-force grid
+    assert d_candidates['H'][:, 5].min() <= sse_h + 1e-9
+    assert d_candidates['C'][:, 5].min() <= sse_c + 1e-9
+    assert d_candidates['2'][:, 5].min() <= sse_2 + 1e-9
+    # The candidates are feasible and their sums of squared residuals are right
+    for m_candidates in d_candidates.values():
+        hcp, ccp, base, hsl, csl, sse = m_candidates.T
+        assert (hcp <= ccp).all() and (base >= 0).all() and (hsl <= 0).all() and (csl >= 0).all()
+        i = np.argmin(sse)
+        np.testing.assert_allclose(np.sum((InverseModel.piecewise_linear(x, *m_candidates[i, :5]) - y) ** 2),
+                                   sse[i], rtol=1e-8, atol=1e-10)
+
+
+def test_grid_recovers_a_noiseless_5P_model():
+    x = np.linspace(-5, 30, 36)
+    y = change_point_eui(x, 8.3, 21.7, 1.5, -0.08, 0.1, 0, np.random.default_rng(0))
+    im = InverseModel(x, y, solver='grid')
+    assert im.fit_model()
+    assert im.model_type_str == '5P'
+    np.testing.assert_allclose(im.p, [8.3, 21.7, 1.5, -0.08, 0.1], atol=1e-8)
+    assert im.R_Squared() == pytest.approx(1)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_grid_fits_at_least_as_well_as_curve_fit(seed):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(-5, 30, 36)
+    y = change_point_eui(x, 10, 20, 1.5, -0.08, 0.1, 0.1, rng)
+    im_curve_fit = InverseModel(x, y)
+    im_grid = InverseModel(x, y, solver='grid')
+    assert im_curve_fit.fit_model() and im_grid.fit_model()
+    assert im_grid.model_type_str == im_curve_fit.model_type_str == '5P'
+    assert im_grid.R_Squared() >= im_curve_fit.R_Squared() - 1e-12
+    # The p-values are computed from the covariance of the coefficients, as for curve_fit
+    assert im_grid.e.shape == (5, 5)
+    assert im_grid.p_base < 0.05 and im_grid.p_hsl < 0.05 and im_grid.p_csl < 0.05
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_grid_bounded_optimum_is_below_curve_fit(seed):
+    # Whatever model is selected, no bounded 4P/5P fit of curve_fit has a smaller sum of squared residuals
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(-5, 30, 24)
+    y = np.maximum(change_point_eui(x, 10, 18, 1.5, -0.05 * (seed % 3), 0.05 * (seed % 2), 0.2, rng), 0)
+    im_curve_fit = InverseModel(x, y)
+    im_curve_fit.fit()
+    order = np.argsort(x, kind='stable')
+    d_candidates = InverseModel.grid_candidates(x[order] - np.mean(x), y[order])
+    sse_curve_fit = np.sum((InverseModel.piecewise_linear(x, *im_curve_fit.p) - y) ** 2)
+    if im_curve_fit.p[0] <= im_curve_fit.p[1]:
+        assert d_candidates['2'][:, 5].min() <= sse_curve_fit + 1e-9
+
+
+def test_grid_rejects_a_fit_below_the_threshold():
+    rng = np.random.default_rng(0)
+    x = rng.uniform(-5, 30, 24)
+    im = InverseModel(x, change_point_eui(x, 15, 15, 1.5, -0.05, 0, 0.2, rng), solver='grid')
+    assert not im.fit_model(threshold=0.999)
+    assert im.fit_model(threshold=0.1)
+
+
+V_BATCH_CASES = [('5P', (8, 20, 1.0, -0.1, 0.15)), ('4P', (15, 15, 1.0, -0.08, 0.12)),
+                 ('3P Heating', (15, 15, 1.0, -0.12, 0)), ('3P Cooling', (14, 14, 0.8, 0, 0.1))]
+
+
+def batch_data(model_p, n_buildings, seed):
+    rng = np.random.default_rng(seed)
+    m_x = rng.uniform(-5, 32, (n_buildings, 24))
+    m_y = np.array([change_point_eui(x, *model_p, 0.05, rng) for x in m_x])
+    return (m_x, m_y)
+
+
+@pytest.mark.parametrize('model_type_str, model_p', V_BATCH_CASES)
+def test_batch_coefficients_are_the_least_squares_at_its_change_points(model_type_str, model_p):
+    m_x, m_y = batch_data(model_p, 10, 0)
+    bim = BatchInverseModel(m_x, m_y)
+    assert bim.fit_model().all()
+    for x, y, (hcp, ccp, base, hsl, csl), r2, type_str in zip(m_x, m_y, bim.model_p, bim.r2, bim.model_type_str):
+        v_columns = [np.ones(len(x))]
+        if type_str != '3P Cooling':
+            v_columns.append(np.minimum(x - hcp, 0))
+        if type_str != '3P Heating':
+            v_columns.append(np.maximum(x - ccp, 0))
+        coeffs = np.linalg.lstsq(np.column_stack(v_columns), y, rcond=None)[0]
+        expected = {'3P Heating': [coeffs[0], coeffs[1], 0], '3P Cooling': [coeffs[0], 0, coeffs[1]]}.get(
+            type_str, coeffs)
+        np.testing.assert_allclose([base, hsl, csl], expected, rtol=1e-7, atol=1e-10)
+        assert r2 == pytest.approx(1 - np.sum((InverseModel.piecewise_linear(x, hcp, ccp, base, hsl, csl) - y) ** 2) /
+                                   np.sum((y - np.mean(y)) ** 2), rel=1e-9)
+
+
+@pytest.mark.parametrize('model_type_str, model_p', V_BATCH_CASES)
+def test_batch_fits_are_close_to_curve_fit(model_type_str, model_p):
+    m_x, m_y = batch_data(model_p, 5, 1)
+    bim = BatchInverseModel(m_x, m_y)
+    bim.fit_model()
+    for x, y, p_batch, r2_batch in zip(m_x, m_y, bim.model_p, bim.r2):
+        im = InverseModel(x, y)
+        assert im.fit_model()
+        # The batch change-points are percentiles of the temperatures, not a continuous search
+        assert r2_batch >= im.R_Squared() - 0.05
+        # Both fits predict about the same consumption: within a few noise standard deviations (0.05), the change-points
+        # of the noisy 5P buildings are not well determined
+        v_difference = InverseModel.piecewise_linear(x, *p_batch) - InverseModel.piecewise_linear(x, *im.p)
+        assert np.sqrt(np.mean(v_difference ** 2)) < 0.2
+
+
+def test_batch_ragged_buildings_fit_as_single_buildings():
+    m_x, m_y = batch_data(V_BATCH_CASES[0][1], 3, 2)
+    v_length = [24, 18, 13]
+    bim_ragged = BatchInverseModel.from_ragged([x[:n] for x, n in zip(m_x, v_length)],
+                                               [y[:n] for y, n in zip(m_y, v_length)])
+    bim_ragged.fit_model()
+    for i, n in enumerate(v_length):
+        bim = BatchInverseModel(m_x[i, :n], m_y[i, :n])
+        bim.fit_model()
+        assert bim_ragged.model_type_str[i] == bim.model_type_str[0]
+        np.testing.assert_allclose(bim_ragged.model_p[i], bim.model_p[0], rtol=1e-9)
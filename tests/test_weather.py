@@ -0,0 +1,180 @@
+'''
+
+Building Efficiency Targeting Tool for Energy Retrofits (BETTER) Copyright (c) 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Dept. of Energy). All rights reserved.
+
+If you have questions about your rights to use or distribute this software, please contact Berkeley Lab's Intellectual Property Office at  IPO@lbl.gov.
+
+NOTICE.  This Software was developed
+under funding from the U.S. Department of Energy and the U.S. Government consequently retains certain rights. As such, the U.S. Government has been granted for itself and others acting on its behalf a paid-up, nonexclusive, irrevocable, worldwide license in the Software to reproduce, distribute copies to the public, prepare derivative works, and perform publicly and display publicly, and to permit other to do so.
+
+'''
+
+from collections import Counter
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from building import Building
+from weather import Weather, WeatherCache
+
+COORD = (37.87, -122.27)
+
+
+def hourly_weather(year, temperature):
+    v_datetime = pd.date_range(str(year) + '-01-01', str(year + 1) + '-01-01', freq='h', inclusive='left')
+    return (pd.DataFrame({'Datetime': v_datetime, 'Temperature': np.full(len(v_datetime), float(temperature))}))
+
+
+def billing_utility(v_periods):
+    df_periods = pd.DataFrame({'start_dates': [start for start, _ in v_periods],
+                               'end_dates': [end for _, end in v_periods]})
+    return (SimpleNamespace(df_raw_data=df_periods.copy(), df_periods=df_periods))
+
+
+@pytest.fixture
+def station_years(monkeypatch):
+    # Pre-downloaded weather of the closest and second closest stations, the closest has no 2018 file.
+    # The temperature is 10 * station rank + the last digit of the year
+    weather = Weather(COORD)
+    v_station_ID = [weather.closest_weather_station_ID, weather.second_closest_weather_station_ID]
+    d_files = {(station_ID, year): hourly_weather(year, 10 * rank + year % 10)
+               for rank, station_ID in enumerate(v_station_ID) for year in range(2014, 2019)}
+    del d_files[(v_station_ID[0], 2018)]
+    loads = Counter()
+
+    def read_csv_weather(station_ID, year, s_path=None):
+        loads[(station_ID, year)] += 1
+        if (station_ID, year) not in d_files:
+            raise FileNotFoundError(station_ID + ' ' + str(year))
+        return (d_files[(station_ID, year)])
+
+    monkeypatch.setattr(Weather, 'read_csv_weather', staticmethod(read_csv_weather))
+    return (v_station_ID, loads)
+
+
+def test_billing_years_skip_the_gaps():
+    v_start_dates = pd.to_datetime(['2014-12-15', '2017-03-01', '2017-04-01'])
+    v_end_dates = pd.to_datetime(['2015-01-14', '2017-03-31', '2017-04-30'])
+    assert Weather.billing_years(v_start_dates, v_end_dates) == [2014, 2015, 2017]
+
+
+def test_add_weather_falls_back_per_fuel_and_shares_the_common_years(tmp_path, station_years):
+    v_station_ID, loads = station_years
+    bldg = Building(1, 'Office', 'Berkeley, CA', 'Office', 5000, coord=COORD)
+    # Electricity: 2014 and 2017, not the gap year in between; fossil fuel: 2017 and 2018
+    bldg.utility_electricity = billing_utility([('2014-06-01', '2014-06-30'), ('2017-06-01', '2017-06-30')])
+    bldg.utility_fossil_fuel = billing_utility([('2017-12-01', '2017-12-31'), ('2018-01-01', '2018-01-31')])
+    weather_test = Weather(COORD, weather_cache=WeatherCache(str(tmp_path)))
+    bldg.add_weather(True, weather_test, weather_test)
+
+    # The missing 2018 only sends the fossil fuel to the second closest station
+    assert bldg.weather_electricity.weather_station_ID == v_station_ID[0]
+    np.testing.assert_allclose(bldg.weather_electricity.v_T_C, (np.array([4.0, 7.0]) - 32) / 1.8)
+    assert bldg.weather_fossil_fuel.weather_station_ID == v_station_ID[1]
+    np.testing.assert_allclose(bldg.weather_fossil_fuel.v_T_C, (np.array([17.0, 18.0]) - 32) / 1.8)
+    # No gap year, and the 2017 of the closest station is loaded once for both fuels
+    assert loads == Counter({(v_station_ID[0], 2014): 1, (v_station_ID[0], 2017): 1, (v_station_ID[0], 2018): 1,
+                             (v_station_ID[1], 2017): 1, (v_station_ID[1], 2018): 1})
+
+
+def test_add_weather_shares_the_station_years_of_both_fuels(tmp_path, station_years):
+    v_station_ID, loads = station_years
+    bldg = Building(1, 'Office', 'Berkeley, CA', 'Office', 5000, coord=COORD)
+    bldg.utility_electricity = billing_utility([('2015-12-15', '2016-01-14'), ('2016-06-01', '2016-06-30')])
+    bldg.utility_fossil_fuel = billing_utility([('2016-02-01', '2016-02-29')])
+    bldg.add_weather(True, Weather(COORD, weather_cache=WeatherCache(str(tmp_path))),
+                     Weather(COORD, weather_cache=WeatherCache(str(tmp_path))))
+    assert bldg.weather_electricity.weather_station_ID == bldg.weather_fossil_fuel.weather_station_ID == v_station_ID[0]
+    assert loads == Counter({(v_station_ID[0], 2015): 1, (v_station_ID[0], 2016): 1})
+    assert len(bldg.weather_fossil_fuel.df_hourly) == len(hourly_weather(2016, 0))
+
+
+# A record of a station-year file, from the NOAA ISH format document: -7.8 C on 1901-01-01 at 06:00 UTC
+ISH_RECORD = (b'0029029070999991901010106004+64333+023450FM-12+000599999V0202701N015919999999N0000001N9-00781+99999'
+              b'102001ADDGF108991999999999999999999')
+
+
+def ish_record(date_time, temperature, quality=b'1'):
+    # Mandatory data section of an ISH record with the given date time (YYYYMMDDHHMM) and air temperature field
+    # (sign and 4 digits in tenths of C), field by field as in the format document (1-based positions)
+    return (b'0000'              # 1-4 variable data length
+            b'725030'            # 5-10 USAF station
+            b'14732'             # 11-15 WBAN station
+            + date_time +        # 16-27 date and time
+            b'4'                 # 28 data source
+            b'+40779'            # 29-34 latitude
+            b'-073880'           # 35-41 longitude
+            b'FM-15'             # 42-46 report type
+            b'+0003'             # 47-51 elevation
+            b'KLGA '             # 52-56 call letters
+            b'V030'              # 57-60 quality control process
+            b'2101'              # 61-64 wind direction and quality
+            b'N'                 # 65 wind type
+            b'00461'             # 66-70 wind speed and quality
+            b'220001'            # 71-76 ceiling height and quality
+            b'CN'                # 77-78 ceiling determination, CAVOK
+            b'0160931N5'         # 79-87 visibility
+            + temperature + quality +  # 88-93 air temperature and quality
+            b'-01061'            # 94-99 dew point
+            b'102091'            # 100-105 sea level pressure
+            b'ADDMA1999999101591')
+
+
+def test_parse_ish_reads_the_format_document_example():
+    df_hourly = Weather.parse_ish(ISH_RECORD + b'\n')
+    assert list(df_hourly['Datetime']) == [pd.Timestamp('1901-01-01 06:00')]
+    assert list(df_hourly['Temperature']) == [round(1.8 * -7.8 + 32, 1)]
+
+
+def test_parse_ish_column_offsets():
+    v_records = [ish_record(b'201701010051', b'+0056'),
+                 ish_record(b'201701010151', b'-0123'),
+                 ish_record(b'201701010251', b'+9999', b'9'),
+                 ish_record(b'201712312400', b'+0000'),
+                 ish_record(b'201702281751', b'+0322', b'7')]
+    for record in v_records:
+        assert len(record) == 123 and record[87:93] in [b'+00561', b'-01231', b'+99999', b'+00001', b'+03227']
+    # Records too short to hold the air temperature are skipped, the last line has no line feed
+    raw_ish = b'\n'.join(v_records[:2] + [v_records[2][:92]] + v_records[2:])
+    df_hourly = Weather.parse_ish(raw_ish)
+    assert list(df_hourly['Datetime']) == list(pd.to_datetime(['2017-01-01 00:51', '2017-01-01 01:51',
+                                                               '2017-01-01 02:51', '2018-01-01 00:00',
+                                                               '2017-02-28 17:51']))
+    np.testing.assert_array_equal(df_hourly['Temperature'],
+                                  [round(1.8 * T_C + 32, 1) for T_C in [5.6, -12.3, np.nan, 0, 32.2]])
+    # Rejected quality codes
+    df_hourly = Weather.parse_ish(raw_ish, v_rejected_quality_codes=b'7')
+    assert np.isnan(df_hourly['Temperature'].iloc[4]) and not np.isnan(df_hourly['Temperature'].iloc[0])
+
+
+def aggregate_with_masks(v_start_dates, v_end_dates, df_hourly):
+    # Mean temperature of the records of each billing period, start and end dates included
+    return (np.array([df_hourly.loc[(df_hourly['Datetime'] >= start) & (df_hourly['Datetime'] <= end),
+                                    'Temperature'].mean() for start, end in zip(v_start_dates, v_end_dates)]))
+
+
+def test_aggregate_weather_includes_both_period_boundaries():
+    weather = Weather(COORD)
+    # Out of order and overlapping periods
+    weather.v_start_dates = pd.to_datetime(['2017-01-02 00:00', '2017-01-01 00:00', '2017-01-02 12:00',
+                                            '2017-03-01 00:00'])
+    weather.v_end_dates = pd.to_datetime(['2017-01-03 00:00', '2017-01-02 00:00', '2017-01-02 12:00',
+                                          '2017-03-31 00:00'])
+    # Hourly records from 2017-01-01 00:00, shuffled, with a missing temperature
+    rng = np.random.default_rng(0)
+    df_hourly = pd.DataFrame({'Datetime': pd.date_range('2017-01-01', periods=24 * 3 + 1, freq='h'),
+                              'Temperature': np.arange(24 * 3 + 1, dtype=float)})
+    df_hourly.loc[30, 'Temperature'] = np.nan
+    df_hourly = df_hourly.iloc[rng.permutation(len(df_hourly))].reset_index(drop=True)
+    v_T_F, v_T_C = weather.aggregate_weather(df_hourly)
+    # 2017-01-02 00:00 to 2017-01-03 00:00 inclusive: hours 24 to 48 without the missing hour 30
+    assert v_T_F[0] == pytest.approx((np.sum(np.arange(24, 49)) - 30) / 24)
+    # 2017-01-01 00:00 to 2017-01-02 00:00 inclusive: hours 0 to 24
+    assert v_T_F[1] == pytest.approx(12)
+    # A period of a single time stamp, and a period without records
+    assert v_T_F[2] == 36
+    assert np.isnan(v_T_F[3])
+    np.testing.assert_allclose(v_T_F, aggregate_with_masks(weather.v_start_dates, weather.v_end_dates, df_hourly))
+    np.testing.assert_allclose(v_T_C, (v_T_F - 32) / 1.8)
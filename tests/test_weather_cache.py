@@ -0,0 +1,61 @@
+'''
+
+Building Efficiency Targeting Tool for Energy Retrofits (BETTER) Copyright (c) 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Dept. of Energy). All rights reserved.
+
+If you have questions about your rights to use or distribute this software, please contact Berkeley Lab's Intellectual Property Office at  IPO@lbl.gov.
+
+NOTICE.  This Software was developed
+under funding from the U.S. Department of Energy and the U.S. Government consequently retains certain rights. As such, the U.S. Government has been granted for itself and others acting on its behalf a paid-up, nonexclusive, irrevocable, worldwide license in the Software to reproduce, distribute copies to the public, prepare derivative works, and perform publicly and display publicly, and to permit other to do so.
+
+'''
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from weather_cache import WeatherCache
+
+
+def hourly_weather(v_datetime):
+    return (pd.DataFrame({'Datetime': v_datetime, 'Temperature': np.linspace(-5.0, 30.0, len(v_datetime))}))
+
+
+@pytest.mark.parametrize('unit', ['s', 'ms', 'us', 'ns'])
+def test_round_trip_keeps_the_time_stamps(tmp_path, unit):
+    cache = WeatherCache(str(tmp_path))
+    v_datetime = pd.date_range('2017-01-01', periods=48, freq='h', tz='UTC').astype('datetime64[' + unit + ', UTC]')
+    cache.put('725030-14732', 2017, hourly_weather(v_datetime))
+    df_hourly = cache.get('725030-14732', 2017)
+    assert df_hourly['Datetime'].iloc[0] == pd.Timestamp('2017-01-01 00:00')
+    assert df_hourly['Datetime'].iloc[-1] == pd.Timestamp('2017-01-02 23:00')
+    np.testing.assert_allclose(df_hourly['Temperature'], np.linspace(-5.0, 30.0, 48))
+
+
+def test_round_trip_of_naive_time_stamps(tmp_path):
+    cache = WeatherCache(str(tmp_path))
+    v_datetime = pd.date_range('2018-06-30 12:00', periods=24, freq='h')
+    cache.put('725030-14732', 2018, hourly_weather(v_datetime))
+    assert (cache.get('725030-14732', 2018)['Datetime'].values == v_datetime.values.astype('datetime64[ns]')).all()
+
+
+def test_corrupt_file_is_a_miss(tmp_path):
+    cache = WeatherCache(str(tmp_path))
+    with open(cache.file_path(WeatherCache.key('725030-14732', 2017)), 'wb') as f:
+        f.write(b'PK\x03\x04 truncated')
+    assert cache.get('725030-14732', 2017) is None
+    assert cache.n_misses == 1
+
+
+def test_least_recently_used_file_is_evicted(tmp_path):
+    cache = WeatherCache(str(tmp_path))
+    df_hourly = hourly_weather(pd.date_range('2017-01-01', periods=24, freq='h'))
+    for i, year in enumerate([2015, 2016, 2017]):
+        cache.put('725030-14732', year, df_hourly)
+        os.utime(cache.file_path(WeatherCache.key('725030-14732', year)), (1000 + i, 1000 + i))
+    # Reading 2015 makes 2016 the least recently used
+    cache.get('725030-14732', 2015)
+    cache.max_size_bytes = sum([size for _, size, _ in cache.list_files()]) - 1
+    cache.evict()
+    assert [cache.contains('725030-14732', year) for year in [2015, 2016, 2017]] == [True, False, True]
@@ -0,0 +1,211 @@
+'''
+
+Building Efficiency Targeting Tool for Energy Retrofits (BETTER) Copyright (c) 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Dept. of Energy). All rights reserved.
+
+If you have questions about your rights to use or distribute this software, please contact Berkeley Lab's Intellectual Property Office at  IPO@lbl.gov.
+
+NOTICE.  This Software was developed
+under funding from the U.S. Department of Energy and the U.S. Government consequently retains certain rights. As such, the U.S. Government has been granted for itself and others acting on its behalf a paid-up, nonexclusive, irrevocable, worldwide license in the Software to reproduce, distribute copies to the public, prepare derivative works, and perform publicly and display publicly, and to permit other to do so.
+
+'''
+
+import time
+import gzip
+import ftplib
+import threading
+import multiprocessing
+import concurrent.futures
+import http.server
+from collections import Counter
+
+import pytest
+
+import weather_fetcher
+from weather_fetcher import WeatherFetcher, WeatherFetchError
+
+RECORDS = b'0001 first record\n0002 second record\n' * 500
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    # Serves the server's files, answering 500 to the first n_failures[path] requests of a path
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.n_connections += 1
+
+    def do_GET(self):
+        self.server.requests[self.path] += 1
+        if self.server.n_failures[self.path] > 0:
+            self.server.n_failures[self.path] -= 1
+            self.send_error(500)
+        elif self.path not in self.server.files:
+            self.send_error(404)
+        else:
+            content = self.server.files[self.path]
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.daemon_threads = True
+    server.files = {'/isd/2017/725030-14732-2017.gz': gzip.compress(RECORDS),
+                    '/isd/2018/725030-14732-2018.gz': gzip.compress(RECORDS[::-1])}
+    server.requests = Counter()
+    server.n_failures = Counter()
+    server.n_connections = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def http_fetcher(http_server):
+    fetcher = WeatherFetcher(url='http://127.0.0.1:' + str(http_server.server_port) + '/isd',
+                             n_threads=2, n_retries=2, backoff_seconds=0, timeout=5)
+    yield fetcher
+    fetcher.close()
+
+
+def test_http_fetch_decompresses_and_counts_compressed_bytes(http_server, http_fetcher):
+    assert http_fetcher.fetch('725030-14732', 2017) == RECORDS
+    assert http_fetcher.n_bytes_fetched == len(http_server.files['/isd/2017/725030-14732-2017.gz'])
+
+
+def test_http_connection_is_reused(http_server, http_fetcher):
+    http_fetcher.fetch('725030-14732', 2017)
+    http_fetcher.fetch('725030-14732', 2018)
+    assert http_server.n_connections == 1
+
+
+def test_http_missing_file_is_not_requested_again(http_server, http_fetcher):
+    for _ in range(2):
+        with pytest.raises(WeatherFetchError):
+            http_fetcher.fetch('725030-14732', 2016)
+    assert http_server.requests['/isd/2016/725030-14732-2016.gz'] == 1
+    assert ('725030-14732', '2016') in http_fetcher.set_not_found
+    assert http_fetcher.n_bytes_fetched == 0
+
+
+def test_http_transient_failure_is_retried(http_server, http_fetcher):
+    http_server.n_failures['/isd/2017/725030-14732-2017.gz'] = 2
+    assert http_fetcher.fetch('725030-14732', 2017) == RECORDS
+    assert http_server.requests['/isd/2017/725030-14732-2017.gz'] == 3
+
+
+def test_http_retries_are_bounded(http_server, http_fetcher):
+    http_server.n_failures['/isd/2017/725030-14732-2017.gz'] = 3
+    with pytest.raises(IOError) as e:
+        http_fetcher.fetch('725030-14732', 2017)
+    assert not isinstance(e.value, WeatherFetchError)
+    assert http_server.requests['/isd/2017/725030-14732-2017.gz'] == 3
+
+
+def test_backoff_doubles(http_server, http_fetcher, monkeypatch):
+    v_sleeps = []
+    monkeypatch.setattr(weather_fetcher.time, 'sleep', v_sleeps.append)
+    http_fetcher.backoff_seconds = 0.5
+    http_server.n_failures['/isd/2017/725030-14732-2017.gz'] = 2
+    http_fetcher.fetch('725030-14732', 2017)
+    assert v_sleeps == [0.5, 1.0]
+
+
+def test_map_collects_results_and_errors(http_fetcher):
+    v_items = [('725030-14732', 2017), ('725030-14732', 2018), ('725030-14732', 2016)]
+    d_results, d_errors = http_fetcher.map(lambda item: http_fetcher.fetch(*item), v_items)
+    assert d_results == {v_items[0]: RECORDS, v_items[1]: RECORDS[::-1]}
+    assert list(d_errors) == [v_items[2]]
+    assert isinstance(d_errors[v_items[2]], WeatherFetchError)
+
+
+class FakeFTP:
+    # Stand-in for ftplib.FTP serving the class files, the first n_failures[path] transfers of a path break
+    files = {}
+    n_failures = Counter()
+    transfers = Counter()
+    n_connections = 0
+
+    def __init__(self, timeout=None):
+        FakeFTP.n_connections += 1
+
+    def connect(self, host, port):
+        self.address = (host, port)
+
+    def login(self, user, password):
+        self.user = user
+
+    def retrbinary(self, command, callback):
+        path = command[len('RETR '):]
+        FakeFTP.transfers[path] += 1
+        if FakeFTP.n_failures[path] > 0:
+            FakeFTP.n_failures[path] -= 1
+            callback(FakeFTP.files[path][:10])
+            raise EOFError()
+        if path not in FakeFTP.files:
+            raise ftplib.error_perm('550 ' + path + ': No such file or directory')
+        content = FakeFTP.files[path]
+        for i in range(0, len(content), 1000):
+            callback(content[i:i + 1000])
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def ftp_fetcher(monkeypatch):
+    monkeypatch.setattr(FakeFTP, 'files', {'/pub/data/noaa/2017/725030-14732-2017.gz': gzip.compress(RECORDS)})
+    monkeypatch.setattr(FakeFTP, 'n_failures', Counter())
+    monkeypatch.setattr(FakeFTP, 'transfers', Counter())
+    monkeypatch.setattr(FakeFTP, 'n_connections', 0)
+    monkeypatch.setattr(weather_fetcher.ftplib, 'FTP', FakeFTP)
+    fetcher = WeatherFetcher(url='ftp://ftp.example.org/pub/data/noaa', n_retries=2, backoff_seconds=0)
+    yield fetcher
+    fetcher.close()
+
+
+def test_ftp_fetch(ftp_fetcher):
+    assert ftp_fetcher.fetch('725030-14732', 2017) == RECORDS
+    assert ftp_fetcher.fetch('725030-14732', '2017') == RECORDS
+    assert FakeFTP.n_connections == 1
+    assert ftp_fetcher.n_bytes_fetched == 2 * len(FakeFTP.files['/pub/data/noaa/2017/725030-14732-2017.gz'])
+
+
+def test_ftp_missing_file_is_not_requested_again(ftp_fetcher):
+    for _ in range(2):
+        with pytest.raises(WeatherFetchError):
+            ftp_fetcher.fetch('725030-14732', 2016)
+    assert FakeFTP.transfers['/pub/data/noaa/2016/725030-14732-2016.gz'] == 1
+
+
+def test_ftp_broken_transfer_is_retried_on_a_new_connection(ftp_fetcher):
+    FakeFTP.n_failures['/pub/data/noaa/2017/725030-14732-2017.gz'] = 1
+    assert ftp_fetcher.fetch('725030-14732', 2017) == RECORDS
+    assert FakeFTP.transfers['/pub/data/noaa/2017/725030-14732-2017.gz'] == 2
+    assert FakeFTP.n_connections == 2
+    # Only the complete transfer is counted
+    assert ftp_fetcher.n_bytes_fetched == len(FakeFTP.files['/pub/data/noaa/2017/725030-14732-2017.gz'])
+
+
+def double_in_default_fetcher():
+    return (WeatherFetcher.get_default().map(lambda x: 2 * x, [1, 2])[0])
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='needs fork')
+def test_map_in_forked_process(http_fetcher, monkeypatch):
+    # The parent used the fetcher before forking, as run_batch does when prefetching
+    monkeypatch.setattr(WeatherFetcher, 'default_fetcher', http_fetcher)
+    http_fetcher.map(time.sleep, [0.1] * http_fetcher.n_threads)
+    with concurrent.futures.ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('fork')) as executor:
+        assert executor.submit(double_in_default_fetcher).result(timeout=30) == {1: 2, 2: 4}